@@ -1,6 +1,16 @@
 from .broker import *
+from .panel import *
+from .signals import *
+from .signal_cache import *
+from .checkpoint import *
 from .engine import *
+from .vectorized import *
 from .report import *
+from .fundamentals_store import *
 from .screener import *
 from .benchmark import *
+from .result_store import *
 from .grid_search import *
+from .optimizer import *
+from .param_vectorized import *
+from .walk_forward import *
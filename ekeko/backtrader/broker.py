@@ -1,11 +1,13 @@
 from ekeko.core import to_number, Ticker, Number, Date, Stock_dfs
+from collections import deque
 from enum import Enum
 from dataclasses import dataclass
+import numpy as np
 import pandas as pd
 
 from typing import Protocol
 
-from ekeko.core.types import to_date
+from ekeko.backtrader.panel import AlignedPanel
 
 
 class OrderAction(Enum):
@@ -114,26 +116,45 @@ class Slippage(Protocol):
     def compute(self, stock_df_row: pd.DataFrame) -> Number: ...
 
 
+class PanelSlippage(Protocol):
+    """Slippage that can be computed straight from the aligned price arrays."""
+
+    def compute(self, stock_df_row: pd.DataFrame) -> Number: ...
+
+    def compute_at(
+        self, panel: AlignedPanel, date_idx: int, ticker_idx: int
+    ) -> Number: ...
+
+
 class SlippageOnClose:
 
     def compute(self, stock_df_row: pd.DataFrame) -> Number:
         return to_number(stock_df_row.loc["Close"])
 
+    def compute_at(self, panel: AlignedPanel, date_idx: int, ticker_idx: int) -> Number:
+        return panel.get_close(date_idx, ticker_idx)
+
 
 @dataclass
 class StockDFWrapper:
     stock_dfs: Stock_dfs
     slippage: Slippage
+    panel: AlignedPanel
 
-    def has_record(self, order: Order, date: Date) -> bool:
-        return date in self.stock_dfs[order.ticker].index
+    def has_record(self, date_idx: int, ticker_idx: int) -> bool:
+        return self.panel.has_record(date_idx, ticker_idx)
 
-    def get_value_at_close(self, order: Order, date: Date) -> Number:
-        value = self.stock_dfs[order.ticker]["Close"][date]
-        return to_number(value)
+    def get_value_at_close(self, date_idx: int, ticker_idx: int) -> Number:
+        return self.panel.get_close(date_idx, ticker_idx)
+
+    def get_with_slippage(self, date_idx: int, ticker_idx: int) -> Number:
+        if hasattr(self.slippage, "compute_at"):
+            return self.slippage.compute_at(self.panel, date_idx, ticker_idx)  # type: ignore
 
-    def get_with_slippage(self, order: Order, date: Date) -> Number:
-        stock_df_row = self.stock_dfs[order.ticker].loc[date]
+        # Slippages that only know about rows need the full record of the ticker
+        ticker = self.panel.tickers[ticker_idx]
+        date = self.panel.dates[date_idx]
+        stock_df_row = self.stock_dfs[ticker].loc[date]
         return self.slippage.compute(stock_df_row)
 
 
@@ -144,22 +165,30 @@ class OrderProcessor:
         stock_dfs: Stock_dfs,
         comission_rate: Number,
         slippage: Slippage,
+        panel: AlignedPanel | None = None,
     ):
-        self.stock_dfs = StockDFWrapper(stock_dfs, slippage)
+        if panel is None:
+            panel = AlignedPanel(stock_dfs)
+        self.panel = panel
+        self.stock_dfs = StockDFWrapper(stock_dfs, slippage, panel)
         self.comission_rate = comission_rate
 
-    def process_order(self, order: Order, date: Date) -> Transaction:
+    def process_order(self, order: Order, date_idx: int) -> Transaction:
         if order.is_stock:
-            cost, execution_price, comission = self.__transaction_cost(order, date)
+            ticker_idx = self.panel.get_ticker_idx(order.ticker)
+            cost, execution_price, comission = self.__transaction_cost(
+                order, date_idx, ticker_idx
+            )
+            date = self.panel.dates[date_idx]
             return Transaction(
                 order, comission, self.comission_rate, execution_price, date, cost
             )
 
         raise Exception(f"Not defined for {type(order.instrument_type)}")
 
-    def can_execute_order(self, order: Order, date: Date) -> bool:
+    def can_execute_order(self, order: Order, date_idx: int) -> bool:
         if order.is_stock:
-            if self.stock_dfs.has_record(order, date):
+            if self.has_record(order, date_idx):
                 if order.is_market:
                     return True
             else:
@@ -168,18 +197,19 @@ class OrderProcessor:
         raise Exception(f"Not defined for {type(order.instrument_type)}")
 
     def __transaction_cost(
-        self, order: Order, date: Date
+        self, order: Order, date_idx: int, ticker_idx: int
     ) -> tuple[Number, Number, Number]:
-        execution_price = self.stock_dfs.get_with_slippage(order, date)
+        execution_price = self.stock_dfs.get_with_slippage(date_idx, ticker_idx)
         execution_price = to_number(execution_price)
         sign = to_number(-1.0 if order.is_buy else 1.0)
         comission = execution_price * order.quantity * self.comission_rate
         cost = (sign * execution_price * order.quantity) - comission
         return cost, execution_price, comission
 
-    def value_at(self, order: Order, date: Date) -> Number:
+    def value_at(self, order: Order, date_idx: int) -> Number:
         if order.is_stock:
-            stock_value = self.stock_dfs.get_value_at_close(order, date)
+            ticker_idx = self.panel.get_ticker_idx(order.ticker)
+            stock_value = self.stock_dfs.get_value_at_close(date_idx, ticker_idx)
             value = stock_value * order.quantity
             if order.is_buy:
                 return value
@@ -188,8 +218,9 @@ class OrderProcessor:
 
         raise Exception(f"Not defined for {type(order.order_type)}")
 
-    def has_record(self, order: Order, date: Date) -> bool:
-        return self.stock_dfs.has_record(order, date)
+    def has_record(self, order: Order, date_idx: int) -> bool:
+        ticker_idx = self.panel.get_ticker_idx(order.ticker)
+        return self.stock_dfs.has_record(date_idx, ticker_idx)
 
 
 @dataclass
@@ -290,29 +321,91 @@ class Position:
 class Account:
 
     def __init__(self, initial_cash: Number, time_index: pd.DatetimeIndex):
-        self.value_df = pd.DataFrame(
-            index=time_index, columns=["cash", "open_position"]  # type: ignore
-        )
+        self.time_index = time_index
+        self.date_loc: dict[Date, int] = {date: i for i, date in enumerate(time_index)}
+
+        # Cash and value of the open positions per date, NaN until the date is reached
+        self.cash = np.full(len(time_index), np.nan, dtype=np.float64)
+        self.open_position = np.full(len(time_index), np.nan, dtype=np.float64)
+        self.__value_df: pd.DataFrame | None = None
+
         # Set the initial cash balance for the first index
-        self.value_df.iloc[0, self.value_df.columns.get_loc("cash")] = initial_cash
-        self.value_df.iloc[0, self.value_df.columns.get_loc("open_position")] = 0.0
+        self.cash[0] = initial_cash
+        self.open_position[0] = 0.0
 
-        self.positions: list[Position] = []
+        # Open positions in opening order, and the lots of each ticker
+        self.__open_positions: dict[int, Position] = {}
+        self.__lots: dict[Ticker, deque[Position]] = {}
         self.trades: list[Trade] = []
         self.transactions: list[Transaction] = []
         self.dropped_transaction: list[Transaction] = []
         self.tickers: set[Ticker] = set()
         self.cached_df_values: dict[Ticker, Number] = {}
 
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_Account__value_df"] = None
+        # Open positions are keyed by id, which does not survive pickling
+        state["_Account__open_positions"] = list(self.__open_positions.values())
+        return state
+
+    def __setstate__(self, state: dict):
+        positions = state["_Account__open_positions"]
+        state["_Account__open_positions"] = {id(p): p for p in positions}
+        self.__dict__.update(state)
+
+    @property
+    def positions(self) -> list[Position]:
+        return list(self.__open_positions.values())
+
+    def has_positions(self) -> bool:
+        return len(self.__open_positions) != 0
+
+    def get_positions(self, ticker: Ticker) -> list[Position]:
+        lots = self.__lots.get(ticker)
+        return list(lots) if lots else []
+
+    def get_position_tickers(self) -> list[Ticker]:
+        return list(self.__lots.keys())
+
+    @property
+    def value_df(self) -> pd.DataFrame:
+        """The cash and open position values as a frame, built on first access."""
+        if self.__value_df is None:
+            self.__value_df = pd.DataFrame(
+                {"cash": self.cash, "open_position": self.open_position},
+                index=self.time_index,
+            )
+        return self.__value_df
+
+    def set_cash_and_open_value(self, cash: np.ndarray, open_position: np.ndarray):
+        self.cash[:] = cash
+        self.open_position[:] = open_position
+        self.__value_df = None
+
+    def extend_time_index(self, time_index: pd.DatetimeIndex):
+        """Extend the account to `time_index`, which starts with the current one."""
+        n_dates = len(self.time_index)
+        assert time_index[:n_dates].equals(self.time_index)
+
+        for i, date in enumerate(time_index[n_dates:], start=n_dates):
+            self.date_loc[date] = i
+        self.time_index = time_index
+
+        new_rows = np.full(len(time_index) - n_dates, np.nan, dtype=np.float64)
+        self.cash = np.concatenate([self.cash, new_rows])
+        self.open_position = np.concatenate([self.open_position, new_rows])
+        self.__update_cash(n_dates - 1)
+        self.__value_df = None
+
     def get_cash(self, date: Date) -> Number:
-        cash = to_number(self.value_df.loc[date, "cash"])
+        cash = to_number(self.cash[self.date_loc[date]])
         return cash
 
     def get_value(self, date: Date) -> Number:
-        cash = self.get_cash(date)
-        open_position_value = self.value_df.loc[date, "open_position"]
-        value = cash + open_position_value
-        return value
+        date_idx = self.date_loc[date]
+        value = self.cash[date_idx] + self.open_position[date_idx]
+        return to_number(value)
 
     def get_min_of_cash_and_value(self, date: Date) -> Number:
         cash = self.get_cash(date)
@@ -320,50 +413,77 @@ class Account:
         return min(cash, value)
 
     def add_transaction(self, transaction: Transaction):
-        if self.value_df.loc[transaction.execution_date, "cash"] + transaction.cost < 0:
+        date_idx = self.date_loc[transaction.execution_date]
+        if self.cash[date_idx] + transaction.cost < 0:
             self.dropped_transaction.append(transaction)
             return
 
-        self.value_df.loc[transaction.execution_date, "cash"] += transaction.cost
+        self.cash[date_idx] += transaction.cost
+        self.__value_df = None
+        self.book_transaction(transaction)
 
+    def book_transaction(self, transaction: Transaction):
+        """Record an already paid transaction and open or close the matching position."""
         self.transactions.append(transaction)
 
+        ticker = transaction.order.ticker
+        lots = self.__lots.get(ticker)
+
+        # The most recent matching lot is closed, as when positions were a list.
+        # It is usually the last one, popped in O(1). Only lots of another
+        # quantity make the scan go further
         position_to_be_closed = None
-        for position in self.positions:
-            if position.is_closed_by(transaction):
-                position_to_be_closed = position
+        if lots:
+            if lots[-1].is_closed_by(transaction):
+                position_to_be_closed = lots.pop()
+            else:
+                for lot_idx in range(len(lots) - 2, -1, -1):
+                    if lots[lot_idx].is_closed_by(transaction):
+                        position_to_be_closed = lots[lot_idx]
+                        del lots[lot_idx]
+                        break
 
         if position_to_be_closed:
-            self.positions.remove(position_to_be_closed)
+            assert lots is not None
+            if not lots:
+                del self.__lots[ticker]
+            del self.__open_positions[id(position_to_be_closed)]
             trade = position_to_be_closed.close(transaction)
             self.trades.append(trade)
         else:
-            self.positions.append(Position(transaction))
+            position = Position(transaction)
+            self.__lots.setdefault(ticker, deque()).append(position)
+            self.__open_positions[id(position)] = position
 
-    def update_cash_and_open_value(self, order_processor: OrderProcessor, date: Date):
-        self.__update_cash(date)
-        self.__update_open_position(order_processor, date)
+    def update_cash_and_open_value(
+        self, order_processor: OrderProcessor, date_idx: int
+    ):
+        self.__update_cash(date_idx)
+        self.__update_open_position(order_processor, date_idx)
+        self.__value_df = None
+
+    def __update_cash(self, date_idx: int):
+        if date_idx < len(self.cash) - 1:
+            self.cash[date_idx + 1] = self.cash[date_idx]
 
-    def __update_cash(self, date: Date):
-        idx = self.value_df.index.get_loc(date)
-        assert isinstance(idx, int)
-        if idx < len(self.value_df.index) - 1:
-            current_cash_value = self.value_df.loc[date, "cash"]
-            next_date = self.value_df.index[idx + 1]
-            self.value_df.loc[next_date, "cash"] = current_cash_value
+    def fast_forward(self, start_idx: int, end_idx: int):
+        """Carry the cash of `start_idx` over [start_idx, end_idx) with no positions."""
+        self.cash[start_idx + 1 : end_idx + 1] = self.cash[start_idx]
+        self.open_position[start_idx:end_idx] = 0.0
+        self.__value_df = None
 
-    def __update_open_position(self, order_processor: OrderProcessor, date: Date):
+    def __update_open_position(self, order_processor: OrderProcessor, date_idx: int):
         value_at_date = 0.0
-        for p in self.positions:
+        for p in self.__open_positions.values():
             ticker = p.transaction.order.ticker
-            if order_processor.has_record(p.transaction.order, date):
-                value = order_processor.value_at(p.transaction.order, date)
+            if order_processor.has_record(p.transaction.order, date_idx):
+                value = order_processor.value_at(p.transaction.order, date_idx)
                 self.cached_df_values[ticker] = value
             else:
                 value = self.cached_df_values[ticker]
 
             value_at_date += value
-        self.value_df.loc[date, "open_position"] = value_at_date
+        self.open_position[date_idx] = value_at_date
 
 
 @dataclass
@@ -374,54 +494,133 @@ class Broker:
         comission: Number,
         stock_dfs: Stock_dfs,
         slippage: Slippage | None = None,
+        panel: AlignedPanel | None = None,
     ):
         self.account = account
         self.comission = comission
-        self.order_queue: list[Order] = []
+
+        # Queued orders bucketed by the date index of the next record of their
+        # ticker, which is when they can fill. Orders of tickers with no further
+        # records are kept apart and never filled.
+        self.order_buckets: dict[int, list[Order]] = {}
+        self.unfillable_orders: list[Order] = []
+        self.last_date_idx = -1
         if not slippage:
             slippage = SlippageOnClose()
-        self.order_processor = OrderProcessor(stock_dfs, comission, slippage)
+        if panel is None:
+            panel = AlignedPanel(stock_dfs, account.time_index)
+        self.panel = panel
+        self.order_processor = OrderProcessor(stock_dfs, comission, slippage, panel)
+
+        self.expiring_tickers = self.__get_expiring_tickers()
         self.stock_dfs = stock_dfs
 
-    def __process_queue(self, date: Date):
-        executable_orders = []
-        for order in self.order_queue:
-            if self.order_processor.can_execute_order(order, date):
-                executable_orders.append(order)
+    def __get_expiring_tickers(self) -> dict[int, set[Ticker]]:
+        """Tickers by the date index of their second to last record."""
+        expiring_tickers: dict[int, set[Ticker]] = {}
+        for ticker_idx, date_idx in enumerate(self.panel.second_to_last_bar().tolist()):
+            if date_idx != -1:
+                ticker = self.panel.tickers[ticker_idx]
+                expiring_tickers.setdefault(date_idx, set()).add(ticker)
+        return expiring_tickers
+
+    def set_panel(self, panel: AlignedPanel):
+        """Look prices up in `panel`, which has the dates of the current one."""
+        self.panel = panel
+        self.order_processor.panel = panel
+        self.order_processor.stock_dfs.panel = panel
+
+    def on_panel_appended(self):
+        """
+        Catch up with new rows appended to the panel.
+
+        Orders that had no record left to fill at now fill at the next new record of
+        their ticker, and the account is extended to the new dates.
+        """
+        self.account.extend_time_index(self.panel.time_index)
+        self.expiring_tickers = self.__get_expiring_tickers()
+
+        unfillable_orders, self.unfillable_orders = self.unfillable_orders, []
+        for order in unfillable_orders:
+            self.queue_orders([order], self.panel.get_date_idx(order.date))
 
-        for order in executable_orders:
-            transaction = self.order_processor.process_order(order, date)
+    @property
+    def order_queue(self) -> list[Order]:
+        """
+        All queued orders, in the order they will be filled.
+
+        The list is a copy, changing it does not change the queue. Assigning a
+        list (e.g. `broker.order_queue += orders`) queues its orders again.
+        """
+        orders = []
+        for date_idx in sorted(self.order_buckets):
+            orders += self.order_buckets[date_idx]
+        return orders + self.unfillable_orders
+
+    @order_queue.setter
+    def order_queue(self, orders: list[Order]):
+        self.order_buckets = {}
+        self.unfillable_orders = []
+        self.queue_orders(orders, self.last_date_idx)
+
+    def has_queued_orders(self) -> bool:
+        return len(self.order_buckets) != 0 or len(self.unfillable_orders) != 0
+
+    def queue_orders(self, orders: list[Order], date_idx: int) -> list[int]:
+        """Queue orders placed at `date_idx` and return the date indices they fill at."""
+        fill_dates = []
+        for order in orders:
+            ticker_idx = self.panel.get_ticker_idx(order.ticker)
+            fill_date_idx = self.panel.next_bar(ticker_idx, date_idx)
+            if fill_date_idx == -1:
+                self.unfillable_orders.append(order)
+                continue
+            self.order_buckets.setdefault(fill_date_idx, []).append(order)
+            fill_dates.append(fill_date_idx)
+        return fill_dates
+
+    def pop_orders(self, date_idx: int) -> list[Order]:
+        """Remove and return the queued orders that fill at `date_idx`, in order."""
+        return self.order_buckets.pop(date_idx, [])
+
+    def __process_queue(self, date_idx: int):
+        for order in self.pop_orders(date_idx):
+            assert self.order_processor.can_execute_order(order, date_idx)
+            transaction = self.order_processor.process_order(order, date_idx)
             self.account.add_transaction(transaction)
-            self.order_queue.remove(order)
 
-    def __update_account(self, date: Date):
-        self.account.update_cash_and_open_value(self.order_processor, date)
+    def __update_account(self, date_idx: int):
+        self.account.update_cash_and_open_value(self.order_processor, date_idx)
 
     def add_orders(self, orders: list[Order]):
-        self.order_queue += orders
+        self.queue_orders(orders, self.last_date_idx)
 
     def add_closing_orders_for_near_expiration_positions(self, date: Date):
-        closing_orders: list[Order] = []
+        date_idx = self.panel.get_date_idx(date)
+        expiring_tickers = self.expiring_tickers.get(date_idx)
 
-        for position in self.account.positions:
-            ticker = position.transaction.order.ticker
-            stock_data = self.stock_dfs.get(ticker)
+        # Only positions of stocks nearing their last trading day are closed
+        if not expiring_tickers or not self.account.has_positions():
+            return
 
-            # Proceed only if we have data for the ticker
-            if stock_data is not None and date in stock_data.index:
-                current_index = stock_data.index.get_loc(date)
-                is_second_to_last_day = current_index == len(stock_data.index) - 2
+        closing_orders: list[Order] = []
+        for position in self.account.positions:
+            if position.transaction.order.ticker in expiring_tickers:
+                closing_order = position.get_closing_order(date)
+                closing_orders.append(closing_order)
 
-                # If the stock is nearing its last trading day, create a closing order
-                if is_second_to_last_day:
-                    closing_order = position.get_closing_order(date)
-                    closing_orders.append(closing_order)
+        self.queue_orders(closing_orders, date_idx)
 
-        self.order_queue += closing_orders
+    def fast_forward(self, start_idx: int, end_idx: int):
+        """Update the account over dates with no orders and no open positions."""
+        assert not self.has_queued_orders() and not self.account.has_positions()
+        self.account.fast_forward(start_idx, end_idx)
 
     def update(self, date: Date):
-        self.__process_queue(date)
-        self.__update_account(date)
+        date_idx = self.panel.get_date_idx(date)
+        self.last_date_idx = date_idx
+        self.__process_queue(date_idx)
+        self.__update_account(date_idx)
 
 
 @dataclass
@@ -431,10 +630,10 @@ class BrokerBuilder:
     stock_dfs: Stock_dfs
     slippage: Slippage | None = None
 
-    def build(self, time_index) -> Broker:
+    def build(self, time_index, panel: AlignedPanel | None = None) -> Broker:
 
         if not self.slippage:
             self.slippage = SlippageOnClose()
 
         account = Account(self.initial_cash, time_index)
-        return Broker(account, self.comission, self.stock_dfs, self.slippage)
+        return Broker(account, self.comission, self.stock_dfs, self.slippage, panel)
@@ -0,0 +1,49 @@
+import os
+import pickle
+from dataclasses import dataclass
+from pathlib import Path
+
+import pandas as pd
+
+from ekeko.backtrader.broker import Account, Order
+from ekeko.core.types import Stock_dfs, Ticker
+
+
+CHECKPOINT_VERSION = 1
+
+
+@dataclass
+class Checkpoint:
+    """State of an `Engine` after processing the dates before `date_idx`."""
+
+    version: int
+    stock_dfs_hash: str
+    time_index: pd.DatetimeIndex
+    date_idx: int
+    is_done: bool
+    account: Account
+    order_buckets: dict[int, list[Order]]
+    unfillable_orders: list[Order]
+    last_date_idx: int
+    signal_dfs: Stock_dfs
+    signal_errors: dict[Ticker, str]
+
+
+def write_checkpoint(path: Path | str, checkpoint: Checkpoint):
+    """Pickle the checkpoint to `path`, replacing any existing file atomically."""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + f".tmp{os.getpid()}")
+    with open(tmp_path, "wb") as file:
+        pickle.dump(checkpoint, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def read_checkpoint(path: Path | str) -> Checkpoint:
+    with open(path, "rb") as file:
+        checkpoint = pickle.load(file)
+
+    if not isinstance(checkpoint, Checkpoint):
+        raise ValueError(f"{path} is not an engine checkpoint")
+    if checkpoint.version != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version {checkpoint.version}")
+    return checkpoint
@@ -1,12 +1,27 @@
-from tqdm.autonotebook import tqdm
+import copy
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
 
 from ekeko.backtrader.report import Report, ReportBuilder
 from ekeko.core import Ticker, Date, Stock_dfs
+from ekeko.core.hashing import combine_frame_hashes, hash_frame
+from ekeko.core.telemetry import Telemetry
 from ekeko.backtrader.broker import BrokerBuilder, Order, Position, Account
-from ekeko.core.types import to_date
+from ekeko.backtrader.checkpoint import (
+    CHECKPOINT_VERSION,
+    Checkpoint,
+    read_checkpoint,
+    write_checkpoint,
+)
+from ekeko.backtrader.panel import AlignedPanel
+from ekeko.backtrader.signal_cache import hash_strategy, open_signal_cache
+from ekeko.backtrader.signals import evaluate_signals, evaluate_signals_in_parallel
+from ekeko.config import config
+from ekeko.core.signal_type import ENTRY, EXIT
 
-from typing import Any, Dict, Protocol
+from typing import Any, Dict, List, Protocol
 from abc import ABC, abstractmethod
 
 
@@ -17,18 +32,84 @@ class Strategy(Protocol):
     def evaluate(self, stock_df) -> Any: ...
 
 
+class FrozenParams(dict):
+    """Read-only params of a strategy copy, see `BaseStrategy.with_params`."""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("These params are read-only, use with_params for new ones")
+
+    __setitem__ = _read_only
+    __delitem__ = _read_only
+    __ior__ = _read_only
+    clear = _read_only
+    pop = _read_only
+    popitem = _read_only
+    setdefault = _read_only
+    update = _read_only
+
+    def __reduce__(self):
+        return FrozenParams, (dict(self),)
+
+
+def get_strategy_with_params(strategy: Strategy, params: Dict[str, Any]) -> Strategy:
+    """A copy of the strategy with `params` set, leaving the strategy untouched."""
+    if isinstance(strategy, BaseStrategy):
+        return strategy.with_params(**params)
+
+    # Strategies outside of the class hierarchy get their own params dict
+    strategy = copy.copy(strategy)
+    strategy.params = {**getattr(strategy, "params", {}), **params}
+    return strategy
+
+
 class BaseStrategy(ABC):
     params: Dict[str, Any] = {}
+    # Number of previous bars the signal of a bar depends on, None if unbounded.
+    # Lets `Engine.append_bars` re-evaluate only the tail of the stock dfs.
+    lookback: int | None = None
 
     def set_params(self, **kwargs):
-        """Generic implementation to update parameters."""
-        self.params.update(kwargs)
+        """Update the parameters of this instance, class defaults are left untouched."""
+        self.params = {**self.params, **kwargs}
+
+    def with_params(self, **kwargs) -> "BaseStrategy":
+        """
+        A copy of the strategy with updated parameters, which are read-only.
+
+        Copies share no params with this instance nor with the class, so they can
+        be evaluated at the same time from several threads.
+        """
+        strategy = copy.copy(self)
+        strategy.params = FrozenParams({**self.params, **kwargs})
+        return strategy
 
     @abstractmethod
     def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
         """To be implemented by specific strategies."""
         pass
 
+    def evaluate_params(
+        self, stock_df: pd.DataFrame, param_sets: List[Dict[str, Any]]
+    ) -> pd.DataFrame:
+        """
+        Signals of every parameter set, with a parameter axis on the columns.
+
+        Columns are (column, i) pairs, where i is the position of the parameter set
+        in `param_sets`, so `signal[ENTRY]` has one column per set. The default
+        evaluates the strategy once per set; strategies that can compute the
+        signals of many sets at once (e.g. with 2D rolling windows) override it.
+        """
+        signal_dfs = [
+            self.with_params(**param_set).evaluate(stock_df) for param_set in param_sets
+        ]
+        return stack_param_signals(signal_dfs)
+
+
+def stack_param_signals(signal_dfs: List[pd.DataFrame]) -> pd.DataFrame:
+    """Stack the signal dfs of several parameter sets along a parameter axis."""
+    signal = pd.concat(signal_dfs, axis=1, keys=range(len(signal_dfs)))
+    return signal.swaplevel(axis=1)
+
 
 class Trader(Protocol):
 
@@ -43,33 +124,146 @@ class Trader(Protocol):
     ) -> list[Order]: ...
 
 
+class EventIndex:
+    """Tickers with an ENTRY or EXIT signal at each date of the panel."""
+
+    def __init__(self, panel: AlignedPanel, signal_dfs: Stock_dfs):
+        self.has_signal = np.zeros((0, panel.n_tickers), dtype=bool)
+        self.tickers = np.zeros(0, dtype=np.intp)
+        self.offsets = np.zeros(1, dtype=np.intp)
+        self.dates = np.zeros(0, dtype=np.intp)
+        self.n_dates = 0
+        self.append(panel, signal_dfs)
+
+    def append(self, panel: AlignedPanel, signal_dfs: Stock_dfs):
+        """Index the dates the panel has past the ones already indexed."""
+        start = self.n_dates
+        events = panel.align(signal_dfs, ENTRY, False, bool, start)
+        events |= panel.align(signal_dfs, EXIT, False, bool, start)
+        has_signal = panel.align_index(signal_dfs, start)
+
+        event_dates, tickers = np.nonzero(events)
+        event_dates += start
+        offsets = np.searchsorted(event_dates, np.arange(start + 1, panel.n_dates + 1))
+
+        self.has_signal = np.concatenate([self.has_signal, has_signal])
+        self.offsets = np.concatenate([self.offsets, offsets + len(self.tickers)])
+        self.tickers = np.concatenate([self.tickers, tickers])
+        self.dates = np.concatenate([self.dates, np.unique(event_dates)])
+        self.n_dates = panel.n_dates
+
+    @staticmethod
+    def supports(signal_dfs: Stock_dfs) -> bool:
+        return all(
+            ENTRY in signal_df.columns and EXIT in signal_df.columns
+            for signal_df in signal_dfs.values()
+        )
+
+    def get_tickers(self, date_idx: int) -> np.ndarray:
+        return self.tickers[self.offsets[date_idx] : self.offsets[date_idx + 1]]
+
+    def has_events(self, date_idx: int) -> bool:
+        return self.offsets[date_idx] != self.offsets[date_idx + 1]
+
+    def next_date(self, date_idx: int) -> int:
+        """First date index from `date_idx` on with a signal, n_dates if none."""
+        pos = int(np.searchsorted(self.dates, date_idx))
+        return int(self.dates[pos]) if pos < len(self.dates) else self.n_dates
+
+
 class Engine:
 
     def __init__(
-        self, trader: Trader, strategy: Strategy, broker_builder: BrokerBuilder
+        self,
+        trader: Trader,
+        strategy: Strategy,
+        broker_builder: BrokerBuilder,
+        sparse: bool | None = None,
+        signal_dfs: Stock_dfs | None = None,
+        panel: AlignedPanel | None = None,
     ):
+        """
+        Args:
+            trader: The trading logic.
+            strategy: Strategy evaluated on every stock df to produce the signals.
+            broker_builder: Builder for the broker class.
+            sparse: When the signal frames have ENTRY and EXIT columns, only call the
+                trader for tickers with a signal or an open position, and skip dates
+                with nothing to do. By default it is on for traders that declare
+                `signal_driven = True`, i.e. that only open positions on bars with
+                an ENTRY or EXIT signal, and off for the others.
+            signal_dfs: Signal frames the strategy already produced for the stock
+                dfs, in which case it is not evaluated again.
+            panel: Panel of the stock dfs, shared by engines that run on the same
+                data. `append_bars` extends a copy of it, owned by the engine.
+        """
         self.trader = trader
+        self.strategy = strategy
         self.stock_dfs = broker_builder.stock_dfs
-        self.time_index = self.__get_timeindex_union(self.stock_dfs)
-        self.broker = broker_builder.build(self.time_index)
-        self.signal_dfs = self.__init_signal_dfs(self.stock_dfs, strategy)
+        # A panel of the caller is copied before bars are appended to it
+        self.__owns_panel = panel is None
+        if panel is None:
+            panel = AlignedPanel(self.stock_dfs)
+        self.panel = panel
+        self.time_index = panel.time_index
+        self.broker = broker_builder.build(self.time_index, self.panel)
+        self.signal_errors: dict[Ticker, str] = {}
+        if signal_dfs is None:
+            signal_dfs = self.__init_signal_dfs(self.stock_dfs, strategy)
+        self.signal_dfs = signal_dfs
+        if sparse is None:
+            sparse = getattr(trader, "signal_driven", False)
+        self.events = (
+            EventIndex(self.panel, self.signal_dfs)
+            if sparse and EventIndex.supports(self.signal_dfs)
+            else None
+        )
 
-    def __get_timeindex_union(self, stock_dfs: Stock_dfs) -> pd.DatetimeIndex:
-        timeindex = pd.DatetimeIndex([])
+        # Next date to process, and whether the end of the data was processed
+        self.date_idx = 0
+        self.is_done = False
+        # Hashes of the stock dfs for checkpoints, computed on the first one
+        self.__frame_hashes: dict[Ticker, str] | None = None
+        self.report_builder = ReportBuilder(
+            self.broker.account, self.signal_dfs, self.stock_dfs
+        )
 
-        for df in stock_dfs.values():
-            timeindex = timeindex.union(df.index)
+    def __init_signal_dfs(self, stock_dfs: Stock_dfs, strategy: Strategy) -> Stock_dfs:
+        cache = open_signal_cache()
+        if cache is None:
+            return self.__evaluate_signals(stock_dfs, strategy)
 
-        timeindex = pd.to_datetime(timeindex)
-        # TODO[p=High]: What if there are different timezones, etc?
-        assert isinstance(timeindex, pd.DatetimeIndex)
-        return timeindex
+        strategy_hash = hash_strategy(strategy)
+        keys = {
+            ticker: cache.get_key(stock_df, strategy_hash)
+            for ticker, stock_df in stock_dfs.items()
+        }
 
-    def __init_signal_dfs(self, stock_dfs: Stock_dfs, strategy: Strategy) -> Stock_dfs:
         signal_dfs = dict()
-        for ticker, stock_df in stock_dfs.items():
-            signal_df = strategy.evaluate(stock_df)
-            signal_dfs[ticker] = signal_df
+        for ticker, key in keys.items():
+            signal_df = cache.get(key)
+            if signal_df is not None:
+                signal_dfs[ticker] = signal_df
+
+        missing = {t: df for t, df in stock_dfs.items() if t not in signal_dfs}
+        if len(missing) != 0:
+            evaluated = self.__evaluate_signals(missing, strategy)
+            for ticker, signal_df in evaluated.items():
+                cache.put(keys[ticker], signal_df)
+            signal_dfs.update(evaluated)
+
+        return {t: signal_dfs[t] for t in stock_dfs.keys() if t in signal_dfs}
+
+    def __evaluate_signals(self, stock_dfs: Stock_dfs, strategy: Strategy) -> Stock_dfs:
+        if not config.parallel_signals:
+            return evaluate_signals(stock_dfs, strategy)
+
+        signal_dfs, signal_errors = evaluate_signals_in_parallel(
+            stock_dfs, strategy, config.num_processors
+        )
+        for ticker, error in signal_errors.items():
+            print(f"{ticker} is left out, its signal evaluation failed: {error}")
+        self.signal_errors.update(signal_errors)
 
         return signal_dfs
 
@@ -79,40 +273,249 @@ class Engine:
         if date in signal_df.index:
             signal = signal_df.loc[date]
             stock_row = self.stock_dfs[ticker].loc[date]
-            open_positions = [
-                p
-                for p in self.broker.account.positions
-                if p.transaction.order.ticker == ticker
-            ]
+            open_positions = self.broker.account.get_positions(ticker)
             orders = self.trader.trade(
                 self.broker.account, date, ticker, signal, stock_row, open_positions
             )
         return orders
 
-    def run(self) -> Report:
+    def __get_active_tickers(self, date_idx: int) -> list[Ticker]:
+        if self.events is None:
+            return list(self.signal_dfs.keys())
+
+        active = set(self.events.get_tickers(date_idx).tolist())
+        for ticker in self.broker.account.get_position_tickers():
+            ticker_idx = self.panel.get_ticker_idx(ticker)
+            if self.events.has_signal[date_idx, ticker_idx]:
+                active.add(ticker_idx)
+
+        # Orders of a date are queued in ticker order, as the broker fills them in order
+        return [self.panel.tickers[ticker_idx] for ticker_idx in sorted(active)]
 
-        tickers = self.signal_dfs.keys()
-        dates = (
-            self.time_index
-            if len(tickers) < 5
-            else tqdm(self.time_index, desc="Fishing ><> ~ ><>")
+    def __is_idle(self, date_idx: int) -> bool:
+        return (
+            self.events is not None
+            and not self.events.has_events(date_idx)
+            and not self.broker.has_queued_orders()
+            and not self.broker.account.has_positions()
         )
 
-        for date in dates:
-            orders: list[Order] = []
+    def __process_date(self, date_idx: int, live: bool = False):
+        date = self.panel.dates[date_idx]
+        orders: list[Order] = []
 
-            self.broker.update(date)
+        self.broker.update(date)
 
-            for ticker in tickers:
-                orders += self.__get_orders(date, ticker)
+        for ticker in self.__get_active_tickers(date_idx):
+            orders += self.__get_orders(date, ticker)
 
-            before_last_date = to_date(self.time_index[-2])
-            if date != before_last_date:
-                self.broker.add_orders(orders)
+        # Live data has no end: orders of the last dates fill once new bars arrive,
+        # and positions are not closed ahead of the last record of their ticker.
+        if live:
+            self.broker.add_orders(orders)
+            return
 
-            self.broker.add_closing_orders_for_near_expiration_positions(date)
+        # Orders of the day before the last one cannot be filled
+        if date_idx != self.panel.n_dates - 2:
+            self.broker.add_orders(orders)
 
-        report_builder = ReportBuilder(
-            self.broker.account, self.signal_dfs, self.stock_dfs
+        self.broker.add_closing_orders_for_near_expiration_positions(date)
+
+    def __process_dates(
+        self,
+        live: bool,
+        telemetry: Telemetry | None = None,
+        checkpoint_path: Path | str | None = None,
+        checkpoint_every: int = 250,
+    ):
+        n_dates = self.panel.n_dates
+        date_idx = self.date_idx
+        last_checkpoint_idx = date_idx
+        if telemetry is not None:
+            # Number of ticker bars before each date
+            bars = np.concatenate([[0], np.cumsum(self.panel.has_bar.sum(axis=1))])
+        while date_idx < n_dates:
+            if self.__is_idle(date_idx):
+                assert self.events is not None
+                next_date_idx = self.events.next_date(date_idx)
+                self.broker.fast_forward(date_idx, next_date_idx)
+            else:
+                self.__process_date(date_idx, live)
+                next_date_idx = date_idx + 1
+
+            if telemetry is not None:
+                n_bars = int(bars[next_date_idx] - bars[date_idx])
+                telemetry.update(next_date_idx - date_idx, n_bars)
+            date_idx = next_date_idx
+            self.date_idx = date_idx
+
+            if (
+                checkpoint_path is not None
+                and date_idx - last_checkpoint_idx >= checkpoint_every
+                and date_idx < n_dates
+            ):
+                self.checkpoint(checkpoint_path)
+                last_checkpoint_idx = date_idx
+
+    def run(
+        self,
+        checkpoint_path: Path | str | None = None,
+        checkpoint_every: int = 250,
+        telemetry: Telemetry | None = None,
+    ) -> Report:
+        """
+        Process the dates left and build the report.
+
+        Args:
+            checkpoint_path: If given, the engine state is saved there every
+                `checkpoint_every` dates, see `checkpoint` and `resume`.
+            checkpoint_every: Number of dates between checkpoints.
+            telemetry: Tracks the dates processed, as tasks, and their ticker
+                bars. By default a progress bar is shown for 5 tickers or more.
+        """
+        if telemetry is None and len(self.signal_dfs) >= 5:
+            telemetry = Telemetry()
+
+        if telemetry is not None:
+            telemetry.start(self.panel.n_dates, "Fishing ><> ~ ><>", self.date_idx)
+        try:
+            self.__process_dates(False, telemetry, checkpoint_path, checkpoint_every)
+        finally:
+            if telemetry is not None:
+                telemetry.close()
+        self.is_done = True
+
+        return self.report_builder.build()
+
+    def checkpoint(self, path: Path | str):
+        """Save the state of the engine to `path`, to be picked up by `resume`."""
+        if self.__frame_hashes is None:
+            self.__frame_hashes = {
+                t: hash_frame(df) for t, df in self.stock_dfs.items()
+            }
+        checkpoint = Checkpoint(
+            CHECKPOINT_VERSION,
+            combine_frame_hashes(self.__frame_hashes),
+            self.time_index,
+            self.date_idx,
+            self.is_done,
+            self.broker.account,
+            self.broker.order_buckets,
+            self.broker.unfillable_orders,
+            self.broker.last_date_idx,
+            self.signal_dfs,
+            self.signal_errors,
+        )
+        write_checkpoint(path, checkpoint)
+
+    @classmethod
+    def resume(
+        cls,
+        path: Path | str,
+        trader: Trader,
+        strategy: Strategy,
+        broker_builder: BrokerBuilder,
+        sparse: bool | None = None,
+    ) -> "Engine":
+        """
+        Build an engine in the state saved at `path` by `checkpoint`.
+
+        The stock dfs of the broker builder must be the ones the engine had when
+        the checkpoint was saved, the strategy is not evaluated again. `run` then
+        picks up at the next date to process.
+        """
+        checkpoint = read_checkpoint(path)
+        frame_hashes = {
+            ticker: hash_frame(stock_df)
+            for ticker, stock_df in broker_builder.stock_dfs.items()
+        }
+        if combine_frame_hashes(frame_hashes) != checkpoint.stock_dfs_hash:
+            raise ValueError(f"The stock dfs are not the ones checkpointed in {path}")
+
+        engine = cls(trader, strategy, broker_builder, sparse, checkpoint.signal_dfs)
+        assert engine.time_index.equals(checkpoint.time_index)
+        engine.__frame_hashes = frame_hashes
+
+        engine.date_idx = checkpoint.date_idx
+        engine.is_done = checkpoint.is_done
+        engine.signal_errors = checkpoint.signal_errors
+
+        broker = engine.broker
+        broker.account = checkpoint.account
+        broker.order_buckets = checkpoint.order_buckets
+        broker.unfillable_orders = checkpoint.unfillable_orders
+        broker.last_date_idx = checkpoint.last_date_idx
+        engine.report_builder = ReportBuilder(
+            broker.account, engine.signal_dfs, engine.stock_dfs
         )
-        return report_builder.build()
+
+        return engine
+
+    def append_bars(self, new_stock_dfs: Stock_dfs) -> Report:
+        """
+        Append new rows to the stock dfs and process the dates not processed yet.
+
+        The rows of each ticker must come after the last date of the engine. Signals
+        are re-evaluated on the last `strategy.lookback` bars plus the new ones (on
+        the whole stock df if the strategy has no lookback), and the new dates are
+        processed as live data: orders of the last date are filled on the next
+        appended bar. The stock dfs of the broker builder are extended in place.
+
+        Returns:
+            The report of the account so far.
+        """
+        if self.is_done:
+            raise RuntimeError("Cannot append bars to an engine that already ran")
+
+        new_stock_dfs = {t: df for t, df in new_stock_dfs.items() if len(df) != 0}
+        if not self.__owns_panel:
+            self.panel = self.panel.copy()
+            self.broker.set_panel(self.panel)
+            self.__owns_panel = True
+        self.panel.append(new_stock_dfs)
+        self.time_index = self.panel.time_index
+
+        for ticker, new_rows in new_stock_dfs.items():
+            stock_df = self.stock_dfs[ticker]
+            self.stock_dfs[ticker] = pd.concat([stock_df, new_rows])
+            self.stock_dfs[ticker].attrs = stock_df.attrs
+            if self.__frame_hashes is not None:
+                self.__frame_hashes[ticker] = hash_frame(self.stock_dfs[ticker])
+
+        self.broker.on_panel_appended()
+        self.__append_signals(new_stock_dfs)
+        if self.events is not None:
+            self.events.append(self.panel, self.signal_dfs)
+
+        # Dates processed before are final, catch up from the first new one
+        self.__process_dates(live=True)
+
+        return self.report_builder.build()
+
+    def step(self, new_bars: dict[Ticker, pd.Series], date: Date) -> Report:
+        """Append one bar per ticker at `date`, see `append_bars`."""
+        new_stock_dfs = {
+            ticker: pd.DataFrame([bar], index=pd.DatetimeIndex([date]))
+            for ticker, bar in new_bars.items()
+        }
+        return self.append_bars(new_stock_dfs)
+
+    def __append_signals(self, new_stock_dfs: Stock_dfs):
+        lookback = getattr(self.strategy, "lookback", None)
+
+        for ticker, new_rows in new_stock_dfs.items():
+            if ticker not in self.signal_dfs:
+                continue
+
+            stock_df = self.stock_dfs[ticker]
+            if lookback is None:
+                self.signal_dfs[ticker] = self.strategy.evaluate(stock_df)
+                continue
+
+            n_rows = len(new_rows)
+            window = stock_df.iloc[-(n_rows + lookback) :]
+            signal_tail = self.strategy.evaluate(window).iloc[-n_rows:]
+
+            signal_df = self.signal_dfs[ticker]
+            self.signal_dfs[ticker] = pd.concat([signal_df, signal_tail])
+            self.signal_dfs[ticker].attrs = signal_df.attrs
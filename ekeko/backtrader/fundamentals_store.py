@@ -0,0 +1,80 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict
+
+from ekeko.core.types import Ticker
+
+
+class FundamentalsStore:
+    """
+    SQLite store of the fundamentals of each ticker (e.g. its market cap), with
+    the time they were fetched.
+
+    Screens read them back while they are younger than the TTL they ask for, so
+    screens with other thresholds do not fetch them again. Each thread opens its
+    own connection, and processes screening at once share the file.
+    """
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.__local = threading.local()
+        connection = self.__get_connection()
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fundamentals (
+                ticker TEXT PRIMARY KEY,
+                fields TEXT NOT NULL,
+                fetched REAL NOT NULL
+            )
+            """
+        )
+        connection.commit()
+
+    def __get_connection(self) -> sqlite3.Connection:
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30.0)
+            # Readers do not wait on the writer of another process
+            connection.execute("PRAGMA journal_mode=WAL")
+            self.__local.connection = connection
+        return connection
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self.__local = threading.local()
+
+    def put(self, ticker: Ticker, fields: Dict):
+        connection = self.__get_connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO fundamentals VALUES (?, ?, ?)",
+            (ticker, json.dumps(fields), time.time()),
+        )
+        connection.commit()
+
+    def get(self, ticker: Ticker, ttl: timedelta | None = None) -> Dict | None:
+        """The fields of the ticker, None if there are none or older than `ttl`."""
+        row = (
+            self.__get_connection()
+            .execute(
+                "SELECT fields, fetched FROM fundamentals WHERE ticker = ?", (ticker,)
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        fields, fetched = row
+        if ttl is not None and time.time() - fetched > ttl.total_seconds():
+            return None
+        return json.loads(fields)
+
+    def __len__(self) -> int:
+        connection = self.__get_connection()
+        return connection.execute("SELECT COUNT(*) FROM fundamentals").fetchone()[0]
@@ -1,12 +1,271 @@
+import heapq
+import threading
+from dataclasses import dataclass, replace
 from itertools import product
-from typing import Dict, List, Tuple, Callable, Any
+from pathlib import Path
+from typing import Dict, List, Literal, Tuple, Callable, Any
+import numpy as np
 import pandas as pd
-from joblib import Parallel, delayed
-from tqdm import tqdm
+from joblib import effective_n_jobs
 
-from ekeko.backtrader.engine import Engine, Strategy, Trader
-from ekeko.backtrader.report import Report
+from ekeko.backtrader.broker import BrokerBuilder
+from ekeko.backtrader.engine import (
+    Engine,
+    Strategy,
+    Trader,
+    get_strategy_with_params,
+)
+from ekeko.backtrader.panel import AlignedPanel
+from ekeko.backtrader.report import Report, ReportSummary
+from ekeko.backtrader.result_store import ResultStore, get_search_key
+from ekeko.backtrader.signal_cache import hash_strategy
+from ekeko.backtrader.signals import evaluate_signals_recording_params
 from ekeko.config import config
+from ekeko.core.frame_file import MappedFrames, write_frames
+from ekeko.core.executor import Executor, JoblibExecutor
+from ekeko.core.hashing import hash_frames, hash_params
+from ekeko.core.telemetry import TaskTimer, Telemetry, WorkerStats
+from ekeko.core.types import Date, Stock_dfs, Ticker
+from ekeko.core.universe import publish_universe
+
+
+MetricFns = Dict[str, Callable[[Report], float]]
+Backend = Literal["processes", "threads"]
+
+# Universe mapped by the current worker process, kept across its tasks
+_attached_universe: Tuple[Path, MappedFrames, Stock_dfs] | None = None
+_scaffoldings: Dict[Tuple, "Scaffolding"] = {}
+
+
+def attach_universe(path: Path, fingerprint: str | None = None) -> Stock_dfs:
+    """
+    Map the stock dfs written to `path` read-only, once per process.
+
+    Frames are views into the mapped file, so workers share the pages of the
+    universe instead of holding a copy each. If a `fingerprint` (see
+    `hash_frames`) is given, a ValueError is raised when the mapped stock dfs
+    do not match it, e.g. when a host sees a stale copy of the file.
+    """
+    global _attached_universe
+    if _attached_universe is None or _attached_universe[0] != path:
+        # Only the last universe is kept, so removed files get unmapped
+        detach_universe()
+        mapped_frames = MappedFrames(path)
+        stock_dfs = {ticker: mapped_frames[ticker] for ticker in mapped_frames}
+        if fingerprint is not None and hash_frames(stock_dfs) != fingerprint:
+            raise ValueError(f"The stock dfs in {path} do not match the search")
+        _attached_universe = (path, mapped_frames, stock_dfs)
+    return _attached_universe[2]
+
+
+def detach_universe():
+    global _attached_universe
+    _attached_universe = None
+    _scaffoldings.clear()
+
+
+_MISSING = object()
+
+
+class Scaffolding:
+    """
+    The parts of an engine that do not depend on params, built once per process.
+
+    Holds the stock dfs of a slice of the universe, their panel (time index,
+    ticker order and price arrays), and the last signal dfs of each strategy
+    along with the values of the params the strategy read to produce them.
+    """
+
+    max_signal_sets = 2
+
+    def __init__(self, stock_dfs: Stock_dfs):
+        self.stock_dfs = stock_dfs
+        self.panel = AlignedPanel(stock_dfs)
+        self.signal_sets: List[Tuple[str, Dict[str, Any], Stock_dfs]] = []
+        # Tasks of the thread backend share the scaffolding
+        self.lock = threading.Lock()
+
+    def get_signal_dfs(self, strategy: Strategy, strategy_key: str) -> Stock_dfs:
+        """Signal dfs of the strategy, evaluated only if a param it reads changed."""
+        params = strategy.params
+        with self.lock:
+            for key, read_params, signal_dfs in self.signal_sets:
+                if key == strategy_key and all(
+                    params.get(name, _MISSING) == value
+                    for name, value in read_params.items()
+                ):
+                    return signal_dfs
+
+        signal_dfs, read = evaluate_signals_recording_params(self.stock_dfs, strategy)
+        if read is not None:
+            read_params = {name: params.get(name, _MISSING) for name in read}
+            with self.lock:
+                self.signal_sets.insert(0, (strategy_key, read_params, signal_dfs))
+                del self.signal_sets[self.max_signal_sets :]
+        return signal_dfs
+
+
+def get_scaffolding(
+    path: Path, universe_slice: "UniverseSlice | None", fingerprint: str | None = None
+) -> Scaffolding:
+    stock_dfs = attach_universe(path, fingerprint)
+    key = universe_slice.get_key() if universe_slice is not None else ()
+    if key not in _scaffoldings:
+        if universe_slice is not None:
+            assert _attached_universe is not None
+            stock_dfs = universe_slice.apply(_attached_universe[1])
+        _scaffoldings[key] = Scaffolding(stock_dfs)
+    return _scaffoldings[key]
+
+
+def release_scaffolding(universe_slice: "UniverseSlice"):
+    """Drop the scaffolding of a slice that no task of this process needs anymore."""
+    _scaffoldings.pop(universe_slice.get_key(), None)
+
+
+@dataclass
+class UniverseSlice:
+    """
+    Part of the universe a task runs on: some tickers, from the `start` date on
+    and before the `stop` date.
+    """
+
+    tickers: List[Ticker] | None = None
+    start: Date | None = None
+    stop: Date | None = None
+
+    def apply(self, stock_dfs: Stock_dfs | MappedFrames) -> Stock_dfs:
+        """
+        The sliced stock dfs. Slices of mapped frames are views into the mapped
+        file, so date slices of a shared universe are not copied.
+        """
+        tickers = self.tickers if self.tickers is not None else list(stock_dfs)
+        sliced = dict()
+        for ticker in tickers:
+            if isinstance(stock_dfs, MappedFrames):
+                start, stop = self.__get_rows(stock_dfs.get_dates(ticker))
+                stock_df = stock_dfs.get_frame(ticker, start, stop)
+            else:
+                stock_df = stock_dfs[ticker]
+                start, stop = self.__get_rows(stock_df.index)
+                stock_df = stock_df.iloc[start:stop]
+            # Tickers need two records to trade
+            if len(stock_df) >= 2:
+                sliced[ticker] = stock_df
+        return sliced
+
+    def __get_rows(self, dates: pd.DatetimeIndex | np.ndarray) -> Tuple[int, int]:
+        # Mapped frames give their dates as int64 nanoseconds
+        as_nanoseconds = isinstance(dates, np.ndarray)
+        rows = []
+        for date, default in ((self.start, 0), (self.stop, len(dates))):
+            if date is None:
+                rows.append(default)
+            else:
+                date = pd.Timestamp(date).value if as_nanoseconds else date
+                rows.append(int(dates.searchsorted(date)))
+        return rows[0], rows[1]
+
+    def get_key(self) -> Tuple:
+        tickers = tuple(self.tickers) if self.tickers is not None else None
+        return (tickers, self.start, self.stop)
+
+
+class GridSearchTask:
+    """
+    Runs one parameter combination against a universe published to a file.
+
+    Pickling it sends the strategy, the trader and the broker settings but not the
+    stock dfs, which workers map from `universe_path` and check against
+    `universe_fingerprint` when given. Without a `universe_path` the task runs on
+    the stock dfs of the broker builder, for threads of the process that owns them.
+    """
+
+    def __init__(
+        self,
+        strategy: Strategy,
+        trader: Trader,
+        broker_builder: BrokerBuilder,
+        universe_path: Path | None,
+        metric_fns: MetricFns | None = None,
+        universe_fingerprint: str | None = None,
+    ):
+        self.strategy = strategy
+        self.trader = trader
+        self.universe_path = universe_path
+        self.metric_fns = metric_fns
+        self.universe_fingerprint = universe_fingerprint
+        self.__strategy_key: str | None = None
+
+        if universe_path is not None:
+            self.broker_builder = replace(broker_builder, stock_dfs={})
+        else:
+            self.broker_builder = broker_builder
+            self.__scaffoldings: Dict[Tuple, Scaffolding] = {}
+            self.__lock = threading.Lock()
+
+    def __get_scaffolding(self, universe_slice: UniverseSlice | None) -> Scaffolding:
+        if self.universe_path is not None:
+            return get_scaffolding(
+                self.universe_path, universe_slice, self.universe_fingerprint
+            )
+
+        key = universe_slice.get_key() if universe_slice is not None else ()
+        with self.__lock:
+            if key not in self.__scaffoldings:
+                stock_dfs = self.broker_builder.stock_dfs
+                if universe_slice is not None:
+                    stock_dfs = universe_slice.apply(stock_dfs)
+                self.__scaffoldings[key] = Scaffolding(stock_dfs)
+            return self.__scaffoldings[key]
+
+    @property
+    def strategy_key(self) -> str:
+        """Hash of the strategy, leaving out its params."""
+        if self.__strategy_key is None:
+            params = getattr(self.strategy, "params", None) or {}
+            self.__strategy_key = hash_strategy(self.strategy, params.keys())
+        return self.__strategy_key
+
+    def __call__(
+        self, params: Dict, universe_slice: UniverseSlice | None = None
+    ) -> Tuple[Dict, Report | ReportSummary]:
+        scaffolding = self.__get_scaffolding(universe_slice)
+        broker_builder = replace(self.broker_builder, stock_dfs=scaffolding.stock_dfs)
+
+        strategy = get_strategy_with_params(self.strategy, params)
+        signal_dfs = scaffolding.get_signal_dfs(strategy, self.strategy_key)
+        engine = Engine(
+            self.trader,
+            strategy,
+            broker_builder,
+            signal_dfs=signal_dfs,
+            panel=scaffolding.panel,
+        )
+        report = engine.run()
+
+        if self.metric_fns is not None:
+            return params, ReportSummary.from_report(report, self.metric_fns)
+
+        # The caller has the stock dfs already, don't send them back
+        report.stock_dfs = {}
+        return params, report
+
+    def run_chunk(
+        self, chunk: List[Dict], universe_slice: UniverseSlice | None = None
+    ) -> Tuple[List[Tuple[Dict, Report | ReportSummary]], WorkerStats]:
+        """
+        Run a chunk of combinations in a row, on the same scaffolding.
+
+        Returns:
+            The results of the combinations, and what the worker measured running
+            them. Bars count once per ticker and combination.
+        """
+        timer = TaskTimer()
+        results = [self(params, universe_slice) for params in chunk]
+        n_bars = int(self.__get_scaffolding(universe_slice).panel.has_bar.sum())
+        return results, timer.stop(n_bars * len(chunk))
+
 
 class GridSearch:
 
@@ -17,6 +276,13 @@ class GridSearch:
         stock_dfs: Dict[str, pd.DataFrame],
         broker_builder,
         param_grid: Dict[str, List],
+        metric_fns: MetricFns | None = None,
+        top_k: int = 1,
+        rank_metric: str | None = None,
+        store: ResultStore | Path | str | None = None,
+        backend: Backend = "processes",
+        executor: Executor | None = None,
+        telemetry: Telemetry | None = None,
     ) -> None:
         """
         Args:
@@ -25,23 +291,71 @@ class GridSearch:
             stock_dfs: A dictionary of stock data.
             broker_builder: Builder for the broker class.
             param_grid: A dictionary with parameter names as keys and a list of values to try.
+            metric_fns: Metric functions of a Report by name. If given, workers only
+                send back a ReportSummary with these metrics, and full Reports are
+                kept for the `top_k` combinations by `rank_metric`.
+            top_k: Number of full Reports kept when `metric_fns` is given.
+            rank_metric: Name of the metric to rank by, the first one by default.
+            store: Result store (or the path of one) where every finished
+                combination is saved. Combinations already stored for the same
+                strategy, trader, broker settings and stock dfs are not run again.
+                Requires `metric_fns`, as the store only keeps ReportSummaries.
+            backend: "processes" runs combinations on a pool of processes that map
+                the universe from a shared file. "threads" runs them on threads
+                of this process, with no pickling nor copy of the universe, which
+                pays off when the strategy spends its time in code that releases
+                the GIL (e.g. NumPy).
+            executor: Runs the combinations instead of the `backend` pool, e.g. a
+                `WorkQueueExecutor` whose workers run on other hosts. The universe
+                is published to its shared directory.
+            telemetry: Tracks the progress and throughput of the combinations,
+                on a progress bar by default. Pass one with callbacks or a
+                status file to monitor long searches.
         """
         self.strategy = strategy
         self.trader = trader
         self.stock_dfs: Dict[str, pd.DataFrame] = stock_dfs
         self.broker_builder = broker_builder
         self.param_grid: Dict[str, List] = param_grid
+        self.metric_fns = metric_fns
+        self.top_k = top_k
+        if metric_fns is not None and rank_metric is None:
+            rank_metric = next(iter(metric_fns))
+        if rank_metric is not None and rank_metric not in (metric_fns or {}):
+            raise ValueError(f"rank_metric {rank_metric} is not one of metric_fns")
+        self.rank_metric = rank_metric
+        if store is not None and metric_fns is None:
+            raise ValueError("A store requires metric_fns, it only keeps metrics")
+        if store is not None and not isinstance(store, ResultStore):
+            store = ResultStore(store)
+        self.store = store
+        if backend not in ("processes", "threads"):
+            raise ValueError(f"Unknown backend {backend}")
+        self.backend = backend
+        self.executor = executor
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
 
-    def _evaluate(self, params: Dict) -> Tuple[Dict, Report]:
-        """Run the strategy with given params and return a Report."""
-        # Reset strategy with new params
-        self.strategy.set_params(**params)
+    @property
+    def search_key(self) -> str:
+        return get_search_key(
+            self.strategy, self.trader, self.broker_builder, self.param_grid.keys()
+        )
 
-        # Run the engine with the current strategy
-        engine = Engine(self.trader, self.strategy, self.broker_builder)
-        report = engine.run()
+    def __get_executor(self) -> Executor:
+        if self.executor is not None:
+            return self.executor
+        backend = "threading" if self.backend == "threads" else None
+        return JoblibExecutor(backend=backend)
 
-        return params, report
+    def __get_stored(self, search_key: str, params: Dict) -> ReportSummary | None:
+        assert self.store is not None and self.metric_fns is not None
+        summary = self.store.get(search_key, params)
+        # Results stored without all the metrics asked for are run again
+        if summary is None or any(
+            name not in summary.metrics for name in self.metric_fns
+        ):
+            return None
+        return summary
 
     def optimize(self) -> "GridSearchReport":
         """Perform grid search over the parameter grid."""
@@ -52,43 +366,227 @@ class GridSearch:
 
         print(f"Testing {len(param_combinations)} parameter combinations...")
 
-        # Use joblib for parallel evaluation
-        results = Parallel(n_jobs=config.num_processors)(
-            delayed(self._evaluate)(params) for params in tqdm(param_combinations)
-        )
+        # The universe is published once, tasks only carry their params. Threads
+        # share the stock dfs of this process instead.
+        executor = self.__get_executor()
+        with executor.shared_dir() as directory:
+            universe_path = None
+            stock_dfs = self.broker_builder.stock_dfs
+            if executor.remote:
+                universe_path = directory / "stock_dfs.ekf"
+                write_frames(universe_path, stock_dfs)
+            elif self.executor is not None or self.backend == "processes":
+                # Stock dfs mapped from a universe file are not written again
+                universe_path = publish_universe(directory, stock_dfs)
+            # Other hosts check that they map the same universe
+            fingerprint = None
+            if executor.remote:
+                fingerprint = hash_frames(self.broker_builder.stock_dfs)
+            task = GridSearchTask(
+                self.strategy,
+                self.trader,
+                self.broker_builder,
+                universe_path,
+                self.metric_fns,
+                fingerprint,
+            )
+
+            results: List[Tuple[Dict, Report | ReportSummary] | None]
+            results = [None] * len(param_combinations)
+            search_key = self.search_key if self.store is not None else ""
+            if self.store is not None:
+                for i, params in enumerate(param_combinations):
+                    summary = self.__get_stored(search_key, params)
+                    if summary is not None:
+                        results[i] = (params, summary)
+                n_stored = len(param_combinations) - results.count(None)
+                print(f"{n_stored} parameter combinations found in the store.")
+
+            pending: Dict[str, List[int]] = {}
+            for i, params in enumerate(param_combinations):
+                if results[i] is None:
+                    pending.setdefault(hash_params(params), []).append(i)
+            pending_combinations = [
+                param_combinations[i] for indices in pending.values() for i in indices
+            ]
+
+            # Neighbouring combinations go to the same worker, where they share the
+            # scaffolding and, when they differ in params the strategy does not
+            # read, the signal dfs
+            n_jobs = effective_n_jobs(config.num_processors)
+            chunk_size = max(1, len(pending_combinations) // (4 * n_jobs))
+            chunks = [
+                pending_combinations[i : i + chunk_size]
+                for i in range(0, len(pending_combinations), chunk_size)
+            ]
+
+            # Results are stored as they finish
+            finished = executor.map_unordered(task.run_chunk, chunks)
+            telemetry = self.telemetry.start(len(pending_combinations), "Grid search")
+            try:
+                for chunk_results, stats in finished:
+                    for params, result in chunk_results:
+                        results[pending[hash_params(params)].pop()] = (params, result)
+                        if self.store is not None:
+                            assert isinstance(result, ReportSummary)
+                            self.store.put(search_key, params, result)
+                    telemetry.update(len(chunk_results), stats.n_bars, stats)
+            finally:
+                telemetry.close()
 
-        return GridSearchReport(results, self.param_grid)
+            full_reports = None
+            if self.metric_fns is not None:
+                full_reports = self.__run_top_k(results, task, executor)
+            detach_universe()
+
+        if full_reports is None:
+            full_reports = {
+                i: report
+                for i, (_, report) in enumerate(results)
+                if isinstance(report, Report)
+            }
+        for report in full_reports.values():
+            report.stock_dfs = self.broker_builder.stock_dfs
+
+        return GridSearchReport(results, self.param_grid, full_reports)
+
+    def __run_top_k(
+        self,
+        results: List[Tuple[Dict, ReportSummary]],
+        task: GridSearchTask,
+        executor: Executor,
+    ) -> Dict[int, Report]:
+        """Run the `top_k` combinations by `rank_metric` again for their full Reports."""
+        if self.rank_metric is None:
+            raise ValueError("Ranking the combinations requires metric_fns")
+
+        # Bounded min-heap of (metric value, -index), ties keep earlier combinations
+        heap: List[Tuple[float, int]] = []
+        for i, (_, summary) in enumerate(results):
+            value = summary.metrics[self.rank_metric]
+            if value is None or value != value:
+                continue
+            item = (value, -i)
+            if len(heap) < self.top_k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+
+        top_indices = [-neg_i for _, neg_i in sorted(heap, reverse=True)]
+
+        report_task = GridSearchTask(
+            self.strategy,
+            self.trader,
+            self.broker_builder,
+            task.universe_path,
+            universe_fingerprint=task.universe_fingerprint,
+        )
+        top_params = [results[i][0] for i in top_indices]
+        top_reports = {
+            hash_params(params): report
+            for params, report in executor.map_unordered(report_task, top_params)
+        }
+        return {i: top_reports[hash_params(results[i][0])] for i in top_indices}
 
 
 class GridSearchReport:
     def __init__(
         self,
-        optimization_results: List[Tuple[Dict, Report]],
+        optimization_results: List[Tuple[Dict, Report | ReportSummary]],
         param_grid: Dict[str, List],
+        full_reports: Dict[int, Report] | None = None,
     ) -> None:
         """
         Args:
-            optimization_results: List of parameter combinations and their corresponding Reports.
+            optimization_results: List of parameter combinations and their corresponding
+                Reports, or ReportSummaries when only metrics were sent back.
             param_grid: The grid of parameters tested.
+            full_reports: Full Reports by index in `optimization_results`, for the
+                combinations that have one.
         """
         self.grid_results = optimization_results
         self.param_grid = param_grid
+        if full_reports is None:
+            full_reports = {
+                i: report
+                for i, (_, report) in enumerate(optimization_results)
+                if isinstance(report, Report)
+            }
+        self.full_reports = full_reports
+
+    @classmethod
+    def from_store(
+        cls,
+        store: ResultStore | Path | str,
+        search_key: str | None = None,
+        param_grid: Dict[str, List] | None = None,
+    ) -> "GridSearchReport":
+        """
+        Load the results of a search from a result store.
+
+        Args:
+            store: The result store, or its path.
+            search_key: Key of the search (see `GridSearch.search_key`), optional
+                if the store holds a single search.
+            param_grid: The grid of the search, built from the stored params if
+                not given.
+        """
+        if not isinstance(store, ResultStore):
+            store = ResultStore(store)
+
+        if search_key is None:
+            search_keys = store.get_search_keys()
+            if len(search_keys) != 1:
+                raise ValueError(
+                    f"The store holds {len(search_keys)} searches, pick a search_key"
+                )
+            search_key = search_keys[0]
+
+        results = store.get_results(search_key)
+        if param_grid is None:
+            param_grid = {}
+            for params, _ in results:
+                for name, value in params.items():
+                    values = param_grid.setdefault(name, [])
+                    if value not in values:
+                        values.append(value)
+            for name, values in param_grid.items():
+                try:
+                    values.sort()
+                except TypeError:
+                    pass
+
+        # In the order of the grid, as GridSearch lists them
+        def grid_position(result: Tuple[Dict, ReportSummary]) -> List[int]:
+            params = result[0]
+            return [
+                values.index(params[name]) if params.get(name) in values else -1
+                for name, values in param_grid.items()
+            ]
+
+        results.sort(key=grid_position)
+        return cls(results, param_grid)
+
+    @property
+    def top_reports(self) -> List[Tuple[Dict, Report]]:
+        """The combinations with a full Report, best first in metrics mode."""
+        return [(self.grid_results[i][0], r) for i, r in self.full_reports.items()]
 
     def get_metric_matrix(
-        self, metric_fn: Callable[[Any], float] | None = None
+        self, metric_fn: Callable[[Any], float] | str | None = None
     ) -> pd.DataFrame:
         """
         Generate a matrix (DataFrame) for a given metric function.
 
         Args:
-            metric_fn: A lambda or callable function to compute the metric from a Report.
+            metric_fn: A lambda or callable function to compute the metric from a Report
+                       (or ReportSummary), or the name of a metric the workers computed.
                        Defaults to portfolio percentage growth.
 
         Returns:
             A pandas DataFrame representing the metric across all combinations.
         """
-        if metric_fn is None:
-            metric_fn = lambda report: report.portfolio_statistics["percentage_growth"]
+        metric_fn = _get_metric_fn(metric_fn)
 
         # Flatten results and extract metrics
         records = []
@@ -104,34 +602,46 @@ class GridSearchReport:
         return result_df
 
     def get_max_metric_report(
-        self, metric_fn: Callable[[Any], float] | None = None
+        self, metric_fn: Callable[[Any], float] | str | None = None
     ) -> Tuple[Dict, Any]:
         """
         Find the parameters and Report corresponding to the maximum value of the given metric.
 
         Args:
-            metric_fn: A lambda or callable function to compute the metric from a Report.
+            metric_fn: A lambda or callable function to compute the metric from a Report
+                       (or ReportSummary), or the name of a metric the workers computed.
                        Defaults to portfolio percentage growth.
 
         Returns:
-            A tuple containing the parameters and the corresponding Report.
+            A tuple containing the parameters and the corresponding Report, or its
+            ReportSummary if no full Report was kept for it.
         """
-        if metric_fn is None:
-            metric_fn = lambda report: report.portfolio_statistics["percentage_growth"]
+        metric_fn = _get_metric_fn(metric_fn)
 
         # Evaluate the metric and find the maximum
         best_params = None
         best_report = None
         max_metric_value = float("-inf")
 
-        for params, report in self.grid_results:
+        for i, (params, report) in enumerate(self.grid_results):
             metric_value = metric_fn(report)
             if metric_value > max_metric_value:
                 max_metric_value = metric_value
                 best_params = params
-                best_report = report
+                best_report = self.full_reports.get(i, report)
 
         print(
             f"\nMax Metric Value: {max_metric_value:.4f} at Parameters: {best_params}"
         )
         return best_params, best_report
+
+
+def _get_metric_fn(
+    metric_fn: Callable[[Any], float] | str | None,
+) -> Callable[[Any], float]:
+    if metric_fn is None:
+        return lambda report: report.portfolio_statistics["percentage_growth"]
+    if isinstance(metric_fn, str):
+        name = metric_fn
+        return lambda summary: summary.metrics[name]
+    return metric_fn
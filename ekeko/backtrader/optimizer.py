@@ -0,0 +1,320 @@
+import math
+from itertools import product
+from typing import Any, Callable, Dict, List, Literal, Tuple
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, effective_n_jobs
+
+from ekeko.backtrader.engine import Strategy, Trader
+from ekeko.backtrader.grid_search import (
+    GridSearchReport,
+    GridSearchTask,
+    UniverseSlice,
+    detach_universe,
+)
+from ekeko.backtrader.panel import get_timeindex_union
+from ekeko.backtrader.report import Report, ReportSummary
+from ekeko.config import config
+from ekeko.core.frame_file import shared_temp_dir
+from ekeko.core.universe import publish_universe
+
+
+OBJECTIVE = "objective"
+
+Method = Literal["random", "halving", "model"]
+BudgetAxis = Literal["dates", "tickers"]
+
+
+def get_default_metric(report: Any) -> float:
+    return report.portfolio_statistics["percentage_growth"]
+
+
+class Optimizer:
+    """
+    Search `param_grid` with a budget of backtests instead of the whole grid.
+
+    Methods:
+        random: Evaluate `n_trials` combinations drawn at random.
+        halving: Successive halving. Evaluate `n_trials` combinations on a fraction
+            `min_budget` of the universe (the most recent dates, or a subsample of
+            the tickers), keep the best `1 / eta` and evaluate them on `eta` times
+            more of the universe, until the survivors run on the full universe.
+        model: Sequential model-based search. After `n_initial` random
+            combinations, each batch picks the untried combinations that a
+            tree-structured Parzen estimator rates most likely to be among the best.
+
+    Batches run on the joblib pool of `config.num_processors` workers, which map
+    the universe from a shared file as in `GridSearch`. Random and model-based
+    search stop early when the best metric did not improve for `patience` batches.
+    """
+
+    def __init__(
+        self,
+        strategy: Strategy,
+        trader: Trader,
+        stock_dfs: Dict[str, pd.DataFrame],
+        broker_builder,
+        param_grid: Dict[str, List],
+        method: Method = "halving",
+        n_trials: int | None = None,
+        metric_fn: Callable[[Report], float] | None = None,
+        budget: BudgetAxis = "dates",
+        min_budget: float = 1 / 9,
+        eta: int = 3,
+        n_initial: int | None = None,
+        patience: int | None = None,
+        seed: int | None = None,
+    ) -> None:
+        """
+        Args:
+            strategy: The strategy instance to optimize.
+            trader: The trading logic.
+            stock_dfs: A dictionary of stock data.
+            broker_builder: Builder for the broker class.
+            param_grid: A dictionary with parameter names as keys and a list of values to try.
+            method: "random", "halving" or "model", see the class docstring.
+            n_trials: Number of combinations to try, a tenth of the grid by default
+                (at least 10). With successive halving, the number of combinations
+                of the first rung.
+            metric_fn: Metric to maximize, computed from a Report. Defaults to
+                portfolio percentage growth.
+            budget: Whether successive halving cuts the "dates" or the "tickers".
+            min_budget: Fraction of the universe of the first rung of successive halving.
+            eta: Successive halving keeps 1 / eta combinations per rung.
+            n_initial: Random combinations before the model-based search kicks in.
+            patience: Batches without improvement before stopping early.
+            seed: Seed of the random draws.
+        """
+        self.strategy = strategy
+        self.trader = trader
+        self.stock_dfs: Dict[str, pd.DataFrame] = stock_dfs
+        self.broker_builder = broker_builder
+        self.param_grid: Dict[str, List] = param_grid
+        self.method = method
+        self.metric_fn = metric_fn if metric_fn is not None else get_default_metric
+        self.budget = budget
+        self.min_budget = min_budget
+        self.eta = eta
+        self.patience = patience
+        self.rng = np.random.default_rng(seed)
+
+        self.param_names = list(param_grid.keys())
+        self.grid_shape = tuple(len(values) for values in param_grid.values())
+        self.grid_size = math.prod(self.grid_shape)
+
+        if n_trials is None:
+            n_trials = max(10, self.grid_size // 10)
+        self.n_trials = min(n_trials, self.grid_size)
+        if n_initial is None:
+            n_initial = max(2, self.n_trials // 4)
+        self.n_initial = n_initial
+
+        # Every evaluation as (params, fraction of the universe, summary)
+        self.history: List[Tuple[Dict, float, ReportSummary]] = []
+
+    def optimize(self) -> GridSearchReport:
+        """Run the search and report the combinations evaluated on the full universe."""
+        print(f"Searching {self.grid_size} parameter combinations ({self.method})...")
+
+        with shared_temp_dir() as directory:
+            universe_path = publish_universe(directory, self.broker_builder.stock_dfs)
+            self.task = GridSearchTask(
+                self.strategy,
+                self.trader,
+                self.broker_builder,
+                universe_path,
+                {OBJECTIVE: self.metric_fn},
+            )
+
+            with Parallel(n_jobs=config.num_processors) as parallel:
+                self.parallel = parallel
+                if self.method == "random":
+                    self.__random_search()
+                elif self.method == "halving":
+                    self.__successive_halving()
+                elif self.method == "model":
+                    self.__model_based_search()
+                else:
+                    raise ValueError(f"Unknown optimization method {self.method}")
+
+                results = [(p, s) for p, fraction, s in self.history if fraction == 1]
+                best = self.__get_best(results)
+                full_reports = {}
+                if best is not None:
+                    report_task = GridSearchTask(
+                        self.strategy, self.trader, self.broker_builder, universe_path
+                    )
+                    _, report = report_task(results[best][0])
+                    report.stock_dfs = self.broker_builder.stock_dfs
+                    full_reports[best] = report
+            detach_universe()
+
+        print(f"Ran {len(results)} full backtests out of {self.grid_size}.")
+        return GridSearchReport(results, self.param_grid, full_reports)
+
+    @property
+    def batch_size(self) -> int:
+        return max(1, effective_n_jobs(config.num_processors))
+
+    def __get_params(self, grid_idx: Tuple[int, ...]) -> Dict:
+        return {
+            name: self.param_grid[name][i]
+            for name, i in zip(self.param_names, grid_idx)
+        }
+
+    def __sample(self, n: int, exclude: set) -> List[Tuple[int, ...]]:
+        """Draw up to `n` distinct grid indices at random, not in `exclude`."""
+        n = min(n, self.grid_size - len(exclude))
+        samples: List[Tuple[int, ...]] = []
+        seen = set(exclude)
+        while len(samples) < n:
+            flat_idx = self.rng.choice(self.grid_size, size=n - len(samples))
+            for idx in flat_idx.tolist():
+                grid_idx = tuple(int(i) for i in np.unravel_index(idx, self.grid_shape))
+                if grid_idx not in seen:
+                    seen.add(grid_idx)
+                    samples.append(grid_idx)
+        return samples
+
+    def __evaluate(
+        self, grid_indices: List[Tuple[int, ...]], fraction: float = 1.0
+    ) -> List[float]:
+        universe_slice = self.__get_universe_slice(fraction)
+        params = [self.__get_params(grid_idx) for grid_idx in grid_indices]
+        results = self.parallel(delayed(self.task)(p, universe_slice) for p in params)
+
+        values = []
+        for p, (_, summary) in zip(params, results):
+            self.history.append((p, fraction, summary))
+            values.append(_to_value(summary.metrics[OBJECTIVE]))
+        return values
+
+    def __get_universe_slice(self, fraction: float) -> UniverseSlice | None:
+        if fraction >= 1:
+            return None
+
+        stock_dfs = self.broker_builder.stock_dfs
+        if self.budget == "tickers":
+            tickers = list(stock_dfs.keys())
+            n_tickers = max(1, math.ceil(fraction * len(tickers)))
+            # The same subsample for every combination of a rung
+            picked = np.linspace(0, len(tickers) - 1, n_tickers).round().astype(int)
+            return UniverseSlice(tickers=[tickers[i] for i in sorted(set(picked))])
+
+        # The most recent dates, which are the closest to live trading
+        time_index = get_timeindex_union(stock_dfs)
+        n_dates = max(2, math.ceil(fraction * len(time_index)))
+        return UniverseSlice(start=time_index[-n_dates])
+
+    def __get_best(self, results: List[Tuple[Dict, ReportSummary]]) -> int | None:
+        values = [_to_value(summary.metrics[OBJECTIVE]) for _, summary in results]
+        if len(values) == 0:
+            return None
+        return int(np.argmax(values))
+
+    def __is_stalled(self, best_per_batch: List[float]) -> bool:
+        if self.patience is None or len(best_per_batch) <= self.patience:
+            return False
+        previous_best = best_per_batch[-self.patience - 1]
+        return max(best_per_batch[-self.patience :]) <= previous_best
+
+    def __random_search(self):
+        tried: set = set()
+        best_per_batch: List[float] = []
+        best = -math.inf
+
+        while len(tried) < self.n_trials and not self.__is_stalled(best_per_batch):
+            n = min(self.batch_size, self.n_trials - len(tried))
+            batch = self.__sample(n, tried)
+            tried.update(batch)
+            best = max([best] + self.__evaluate(batch))
+            best_per_batch.append(best)
+
+    def __successive_halving(self):
+        n_rungs = 1
+        while self.min_budget * self.eta ** (n_rungs - 1) < 1:
+            n_rungs += 1
+
+        survivors = self.__sample(self.n_trials, set())
+        for rung in range(n_rungs):
+            fraction = min(1.0, self.min_budget * self.eta**rung)
+            if rung == n_rungs - 1:
+                fraction = 1.0
+
+            values = self.__evaluate(survivors, fraction)
+            if fraction == 1.0:
+                break
+
+            n_promoted = max(1, len(survivors) // self.eta)
+            order = np.argsort(values, kind="stable")[::-1]
+            survivors = [survivors[i] for i in sorted(order[:n_promoted].tolist())]
+
+    def __model_based_search(self):
+        tried: List[Tuple[int, ...]] = []
+        values: List[float] = []
+        best_per_batch: List[float] = []
+
+        while len(tried) < self.n_trials and not self.__is_stalled(best_per_batch):
+            n = min(self.batch_size, self.n_trials - len(tried))
+            if len(tried) < self.n_initial:
+                batch = self.__sample(n, set(tried))
+            else:
+                batch = self.__propose(tried, values, n)
+
+            tried += batch
+            values += self.__evaluate(batch)
+            best_per_batch.append(max(values))
+
+    def __propose(
+        self, tried: List[Tuple[int, ...]], values: List[float], n: int
+    ) -> List[Tuple[int, ...]]:
+        """Pick the `n` untried combinations with the best TPE score."""
+        candidates = self.__get_candidates(set(tried))
+        if len(candidates) <= n:
+            return [tuple(c) for c in candidates.tolist()]
+
+        observed = np.asarray(tried, dtype=np.float64)
+        order = np.argsort(values, kind="stable")[::-1]
+        n_good = max(1, math.ceil(0.25 * len(values)))
+        good, bad = observed[order[:n_good]], observed[order[n_good:]]
+
+        score = np.zeros(len(candidates))
+        for d, size in enumerate(self.grid_shape):
+            bandwidth = max(1.0, size / 5)
+            score += np.log(_parzen(candidates[:, d], good[:, d], size, bandwidth))
+            score -= np.log(_parzen(candidates[:, d], bad[:, d], size, bandwidth))
+
+        best = np.argsort(score, kind="stable")[::-1][:n]
+        return [tuple(c) for c in candidates[best].tolist()]
+
+    def __get_candidates(self, tried: set, max_candidates: int = 10_000) -> np.ndarray:
+        if self.grid_size <= max_candidates:
+            candidates = [
+                grid_idx
+                for grid_idx in product(*(range(size) for size in self.grid_shape))
+                if grid_idx not in tried
+            ]
+        else:
+            candidates = self.__sample(max_candidates, tried)
+        return np.asarray(candidates, dtype=np.int64).reshape(-1, len(self.grid_shape))
+
+
+def _parzen(
+    points: np.ndarray, observed: np.ndarray, size: int, bandwidth: float
+) -> np.ndarray:
+    """Density at `points` of a Gaussian kernel mix over `observed` grid positions."""
+    # A uniform prior keeps the density positive where nothing was observed
+    density = np.full(len(points), 1.0 / size)
+    if len(observed) != 0:
+        distance = points[:, None] - observed[None, :]
+        kernel = np.exp(-0.5 * (distance / bandwidth) ** 2)
+        kernel /= bandwidth * math.sqrt(2 * math.pi)
+        density = (density + kernel.sum(axis=1)) / (len(observed) + 1)
+    return density
+
+
+def _to_value(metric: Any) -> float:
+    if metric is None or metric != metric:
+        return -math.inf
+    return float(metric)
@@ -0,0 +1,221 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+from ekeko.core.types import Date, Stock_dfs, Ticker
+
+
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def get_timeindex_union(stock_dfs: Stock_dfs) -> pd.DatetimeIndex:
+    timeindex = pd.DatetimeIndex([])
+
+    for df in stock_dfs.values():
+        timeindex = timeindex.union(df.index)
+
+    timeindex = pd.to_datetime(timeindex)
+    # TODO[p=High]: What if there are different timezones, etc?
+    assert isinstance(timeindex, pd.DatetimeIndex)
+    return timeindex
+
+
+class AlignedPanel:
+    """
+    OHLCV prices of every ticker aligned on the union time index.
+
+    Each field is a contiguous float64 array of shape (n_dates, n_tickers), and
+    `has_bar[date_idx, ticker_idx]` tells whether the ticker has a record at that
+    date. Missing bars are NaN. Build it once and address it with integer
+    (date_idx, ticker_idx) pairs inside the simulation loop.
+    """
+
+    def __init__(
+        self, stock_dfs: Stock_dfs, time_index: pd.DatetimeIndex | None = None
+    ):
+        if time_index is None:
+            time_index = get_timeindex_union(stock_dfs)
+
+        self.time_index = time_index
+        self.dates: list[Date] = list(time_index)
+        self.date_loc: dict[Date, int] = {date: i for i, date in enumerate(self.dates)}
+
+        self.tickers: list[Ticker] = list(stock_dfs.keys())
+        self.ticker_loc: dict[Ticker, int] = {
+            ticker: j for j, ticker in enumerate(self.tickers)
+        }
+
+        shape = (len(self.dates), len(self.tickers))
+        self.__bars: list[np.ndarray] | None = None
+        self.has_bar = np.zeros(shape, dtype=bool)
+        self.fields: dict[str, np.ndarray] = {}
+
+        for j, stock_df in enumerate(stock_dfs.values()):
+            rows = time_index.get_indexer(stock_df.index)
+            assert (rows >= 0).all(), "stock_df index is not part of the time index"
+            self.has_bar[rows, j] = True
+
+            for column in OHLCV_COLUMNS:
+                if column not in stock_df.columns:
+                    continue
+                if column not in self.fields:
+                    self.fields[column] = np.full(shape, np.nan, dtype=np.float64)
+                self.fields[column][rows, j] = stock_df[column].to_numpy(
+                    dtype=np.float64
+                )
+
+    @property
+    def n_dates(self) -> int:
+        return len(self.dates)
+
+    @property
+    def n_tickers(self) -> int:
+        return len(self.tickers)
+
+    def get_date_idx(self, date: Date) -> int:
+        return self.date_loc[date]
+
+    def get_ticker_idx(self, ticker: Ticker) -> int:
+        return self.ticker_loc[ticker]
+
+    def has_record(self, date_idx: int, ticker_idx: int) -> bool:
+        return bool(self.has_bar[date_idx, ticker_idx])
+
+    def get(self, field: str, date_idx: int, ticker_idx: int) -> float:
+        return float(self.fields[field][date_idx, ticker_idx])
+
+    def get_close(self, date_idx: int, ticker_idx: int) -> float:
+        return float(self.fields["Close"][date_idx, ticker_idx])
+
+    def align(
+        self,
+        frames: Stock_dfs,
+        column: str,
+        fill_value=np.nan,
+        dtype=np.float64,
+        start: int = 0,
+    ) -> np.ndarray:
+        """
+        Align `column` of per-ticker frames (e.g. signal frames) with the panel.
+
+        Only the dates from `start` on are aligned, so the result has shape
+        (n_dates - start, n_tickers).
+        """
+        aligned = np.full(
+            (self.n_dates - start, self.n_tickers), fill_value, dtype=dtype
+        )
+
+        for ticker, frame in frames.items():
+            j = self.ticker_loc[ticker]
+            frame = self.__rows_from(frame, start)
+            rows = self.time_index.get_indexer(frame.index)
+            assert (rows >= 0).all(), "frame index is not part of the time index"
+            values = frame[column].to_numpy(dtype=dtype, na_value=fill_value)
+            aligned[rows - start, j] = values
+
+        return aligned
+
+    def align_index(self, frames: Stock_dfs, start: int = 0) -> np.ndarray:
+        """Boolean mask of the dates present in each frame, from `start` on."""
+        present = np.zeros((self.n_dates - start, self.n_tickers), dtype=bool)
+
+        for ticker, frame in frames.items():
+            frame = self.__rows_from(frame, start)
+            rows = self.time_index.get_indexer(frame.index)
+            assert (rows >= 0).all(), "frame index is not part of the time index"
+            present[rows - start, self.ticker_loc[ticker]] = True
+
+        return present
+
+    def __rows_from(self, frame: pd.DataFrame, start: int) -> pd.DataFrame:
+        if start == 0:
+            return frame
+        if start >= self.n_dates:
+            return frame.iloc[:0]
+        return frame.iloc[frame.index.searchsorted(self.dates[start]) :]
+
+    def copy(self) -> "AlignedPanel":
+        """
+        A panel that `append` can extend without changing this one.
+
+        Its arrays are shared with this panel until then, as `append` replaces them
+        with extended ones instead of writing to them.
+        """
+        panel = copy.copy(self)
+        panel.dates = list(self.dates)
+        panel.date_loc = dict(self.date_loc)
+        panel.fields = dict(self.fields)
+        return panel
+
+    def append(self, new_rows: Stock_dfs):
+        """
+        Extend the panel with rows of known tickers dated after its last date.
+
+        New dates are appended to the time index, existing date indices are kept.
+        """
+        last_date = self.dates[-1] if self.dates else None
+        new_index = pd.DatetimeIndex([])
+        for ticker, frame in new_rows.items():
+            if ticker not in self.ticker_loc:
+                raise ValueError(f"{ticker} is not part of the panel")
+            if (
+                len(frame) != 0
+                and last_date is not None
+                and frame.index[0] <= last_date
+            ):
+                raise ValueError(f"New rows of {ticker} must come after {last_date}")
+            new_index = new_index.union(frame.index)
+
+        if len(new_index) == 0:
+            return
+
+        start = self.n_dates
+        self.time_index = self.time_index.append(new_index)
+        for i, date in enumerate(new_index, start=start):
+            self.dates.append(date)
+            self.date_loc[date] = i
+
+        shape = (len(new_index), self.n_tickers)
+        self.has_bar = np.concatenate([self.has_bar, np.zeros(shape, dtype=bool)])
+        for column in self.fields:
+            nan_rows = np.full(shape, np.nan, dtype=np.float64)
+            self.fields[column] = np.concatenate([self.fields[column], nan_rows])
+
+        for ticker, frame in new_rows.items():
+            j = self.ticker_loc[ticker]
+            rows = self.time_index.get_indexer(frame.index)
+            self.has_bar[rows, j] = True
+            for column in OHLCV_COLUMNS:
+                if column not in frame.columns:
+                    continue
+                if column not in self.fields:
+                    self.fields[column] = np.full(
+                        (self.n_dates, self.n_tickers), np.nan, dtype=np.float64
+                    )
+                self.fields[column][rows, j] = frame[column].to_numpy(dtype=np.float64)
+
+        self.__bars = None
+
+    def get_bars(self, ticker_idx: int) -> np.ndarray:
+        """Sorted date indices at which the ticker has a record."""
+        if self.__bars is None:
+            self.__bars = [
+                np.flatnonzero(self.has_bar[:, j]) for j in range(self.n_tickers)
+            ]
+        return self.__bars[ticker_idx]
+
+    def next_bar(self, ticker_idx: int, date_idx: int) -> int:
+        """First date index strictly after `date_idx` with a record, -1 if none."""
+        bars = self.get_bars(ticker_idx)
+        pos = int(np.searchsorted(bars, date_idx, side="right"))
+        return int(bars[pos]) if pos < len(bars) else -1
+
+    def second_to_last_bar(self) -> np.ndarray:
+        """Date index of the second-to-last record of each ticker, -1 if it has none."""
+        second_to_last = np.full(self.n_tickers, -1, dtype=np.int64)
+        for j in range(self.n_tickers):
+            bars = self.get_bars(j)
+            if len(bars) >= 2:
+                second_to_last[j] = bars[-2]
+        return second_to_last
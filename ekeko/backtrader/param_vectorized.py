@@ -0,0 +1,346 @@
+from itertools import product
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from ekeko.backtrader.broker import BrokerBuilder
+from ekeko.backtrader.engine import Strategy, get_strategy_with_params
+from ekeko.backtrader.grid_search import GridSearchReport
+from ekeko.backtrader.panel import AlignedPanel
+from ekeko.backtrader.report import ReportSummary
+from ekeko.backtrader.vectorized import MarketTrader, VectorizedEngine
+from ekeko.core import to_number
+
+
+NANOSECONDS_PER_DAY = 86_400 * 10**9
+
+
+def get_default_metric(summary: ReportSummary) -> float:
+    return summary.portfolio_statistics["percentage_growth"]
+
+
+class ParamVectorizedEngine:
+    """
+    Backtest a `MarketTrader` strategy for every combination of a parameter grid
+    in a single pass over the data.
+
+    Signals get a parameter axis (see `BaseStrategy.evaluate_params`) and one
+    account per combination is simulated with (n_tickers, n_params) arrays, so
+    each date is visited once for the whole grid instead of once per combination.
+    Accounts follow the rules of the reference `Engine`: orders fill at the next
+    bar of their ticker, buys that the cash cannot pay for are dropped and
+    positions are closed at the second-to-last bar of their ticker.
+
+    Combinations are simulated in blocks of `block_size`, which bounds the memory
+    of the aligned (n_dates, n_tickers, block_size) signal arrays.
+    """
+
+    def __init__(
+        self,
+        trader: MarketTrader,
+        strategy: Strategy,
+        broker_builder: BrokerBuilder,
+        param_grid: Dict[str, List],
+        metric_fn: Callable[[ReportSummary], float] | None = None,
+        block_size: int | None = None,
+    ):
+        """
+        Args:
+            trader: The trading logic, a MarketTrader.
+            strategy: The strategy instance to sweep.
+            broker_builder: Builder for the broker class.
+            param_grid: A dictionary with parameter names as keys and a list of values to try.
+            metric_fn: Metric that picks the combination with a full Report,
+                computed from a ReportSummary. Defaults to portfolio percentage growth.
+            block_size: Number of combinations simulated at once, by default as
+                many as fit in about 256MB of signals.
+        """
+        if not isinstance(trader, MarketTrader):
+            raise TypeError("ParamVectorizedEngine only supports a MarketTrader")
+
+        self.trader = trader
+        self.strategy = strategy
+        self.broker_builder = broker_builder
+        self.param_grid = param_grid
+        self.metric_fn = metric_fn if metric_fn is not None else get_default_metric
+
+        self.stock_dfs = broker_builder.stock_dfs
+        self.panel = AlignedPanel(self.stock_dfs)
+        if block_size is None:
+            bytes_per_param = 2 * self.panel.n_dates * self.panel.n_tickers
+            block_size = max(1, (256 << 20) // max(1, bytes_per_param))
+        self.block_size = block_size
+
+    def run(self) -> GridSearchReport:
+        param_combinations: List[Dict] = [
+            dict(zip(self.param_grid.keys(), values))
+            for values in product(*self.param_grid.values())
+        ]
+
+        print(f"Testing {len(param_combinations)} parameter combinations...")
+
+        summaries: List[ReportSummary] = []
+        for start in range(0, len(param_combinations), self.block_size):
+            block = param_combinations[start : start + self.block_size]
+            summaries += self.__run_block(block)
+
+        results = list(zip(param_combinations, summaries))
+        full_reports = {}
+        if len(results) != 0:
+            values = [_to_value(self.metric_fn(summary)) for summary in summaries]
+            best = int(np.argmax(values))
+            full_reports[best] = self.__run_report(param_combinations[best])
+
+        return GridSearchReport(results, self.param_grid, full_reports)
+
+    def __run_report(self, params: Dict):
+        """Full Report of one combination, from the single account engine."""
+        strategy = get_strategy_with_params(self.strategy, params)
+        engine = VectorizedEngine(self.trader, strategy, self.broker_builder)
+        return engine.run()
+
+    def __align_signals(self, param_sets: List[Dict]):
+        panel = self.panel
+        shape = (panel.n_dates, panel.n_tickers, len(param_sets))
+        entry = np.zeros(shape, dtype=bool)
+        exit = np.zeros(shape, dtype=bool)
+        has_signal = np.zeros(shape[:2], dtype=bool)
+
+        for ticker, stock_df in self.stock_dfs.items():
+            signal_df = self.strategy.evaluate_params(stock_df, param_sets)
+            j = panel.get_ticker_idx(ticker)
+            rows = panel.time_index.get_indexer(signal_df.index)
+            assert (rows >= 0).all(), "signal index is not part of the time index"
+
+            has_signal[rows, j] = True
+            for aligned, column in (
+                (entry, self.trader.entry),
+                (exit, self.trader.exit),
+            ):
+                aligned[rows, j] = signal_df[column].fillna(False).to_numpy(dtype=bool)
+
+        return entry, exit, has_signal
+
+    def __get_execution_prices(self, broker) -> np.ndarray:
+        """Price at which orders fill at each bar, given by the broker slippage."""
+        panel = self.panel
+        prices = np.full((panel.n_dates, panel.n_tickers), np.nan, dtype=np.float64)
+        stock_dfs = broker.order_processor.stock_dfs
+        for j in range(panel.n_tickers):
+            for i in panel.get_bars(j).tolist():
+                prices[i, j] = to_number(stock_dfs.get_with_slippage(i, j))
+        return prices
+
+    def __run_block(self, param_sets: List[Dict]) -> List[ReportSummary]:
+        panel = self.panel
+        n_dates, n_tickers, n = panel.n_dates, panel.n_tickers, len(param_sets)
+        broker = self.broker_builder.build(panel.time_index, panel)
+        rate = broker.comission
+        sizing = self.trader.sizing
+
+        entry, exit, has_signal = self.__align_signals(param_sets)
+        prices = self.__get_execution_prices(broker)
+        close = panel.fields["Close"]
+        second_to_last = panel.second_to_last_bar()
+        before_last_idx = n_dates - 2
+        timestamps = panel.time_index.asi8
+
+        next_bar = np.full((n_dates, n_tickers), -1, dtype=np.int64)
+        for j in range(n_tickers):
+            bars = panel.get_bars(j)
+            next_bar[bars[:-1], j] = bars[1:]
+
+        # Positions per (ticker, param): a ticker holds at most one long position,
+        # or after both the trader and the expiration closed it, a short one
+        held = np.zeros((n_tickers, n), dtype=np.float64)
+        is_long = np.zeros((n_tickers, n), dtype=bool)
+        is_short = np.zeros((n_tickers, n), dtype=bool)
+        quantity = np.zeros((n_tickers, n), dtype=np.float64)
+        open_price = np.zeros((n_tickers, n), dtype=np.float64)
+        open_commission = np.zeros((n_tickers, n), dtype=np.float64)
+        opened_at = np.zeros((n_tickers, n), dtype=np.int64)
+
+        # Orders waiting for the next bar of their ticker, NaN buy quantity if none
+        buy_quantity = np.full((n_tickers, n), np.nan, dtype=np.float64)
+        trader_sell = np.zeros((n_tickers, n), dtype=bool)
+        expiry_sell = np.zeros((n_tickers, n), dtype=bool)
+        placed_at = np.full(n_tickers, -1, dtype=np.int64)
+        fills: Dict[int, List[int]] = {}
+
+        cash = np.full(n, to_number(broker.account.get_cash(panel.dates[0])))
+        cash_at = np.empty((n_dates, n), dtype=np.float64)
+        open_value = np.empty((n_dates, n), dtype=np.float64)
+        last_close = np.zeros(n_tickers, dtype=np.float64)
+        trades: List[tuple] = []
+
+        def pay(costs: np.ndarray) -> np.ndarray:
+            """Pay the (order, param) costs in order, dropping what cash cannot pay."""
+            nonlocal cash
+            running = np.cumsum(np.vstack([cash, costs]), axis=0)
+            accepted = np.ones(costs.shape, dtype=bool)
+            short_of_cash = np.flatnonzero((running[1:] < 0).any(axis=0))
+            cash = running[-1]
+            if len(short_of_cash) != 0:
+                balance = running[0, short_of_cash]
+                for k in range(len(costs)):
+                    cost = costs[k, short_of_cash]
+                    paid = balance + cost >= 0
+                    accepted[k, short_of_cash] = paid
+                    balance = np.where(paid, balance + cost, balance)
+                cash[short_of_cash] = balance
+            return accepted
+
+        def close_longs(js: np.ndarray, closing: np.ndarray, i: int, price: np.ndarray):
+            rows, params = np.nonzero(closing)
+            tickers = js[rows]
+            p = price[rows]
+            q = quantity[tickers, params]
+            o = open_price[tickers, params]
+            commission = p * q * rate
+            pnl = (p - o) * q - (open_commission[tickers, params] + commission)
+            relative_gain = p / o - 1
+            relative_gain = relative_gain - rate * (1 + 1 + relative_gain)
+            elapsed = timestamps[i] - opened_at[tickers, params]
+            duration = elapsed // NANOSECONDS_PER_DAY
+            trades.append((params, pnl, relative_gain, duration))
+
+            held[tickers, params] -= q
+            is_long[tickers, params] = False
+
+        def fill(js: np.ndarray, i: int):
+            price = prices[i, js][:, None]
+
+            # The trader orders of every ticker, in ticker order
+            buying = ~np.isnan(buy_quantity[js])
+            q_buy = np.where(buying, buy_quantity[js], 0.0)
+            commission = price * q_buy * rate
+            buy_costs = np.where(buying, -price * q_buy - commission, 0.0)
+            q_sell = quantity[js]
+            sell_costs = np.where(
+                trader_sell[js], price * q_sell - price * q_sell * rate, 0.0
+            )
+            paid = pay(buy_costs + sell_costs)
+            bought = paid & buying
+            sold = paid & trader_sell[js]
+
+            rows, params = np.nonzero(bought)
+            tickers = js[rows]
+            q = q_buy[rows, params]
+            held[tickers, params] += q
+            is_long[tickers, params] = True
+            quantity[tickers, params] = q
+            open_price[tickers, params] = price[rows, 0]
+            open_commission[tickers, params] = commission[rows, params]
+            opened_at[tickers, params] = timestamps[i]
+            close_longs(js, sold, i, price[:, 0])
+
+            # Then the closing orders of positions of expiring tickers
+            expiring = expiry_sell[js]
+            if expiring.any():
+                expiry_costs = np.where(
+                    expiring, price * q_sell - price * q_sell * rate, 0.0
+                )
+                expiring &= pay(expiry_costs)
+                closing = expiring & is_long[js]
+                close_longs(js, closing, i, price[:, 0])
+
+                rows, params = np.nonzero(expiring & ~closing)
+                tickers = js[rows]
+                held[tickers, params] -= quantity[tickers, params]
+                is_short[tickers, params] = True
+
+            buy_quantity[js] = np.nan
+            trader_sell[js] = False
+            expiry_sell[js] = False
+            placed_at[js] = -1
+
+        for i in range(n_dates):
+            filling = fills.pop(i, None)
+            if filling is not None:
+                # Orders fill in the order they were placed, then in ticker order
+                js = np.asarray(sorted(filling, key=lambda j: (placed_at[j], j)))
+                placed = placed_at[js]
+                for group in np.split(js, np.flatnonzero(np.diff(placed)) + 1):
+                    fill(group, i)
+
+            cash_at[i] = cash
+            has_close = ~np.isnan(close[i])
+            last_close[has_close] = close[i, has_close]
+            open_value[i] = last_close @ held
+
+            # Orders placed at the last bar of a ticker never fill
+            fillable = next_bar[i] >= 0
+            js = np.flatnonzero(has_signal[i] & fillable)
+            buy = np.zeros((len(js), n), dtype=bool)
+            sell = np.zeros((len(js), n), dtype=bool)
+            if i != before_last_idx and len(js) != 0:
+                flat = ~is_long[js] & ~is_short[js]
+                buy = entry[i, js] & flat
+                sell = exit[i, js] & is_long[js]
+
+            expiring = np.flatnonzero((second_to_last == i) & fillable)
+            expire = is_long[expiring]
+
+            ordering = np.zeros(n_tickers, dtype=bool)
+            ordering[js] = (buy | sell).any(axis=1)
+            ordering[expiring] |= expire.any(axis=1)
+            if not ordering.any():
+                continue
+
+            if buy.any():
+                q = sizing.quantity(cash[None, :], close[i, js][:, None])
+                q = np.broadcast_to(np.asarray(q, dtype=np.float64), buy.shape)
+                buy_quantity[js] = np.where(buy, q, np.nan)
+            trader_sell[js] = sell
+            expiry_sell[expiring] = expire
+
+            for j in np.flatnonzero(ordering).tolist():
+                placed_at[j] = i
+                fills.setdefault(int(next_bar[i, j]), []).append(j)
+
+        return self.__summarize(param_sets, cash_at, open_value, trades)
+
+    def __summarize(
+        self,
+        param_sets: List[Dict],
+        cash_at: np.ndarray,
+        open_value: np.ndarray,
+        trades: List[tuple],
+    ) -> List[ReportSummary]:
+        n = len(param_sets)
+        if trades:
+            params, pnl, relative_gain, duration = (
+                np.concatenate(column) for column in zip(*trades)
+            )
+        else:
+            params = np.zeros(0, dtype=np.int64)
+            pnl = relative_gain = np.zeros(0, dtype=np.float64)
+            duration = np.zeros(0, dtype=np.int64)
+
+        # Trades of each combination, in the order they were closed
+        order = np.argsort(params, kind="stable")
+        bounds = np.searchsorted(params[order], np.arange(n + 1))
+
+        summaries = []
+        for k in range(n):
+            rows = order[bounds[k] : bounds[k + 1]]
+            trades_df = pd.DataFrame(
+                {
+                    "pnl": pnl[rows],
+                    "relative_gain": relative_gain[rows],
+                    "duration": duration[rows],
+                }
+            )
+            value_df = pd.DataFrame(
+                {"cash": cash_at[:, k], "open_position": open_value[:, k]},
+                index=self.panel.time_index,
+            )
+            summaries.append(ReportSummary.from_frames(trades_df, value_df))
+        return summaries
+
+
+def _to_value(metric) -> float:
+    if metric is None or metric != metric:
+        return -np.inf
+    return float(metric)
@@ -1,5 +1,6 @@
 import pandas as pd
 from dataclasses import dataclass
+from typing import Callable
 
 from ekeko.backtrader.benchmark import Benchmark
 from ekeko.backtrader.broker import Account, OrderAction, Trade, Transaction
@@ -17,14 +18,21 @@ class ReportBuilder:
         self.signal_dfs = signal_dfs
         self.stock_dfs = stock_dfs
 
+        # Frames built so far. The account only appends transactions, trades and
+        # dates, and the rows of processed dates do not change, so building again
+        # only converts the new ones. Statistics are computed on the whole frames
+        self.__transactions = pd.DataFrame()
+        self.__trades = pd.DataFrame()
+        self.__portfolio: pd.DataFrame | None = None
+
     def build(self):
 
         transactions = self.__transactions_to_df(self.account.transactions)
         trades = self.__trades_to_df(self.account.trades)
-        trade_statistics = self.__compute_trades_statistics(trades)
-        relative_trade_statistics = self.__compute_relative_trade_statistics(trades)
-        portfolio = self.__fill_in_portfolio(self.account.value_df)
-        portfolio_statistics = self.__compute_portfolio_statistics(portfolio)
+        trade_statistics = compute_trades_statistics(trades)
+        relative_trade_statistics = compute_relative_trade_statistics(trades)
+        portfolio = self.__portfolio_to_df(self.account.value_df)
+        portfolio_statistics = compute_portfolio_statistics(portfolio)
 
         report = Report(
             transactions,
@@ -41,7 +49,7 @@ class ReportBuilder:
 
     def __transactions_to_df(self, transactions: list[Transaction]) -> pd.DataFrame:
         data = []
-        for transaction in transactions:
+        for transaction in transactions[len(self.__transactions) :]:
             sign = 1 if transaction.order.order_action == OrderAction.BUY else -1
             data.append(
                 {
@@ -53,7 +61,8 @@ class ReportBuilder:
                 }
             )
 
-        return pd.DataFrame(data)
+        self.__transactions = append_rows(self.__transactions, data)
+        return self.__transactions
 
     def __trades_to_df(self, trades: list[Trade]) -> pd.DataFrame:
         def get_duration(start: Date, end: Date):
@@ -61,7 +70,7 @@ class ReportBuilder:
             return duration.days
 
         data = []
-        for trade in trades:
+        for trade in trades[len(self.__trades) :]:
             duration = get_duration(
                 trade.opening_transaction.execution_date,
                 trade.closing_transaction.execution_date,
@@ -79,125 +88,165 @@ class ReportBuilder:
                 }
             )
 
-        return pd.DataFrame(data)
+        self.__trades = append_rows(self.__trades, data)
+        return self.__trades
+
+    def __portfolio_to_df(self, value_df: pd.DataFrame) -> pd.DataFrame:
+        previous = self.__portfolio
+        if previous is None or len(previous) == 0:
+            self.__portfolio = fill_in_portfolio(value_df)
+            return self.__portfolio
+
+        # Only the new dates are filled in, carrying the running maximum over
+        new_rows = value_df.iloc[len(previous) :].copy()
+        if len(new_rows) == 0:
+            return previous
+        new_rows["value"] = new_rows["cash"] + new_rows["open_position"]
+        new_rows["normalized_value"] = new_rows["value"] / previous.iloc[0]["cash"]
+        cummax = new_rows["normalized_value"].cummax()
+        new_rows["cummax"] = cummax.clip(lower=previous["cummax"].max())
+
+        self.__portfolio = pd.concat([previous, new_rows])
+        return self.__portfolio
+
+
+def append_rows(df: pd.DataFrame, rows: list[dict]) -> pd.DataFrame:
+    """`df` with `rows` appended, as a new frame if there are any."""
+    if len(rows) == 0:
+        return df
+    new_df = pd.DataFrame(rows)
+    if len(df) == 0:
+        return new_df
+    return pd.concat([df, new_df], ignore_index=True)
+
+
+def compute_trades_statistics(trades: pd.DataFrame) -> dict[str, float]:
+    if trades.empty:
+        return {}
+
+    trade_statistics = {}
+
+    trade_statistics["total_trades"] = len(trades)
+    trade_statistics["avg_pnl"] = trades["pnl"].mean()
+    trade_statistics["median_pnl"] = trades["pnl"].median()
+    trade_statistics["avg_duration"] = trades["duration"].mean()
+
+    positive_pnl = trades[trades["pnl"] > 0]["pnl"]
+    trade_statistics["avg_positive_pnl"] = positive_pnl.mean()
+
+    negative_pnl = trades[trades["pnl"] < 0]["pnl"]
+    trade_statistics["avg_negative_pnl"] = negative_pnl.mean()
+    trade_statistics["num_positive"] = len(positive_pnl)
+    trade_statistics["num_negative"] = len(negative_pnl)
+
+    if trade_statistics["avg_negative_pnl"] != 0:
+        trade_statistics["gain_pain_ratio"] = trade_statistics[
+            "avg_positive_pnl"
+        ] / abs(trade_statistics["avg_negative_pnl"])
+    else:
+        trade_statistics["gain_pain_ratio"] = None
+
+    if len(negative_pnl) != 0 and trade_statistics["gain_pain_ratio"]:
+        pos_to_neg_pnl_ratio = len(positive_pnl) / len(negative_pnl)
+        trade_statistics["avg_gain_pain_ratio"] = (
+            trade_statistics["gain_pain_ratio"] * pos_to_neg_pnl_ratio
+        )
+    else:
+        trade_statistics["avg_gain_pain_ratio"] = None
 
-    def __compute_trades_statistics(self, trades: pd.DataFrame) -> dict[str, float]:
-        if trades.empty:
-            return {}
+    return trade_statistics
 
-        trade_statistics = {}
 
-        trade_statistics["total_trades"] = len(trades)
-        trade_statistics["avg_pnl"] = trades["pnl"].mean()
-        trade_statistics["median_pnl"] = trades["pnl"].median()
-        trade_statistics["avg_duration"] = trades["duration"].mean()
+def compute_relative_trade_statistics(trades: pd.DataFrame) -> dict[str, float]:
+    if trades.empty:
+        return {}
 
-        positive_pnl = trades[trades["pnl"] > 0]["pnl"]
-        trade_statistics["avg_positive_pnl"] = positive_pnl.mean()
+    relative_trade_statistics = {}
 
-        negative_pnl = trades[trades["pnl"] < 0]["pnl"]
-        trade_statistics["avg_negative_pnl"] = negative_pnl.mean()
-        trade_statistics["num_positive"] = len(positive_pnl)
-        trade_statistics["num_negative"] = len(negative_pnl)
+    relative_trade_statistics["total_trades"] = len(trades)
+    relative_trade_statistics["avg_relative_gain"] = trades["relative_gain"].mean()
+    relative_trade_statistics["median_relative_gain"] = trades["relative_gain"].median()
+    relative_trade_statistics["avg_duration"] = trades["duration"].mean()
 
-        if trade_statistics["avg_negative_pnl"] != 0:
-            trade_statistics["gain_pain_ratio"] = trade_statistics[
-                "avg_positive_pnl"
-            ] / abs(trade_statistics["avg_negative_pnl"])
-        else:
-            trade_statistics["gain_pain_ratio"] = None
+    positive_gain = trades[trades["relative_gain"] > 0]["relative_gain"]
+    relative_trade_statistics["avg_positive_gain"] = positive_gain.mean()
 
-        if len(negative_pnl) != 0 and trade_statistics["gain_pain_ratio"]:
-            pos_to_neg_pnl_ratio = len(positive_pnl) / len(negative_pnl)
-            trade_statistics["avg_gain_pain_ratio"] = (
-                trade_statistics["gain_pain_ratio"] * pos_to_neg_pnl_ratio
-            )
-        else:
-            trade_statistics["avg_gain_pain_ratio"] = None
+    negative_gain = trades[trades["relative_gain"] < 0]["relative_gain"]
+    relative_trade_statistics["avg_negative_gain"] = negative_gain.mean()
+    relative_trade_statistics["num_positive"] = len(positive_gain)
+    relative_trade_statistics["num_negative"] = len(negative_gain)
 
-        return trade_statistics
+    if relative_trade_statistics["avg_negative_gain"] != 0:
+        relative_trade_statistics["gain_pain_ratio"] = relative_trade_statistics[
+            "avg_positive_gain"
+        ] / abs(relative_trade_statistics["avg_negative_gain"])
+    else:
+        relative_trade_statistics["gain_pain_ratio"] = None
 
-    def __compute_relative_trade_statistics(
-        self, trades: pd.DataFrame
-    ) -> dict[str, float]:
-        if trades.empty:
-            return {}
+    if len(negative_gain) != 0 and relative_trade_statistics["gain_pain_ratio"]:
+        pos_to_neg_gain_ratio = len(positive_gain) / len(negative_gain)
+        relative_trade_statistics["avg_gain_pain_ratio"] = (
+            relative_trade_statistics["gain_pain_ratio"] * pos_to_neg_gain_ratio
+        )
+    else:
+        relative_trade_statistics["avg_gain_pain_ratio"] = None
 
-        relative_trade_statistics = {}
+    return relative_trade_statistics
 
-        relative_trade_statistics["total_trades"] = len(trades)
-        relative_trade_statistics["avg_relative_gain"] = trades["relative_gain"].mean()
-        relative_trade_statistics["median_relative_gain"] = trades[
-            "relative_gain"
-        ].median()
-        relative_trade_statistics["avg_duration"] = trades["duration"].mean()
 
-        positive_gain = trades[trades["relative_gain"] > 0]["relative_gain"]
-        relative_trade_statistics["avg_positive_gain"] = positive_gain.mean()
+def fill_in_portfolio(portfolio: pd.DataFrame) -> pd.DataFrame:
+    portfolio["value"] = portfolio["cash"] + portfolio["open_position"]
+    portfolio["normalized_value"] = portfolio["value"] / portfolio.iloc[0]["cash"]
+    portfolio["cummax"] = portfolio["normalized_value"].cummax()
 
-        negative_gain = trades[trades["relative_gain"] < 0]["relative_gain"]
-        relative_trade_statistics["avg_negative_gain"] = negative_gain.mean()
-        relative_trade_statistics["num_positive"] = len(positive_gain)
-        relative_trade_statistics["num_negative"] = len(negative_gain)
+    return portfolio
 
-        if relative_trade_statistics["avg_negative_gain"] != 0:
-            relative_trade_statistics["gain_pain_ratio"] = relative_trade_statistics[
-                "avg_positive_gain"
-            ] / abs(relative_trade_statistics["avg_negative_gain"])
-        else:
-            relative_trade_statistics["gain_pain_ratio"] = None
 
-        if len(negative_gain) != 0 and relative_trade_statistics["gain_pain_ratio"]:
-            pos_to_neg_gain_ratio = len(positive_gain) / len(negative_gain)
-            relative_trade_statistics["avg_gain_pain_ratio"] = (
-                relative_trade_statistics["gain_pain_ratio"] * pos_to_neg_gain_ratio
-            )
-        else:
-            relative_trade_statistics["avg_gain_pain_ratio"] = None
+def _add_drawdown_statistics(stats: dict[str, float], portfolio: pd.DataFrame):
+    drawdown = portfolio["cummax"] - portfolio["normalized_value"]
+    normalized_drawdown = drawdown / portfolio["cummax"]
+    max_drawdown = normalized_drawdown.max()
+    stats["max_drawdown"] = max_drawdown
+
+    temp = drawdown[drawdown == 0]
+    periods = temp.index[1:].to_pydatetime() - temp.index[:-1].to_pydatetime()
 
-        return relative_trade_statistics
+    max_drawdown_duration = 0
+    if len(periods) != 0:
+        max_drawdown_duration = periods.max()
 
-    def __fill_in_portfolio(self, portfolio: pd.DataFrame) -> pd.DataFrame:
-        portfolio["value"] = portfolio["cash"] + portfolio["open_position"]
-        portfolio["normalized_value"] = portfolio["value"] / portfolio.iloc[0]["cash"]
-        portfolio["cummax"] = portfolio["normalized_value"].cummax()
+    stats["max_drawdown_duration"] = max_drawdown_duration
 
-        return portfolio
 
-    def __add_drawdown_statistics(
-        self, stats: dict[str, float], portfolio: pd.DataFrame
-    ):
-        drawdown = portfolio["cummax"] - portfolio["normalized_value"]
-        normalized_drawdown = drawdown / portfolio["cummax"]
-        max_drawdown = normalized_drawdown.max()
-        stats["max_drawdown"] = max_drawdown
+def compute_portfolio_statistics(portfolio: pd.DataFrame) -> dict[str, float]:
+    last_row = portfolio.iloc[-1]
 
-        temp = drawdown[drawdown == 0]
-        periods = temp.index[1:].to_pydatetime() - temp.index[:-1].to_pydatetime()
+    last_row_dict = last_row.to_dict()
 
-        max_drawdown_duration = 0
-        if len(periods) != 0:
-            max_drawdown_duration = periods.max()
+    initial_cash = portfolio.iloc[0]["cash"]
+    final_value = last_row["value"]
+    percentage_growth = ((final_value - initial_cash) / initial_cash) * 100
+    last_row_dict["percentage_growth"] = percentage_growth
 
-        stats["max_drawdown_duration"] = max_drawdown_duration
+    del last_row_dict["cummax"]
 
-    def __compute_portfolio_statistics(
-        self, portfolio: pd.DataFrame
-    ) -> dict[str, float]:
-        last_row = portfolio.iloc[-1]
+    _add_drawdown_statistics(last_row_dict, portfolio)
 
-        last_row_dict = last_row.to_dict()
+    return last_row_dict
 
-        initial_cash = portfolio.iloc[0]["cash"]
-        final_value = last_row["value"]
-        percentage_growth = ((final_value - initial_cash) / initial_cash) * 100
-        last_row_dict["percentage_growth"] = percentage_growth
 
-        del last_row_dict["cummax"]
+def _print_dict(dicto: dict[str, float]):
+    for key, value in dicto.items():
+        if isinstance(value, float):
+            print(f"{key:<20} {value:.4f}")
+        else:
+            print(f"{key:<20} {value}")
 
-        self.__add_drawdown_statistics(last_row_dict, portfolio)
 
-        return last_row_dict
+def _print_header(header: str):
+    print()
+    print("=" * 6, " ", header, " ", "=" * 6)
+    print()
 
 
 @dataclass
@@ -212,21 +261,9 @@ class Report:
     signal_dfs: Stock_dfs
     benchmark: Benchmark = Benchmark()
 
-    def __print_dict(self, dicto: dict[str, float]):
-        for key, value in dicto.items():
-            if isinstance(value, float):
-                print(f"{key:<20} {value:.4f}")
-            else:
-                print(f"{key:<20} {value}")
-
-    def __print_header(self, header: str):
-        print()
-        print("=" * 6, " ", header, " ", "=" * 6)
-        print()
-
     def __print_benchmark(self):
         if self.benchmark.is_not_empty():
-            self.__print_header("Benchmarks")
+            _print_header("Benchmarks")
             returns = self.portfolio_statistics["normalized_value"]
             self.benchmark.print(returns)
 
@@ -238,25 +275,25 @@ class Report:
 
     def print(self):
         pd.set_option("display.max_columns", None)
-        self.__print_header("Report")
+        _print_header("Report")
 
         fun.print_random_quote()
 
-        self.__print_header("Trade stats")
-        self.__print_dict(self.trades_statistics)
-        self.__print_header("Relative trade stats")
-        self.__print_dict(self.relative_trades_statistics)
-        self.__print_header("Portfolio stats")
-        self.__print_dict(self.portfolio_statistics)
+        _print_header("Trade stats")
+        _print_dict(self.trades_statistics)
+        _print_header("Relative trade stats")
+        _print_dict(self.relative_trades_statistics)
+        _print_header("Portfolio stats")
+        _print_dict(self.portfolio_statistics)
         self.__print_benchmark()
         print()
 
     def print_transactions_and_trades(self):
         pd.set_option("display.max_columns", None)
-        self.__print_header("Transactions")
+        _print_header("Transactions")
 
         print(self.transactions)
-        self.__print_header("Trades")
+        _print_header("Trades")
         if not self.trades.empty:
             trades = self.trades.sort_values(by="pnl", ascending=False)
             print(trades)
@@ -303,3 +340,55 @@ class Report:
     def plot_equity_curve(self):
         fig = get_equity_curve_fig(self.portfolio, self.benchmark.get_benchmark_dfs())
         fig.show()
+
+
+@dataclass
+class ReportSummary:
+    """
+    The statistics of a `Report` and user metrics computed from it, without frames.
+
+    Small enough to be sent back by workers for every parameter combination, and
+    metric functions on the statistics of a `Report` work on it as well.
+    """
+
+    trades_statistics: dict[str, float]
+    relative_trades_statistics: dict[str, float]
+    portfolio_statistics: dict[str, float]
+    metrics: dict[str, float]
+
+    @staticmethod
+    def from_report(
+        report: Report, metric_fns: dict[str, Callable[[Report], float]]
+    ) -> "ReportSummary":
+        metrics = {name: metric_fn(report) for name, metric_fn in metric_fns.items()}
+        return ReportSummary(
+            report.trades_statistics,
+            report.relative_trades_statistics,
+            report.portfolio_statistics,
+            metrics,
+        )
+
+    @staticmethod
+    def from_frames(trades: pd.DataFrame, value_df: pd.DataFrame) -> "ReportSummary":
+        """
+        Summary of the trades (with pnl, relative_gain and duration columns) and
+        the cash and open position values of an account, as `ReportBuilder` does.
+        """
+        portfolio = fill_in_portfolio(value_df)
+        return ReportSummary(
+            compute_trades_statistics(trades),
+            compute_relative_trade_statistics(trades),
+            compute_portfolio_statistics(portfolio),
+            {},
+        )
+
+    def print(self):
+        _print_header("Trade stats")
+        _print_dict(self.trades_statistics)
+        _print_header("Relative trade stats")
+        _print_dict(self.relative_trades_statistics)
+        _print_header("Portfolio stats")
+        _print_dict(self.portfolio_statistics)
+        _print_header("Metrics")
+        _print_dict(self.metrics)
+        print()
@@ -0,0 +1,102 @@
+import json
+import pickle
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from ekeko.backtrader.report import ReportSummary
+from ekeko.backtrader.signal_cache import hash_strategy
+from ekeko.core.hashing import hash_frames, hash_object, hash_params, hash_strings
+
+
+def get_search_key(strategy, trader, broker_builder, param_names: Iterable[str]) -> str:
+    """
+    Hex digest of everything a search result depends on besides its params.
+
+    That is the strategy (without the searched params), the trader, the broker
+    settings and the fingerprint of the stock dfs.
+    """
+    broker_settings = dict(vars(broker_builder))
+    stock_dfs = broker_settings.pop("stock_dfs")
+    return hash_strings(
+        hash_strategy(strategy, param_names),
+        hash_object(trader),
+        hash_object(broker_settings),
+        hash_frames(stock_dfs),
+    )
+
+
+def get_result_key(search_key: str, params: Dict) -> str:
+    return hash_strings(search_key, hash_params(params))
+
+
+class ResultStore:
+    """
+    SQLite store of the (params, ReportSummary) results of parameter searches.
+
+    Results are keyed by the search key (see `get_search_key`) and their params,
+    and written as soon as they are available so an interrupted search can be
+    resumed. Only the process that owns the store writes to it.
+    """
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                search_key TEXT NOT NULL,
+                params TEXT NOT NULL,
+                summary BLOB NOT NULL,
+                created REAL NOT NULL
+            )
+            """
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS results_search_key ON results (search_key)"
+        )
+        self.connection.commit()
+
+    def put(self, search_key: str, params: Dict, summary: ReportSummary):
+        key = get_result_key(search_key, params)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+            (
+                key,
+                search_key,
+                json.dumps(params, default=repr),
+                pickle.dumps(summary, protocol=pickle.HIGHEST_PROTOCOL),
+                time.time(),
+            ),
+        )
+        self.connection.commit()
+
+    def get(self, search_key: str, params: Dict) -> ReportSummary | None:
+        key = get_result_key(search_key, params)
+        row = self.connection.execute(
+            "SELECT summary FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def get_results(self, search_key: str) -> List[Tuple[Dict, ReportSummary]]:
+        """The stored results of a search, in the order they were stored."""
+        rows = self.connection.execute(
+            "SELECT params, summary FROM results WHERE search_key = ? "
+            "ORDER BY created, rowid",
+            (search_key,),
+        ).fetchall()
+        return [(json.loads(params), pickle.loads(summary)) for params, summary in rows]
+
+    def get_search_keys(self) -> List[str]:
+        rows = self.connection.execute(
+            "SELECT DISTINCT search_key FROM results ORDER BY search_key"
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
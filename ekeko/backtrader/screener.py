@@ -1,4 +1,7 @@
-from typing import Protocol
+from pathlib import Path
+from typing import Callable, Protocol
+from ekeko.backtrader.fundamentals_store import FundamentalsStore
+from ekeko.core.http import get_yfinance_session
 from ekeko.core.types import Ticker
 import sys
 import datetime
@@ -22,19 +25,47 @@ class TrivialScreener:
         return "trivial_screener"
 
 
+def fetch_yfinance_info(ticker: Ticker) -> dict:
+    return yf.Ticker(ticker, session=get_yfinance_session()).get_info()
+
+
 class YfinanceTickerSceener:
 
+    # Fundamentals the screen reads
+    keys = ["marketCap", "volume", "firstTradeDateEpochUtc"]
+
     def __init__(
         self,
         marketCapMin: int = 0,
         marketCapMax: int = sys.maxsize,
         volumeMin: int = 0,
         minTimeSinceFirstTrade: int = 0,
+        cache: FundamentalsStore | Path | str | None = None,
+        cache_ttl: datetime.timedelta = datetime.timedelta(days=1),
+        fetch_fn: Callable[[Ticker], dict] = fetch_yfinance_info,
     ):
+        """
+        Args:
+            marketCapMin: Smallest market cap that passes.
+            marketCapMax: Largest market cap that passes.
+            volumeMin: Smallest volume that passes.
+            minTimeSinceFirstTrade: Months since the first trade needed to pass.
+            cache: Fundamentals store (or the path of one) where the fundamentals
+                of each ticker are kept, so screens with other thresholds are
+                evaluated without fetching them again.
+            cache_ttl: Age after which cached fundamentals are fetched again.
+            fetch_fn: Fetches the info dict of a ticker, from Yahoo Finance by
+                default.
+        """
         self.marketCapMin = marketCapMin
         self.marketCapMax = marketCapMax
         self.volumeMin = volumeMin
         self.minTimeSinceFirstTrade = minTimeSinceFirstTrade
+        if cache is not None and not isinstance(cache, FundamentalsStore):
+            cache = FundamentalsStore(cache)
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        self.fetch_fn = fetch_fn
 
     def __time_passed(self, unix_timestamp) -> int:
         date_time = datetime.datetime.fromtimestamp(unix_timestamp)
@@ -47,16 +78,24 @@ class YfinanceTickerSceener:
         return total_months
 
     def __get_stock_info(self, ticker) -> dict | None:
+        if self.cache is not None:
+            stock_info = self.cache.get(ticker, self.cache_ttl)
+            if stock_info is not None:
+                return stock_info
 
         try:
-            stock = yf.Ticker(ticker)
-            stock_info = stock.get_info()
-            return stock_info
+            stock_info = self.fetch_fn(ticker)
 
         except Exception as e:
             print(f"An unexpected error occurred for ticker: {ticker}. Error: {e}")
             return None
 
+        # Only the fields the screen reads are kept, failed fetches are not
+        stock_info = {k: stock_info[k] for k in self.keys if k in stock_info}
+        if self.cache is not None:
+            self.cache.put(ticker, stock_info)
+        return stock_info
+
     def passes_screen(self, ticker: Ticker) -> bool:
 
         stock_info = self.__get_stock_info(ticker)
@@ -64,8 +103,7 @@ class YfinanceTickerSceener:
         if stock_info is None:
             return False
 
-        keys = ["marketCap", "volume", "firstTradeDateEpochUtc"]
-        for k in keys:
+        for k in self.keys:
             if k not in stock_info:
                 return False
 
@@ -0,0 +1,160 @@
+import inspect
+import os
+from pathlib import Path
+from typing import Iterable
+
+import pandas as pd
+
+from ekeko.config import config
+from ekeko.core.frame_file import MappedFrames, check_frame, write_frames
+from ekeko.core.hashing import hash_frame, hash_object, hash_params, hash_strings
+
+
+SIGNAL_FILE_SUFFIX = ".ekf"
+
+
+def hash_strategy(strategy, excluded_params: Iterable[str] = ()) -> str:
+    """
+    Hex digest of the strategy class, its source when available, its params and
+    its other attributes, e.g. a window or a model set up in `__init__`.
+
+    Params in `excluded_params`, e.g. the ones a search sets, are left out.
+    """
+    cls = type(strategy)
+    try:
+        source = inspect.getsource(cls)
+    except (OSError, TypeError):
+        source = ""
+
+    params = getattr(strategy, "params", None)
+    if params is not None:
+        excluded_params = set(excluded_params)
+        params = {k: v for k, v in params.items() if k not in excluded_params}
+    attributes = getattr(strategy, "__dict__", {})
+    attributes = {k: v for k, v in attributes.items() if k != "params"}
+    return hash_strings(
+        cls.__module__,
+        cls.__qualname__,
+        source,
+        hash_params(params),
+        hash_object(attributes),
+    )
+
+
+class SignalCache:
+    """
+    On-disk cache of the signal df a strategy produces for a stock df.
+
+    Entries are keyed by the hash of the stock df and of the strategy (class,
+    params and attributes), and stored one frame file per entry in `directory`. When the files
+    exceed `max_bytes`, the least recently used entries are evicted.
+    """
+
+    def __init__(self, directory: Path | str, max_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.__size = self.__disk_usage()
+
+    def get_key(self, stock_df: pd.DataFrame, strategy_hash: str) -> str:
+        return hash_strings(hash_frame(stock_df), strategy_hash)
+
+    def __path(self, key: str) -> Path:
+        return self.directory / f"{key}{SIGNAL_FILE_SUFFIX}"
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        path = self.__path(key)
+        try:
+            signal_df = MappedFrames(path).load()[key]
+            # Used entries are the last ones evicted
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return signal_df
+
+    def put(self, key: str, signal_df: pd.DataFrame) -> bool:
+        """Store the signal df, returns False if it cannot be written to a frame file."""
+        try:
+            check_frame(signal_df)
+        except TypeError:
+            return False
+
+        path = self.__path(key)
+        try:
+            # An overwritten entry no longer takes its space
+            self.__size -= path.stat().st_size
+        except FileNotFoundError:
+            pass
+        write_frames(path, {key: signal_df})
+        self.__size += path.stat().st_size
+
+        if self.__size > self.max_bytes:
+            self.evict()
+        return True
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits `max_bytes`."""
+        entries = []
+        for path in self.directory.glob(f"*{SIGNAL_FILE_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        entries.sort()
+
+        size = sum(st_size for _, st_size, _ in entries)
+        for _, st_size, path in entries:
+            if size <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            size -= st_size
+            self.evictions += 1
+
+        self.__size = size
+
+    def clear(self):
+        for path in self.directory.glob(f"*{SIGNAL_FILE_SUFFIX}"):
+            path.unlink(missing_ok=True)
+        self.__size = 0
+
+    def __disk_usage(self) -> int:
+        return sum(
+            path.stat().st_size
+            for path in self.directory.glob(f"*{SIGNAL_FILE_SUFFIX}")
+        )
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "bytes": self.__size,
+        }
+
+
+_signal_caches: dict[tuple[str, int], SignalCache] = {}
+
+
+def open_signal_cache() -> SignalCache | None:
+    """The signal cache set up in `ekeko.config`, None if it is disabled."""
+    if not config.signal_cache:
+        return None
+
+    directory = str(Path(config.signal_cache_dir).expanduser())
+    key = (directory, config.signal_cache_max_bytes)
+    if key not in _signal_caches:
+        _signal_caches[key] = SignalCache(directory, config.signal_cache_max_bytes)
+    return _signal_caches[key]
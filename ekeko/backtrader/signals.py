@@ -0,0 +1,202 @@
+import copy
+from pathlib import Path
+
+from joblib import Parallel, delayed, effective_n_jobs
+
+from ekeko.core.frame_file import (
+    MappedFrames,
+    check_frame,
+    shared_temp_dir,
+    write_frames,
+)
+from ekeko.core.types import Stock_dfs, Ticker
+from ekeko.core.universe import publish_universe
+
+
+def evaluate_signals(stock_dfs: Stock_dfs, strategy) -> Stock_dfs:
+    signal_dfs = dict()
+    for ticker, stock_df in stock_dfs.items():
+        signal_df = strategy.evaluate(stock_df)
+        signal_dfs[ticker] = signal_df
+
+    return signal_dfs
+
+
+class RecordingParams(dict):
+    """Strategy params that record the names the strategy reads."""
+
+    def __init__(self, params: dict):
+        super().__init__(params)
+        self.read: set[str] = set()
+        self.read_all = False
+
+    def __getitem__(self, key):
+        self.read.add(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.read.add(key)
+        return super().get(key, default)
+
+    def __contains__(self, key) -> bool:
+        self.read.add(key)
+        return super().__contains__(key)
+
+    def setdefault(self, key, default=None):
+        self.read.add(key)
+        return super().setdefault(key, default)
+
+    def pop(self, key, *default):
+        self.read.add(key)
+        return super().pop(key, *default)
+
+    # Reading every param at once makes the signals depend on all of them. That
+    # covers copies, dict(params) and **params, which go through keys()
+    def __iter__(self):
+        self.read_all = True
+        return super().__iter__()
+
+    def keys(self):
+        self.read_all = True
+        return super().keys()
+
+    def values(self):
+        self.read_all = True
+        return super().values()
+
+    def items(self):
+        self.read_all = True
+        return super().items()
+
+    def copy(self):
+        self.read_all = True
+        return dict(super().items())
+
+    def popitem(self):
+        self.read_all = True
+        return super().popitem()
+
+    def __len__(self) -> int:
+        self.read_all = True
+        return super().__len__()
+
+    def __eq__(self, other) -> bool:
+        self.read_all = True
+        return super().__eq__(other)
+
+    def __ne__(self, other) -> bool:
+        self.read_all = True
+        return super().__ne__(other)
+
+    def __or__(self, other):
+        self.read_all = True
+        return super().__or__(other)
+
+    def __ror__(self, other):
+        self.read_all = True
+        return super().__ror__(other)
+
+    def __repr__(self) -> str:
+        self.read_all = True
+        return super().__repr__()
+
+    def __reduce_ex__(self, protocol):
+        self.read_all = True
+        return super().__reduce_ex__(protocol)
+
+
+def evaluate_signals_recording_params(
+    stock_dfs: Stock_dfs, strategy
+) -> tuple[Stock_dfs, set[str] | None]:
+    """
+    Evaluate the strategy and return the names of the params it read.
+
+    The names are None when they cannot be known: the strategy has no params
+    dict to swap for a recording one, it read all its params at once, or it
+    read none through the dict (e.g. it kept them in attributes).
+    """
+    params = getattr(strategy, "params", None)
+    if not isinstance(params, dict):
+        return evaluate_signals(stock_dfs, strategy), None
+
+    # A copy reads the recording params, so the strategy itself is not touched
+    recording_params = RecordingParams(params)
+    recording_strategy = copy.copy(strategy)
+    recording_strategy.params = recording_params
+    signal_dfs = evaluate_signals(stock_dfs, recording_strategy)
+
+    if recording_params.read_all or not recording_params.read:
+        return signal_dfs, None
+    return signal_dfs, recording_params.read
+
+
+def _evaluate_chunk(
+    strategy, stock_path: Path, tickers: list[Ticker], signal_path: Path
+) -> tuple[dict[Ticker, str], Stock_dfs]:
+    """
+    Evaluate the strategy on the mapped stock dfs of `tickers` in a worker.
+
+    Returns the errors, and the signal dfs a frame file cannot store (e.g. with
+    object columns), which are pickled back instead.
+    """
+    stock_dfs = MappedFrames(stock_path)
+
+    signal_dfs = dict()
+    unmapped_signal_dfs = dict()
+    errors = dict()
+    for ticker in tickers:
+        try:
+            signal_df = strategy.evaluate(stock_dfs[ticker])
+        except Exception as e:
+            errors[ticker] = f"{type(e).__name__}: {e}"
+            continue
+
+        try:
+            check_frame(signal_df)
+        except TypeError:
+            unmapped_signal_dfs[ticker] = signal_df
+        else:
+            signal_dfs[ticker] = signal_df
+
+    write_frames(signal_path, signal_dfs)
+    return errors, unmapped_signal_dfs
+
+
+def evaluate_signals_in_parallel(
+    stock_dfs: Stock_dfs, strategy, n_jobs: int
+) -> tuple[Stock_dfs, dict[Ticker, str]]:
+    """
+    Evaluate the strategy on every stock df across a pool of `n_jobs` processes.
+
+    Stock dfs are written once to a memory-mapped file that workers map
+    read-only, and workers hand the signal dfs back the same way. Tickers whose
+    evaluation raises are left out and returned with their error message.
+    """
+    tickers = list(stock_dfs.keys())
+    n_chunks = min(len(tickers), 4 * effective_n_jobs(n_jobs))
+    chunks = [tickers[i::n_chunks] for i in range(n_chunks)]
+
+    signal_dfs = dict()
+    errors = dict()
+    with shared_temp_dir() as directory:
+        stock_path = publish_universe(directory, stock_dfs)
+        signal_paths = [directory / f"signal_dfs_{i}.ekf" for i in range(n_chunks)]
+
+        results = Parallel(n_jobs=n_jobs)(
+            delayed(_evaluate_chunk)(strategy, stock_path, chunk, signal_path)
+            for chunk, signal_path in zip(chunks, signal_paths)
+        )
+
+        for (chunk_errors, unmapped_signal_dfs), signal_path in zip(
+            results, signal_paths
+        ):
+            errors.update(chunk_errors)
+            signal_dfs.update(MappedFrames(signal_path).load())
+            signal_dfs.update(unmapped_signal_dfs)
+
+    # Keep the order of the stock dfs
+    signal_dfs = {
+        ticker: signal_dfs[ticker] for ticker in tickers if ticker in signal_dfs
+    }
+    errors = {ticker: errors[ticker] for ticker in tickers if ticker in errors}
+    return signal_dfs, errors
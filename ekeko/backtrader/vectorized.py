@@ -0,0 +1,416 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from typing import Protocol
+
+from ekeko.backtrader.broker import (
+    Account,
+    BrokerBuilder,
+    InstrumentType,
+    Order,
+    OrderAction,
+    OrderBuilder,
+    OrderType,
+    Position,
+    SlippageOnClose,
+    Transaction,
+)
+from ekeko.backtrader.engine import Engine, Strategy
+from ekeko.backtrader.report import Report, ReportBuilder
+from ekeko.core import Date, Number, Ticker, to_number
+from ekeko.core.signal_type import ENTRY, EXIT
+
+
+class Sizing(Protocol):
+
+    def quantity(self, cash: Number, close: np.ndarray) -> np.ndarray: ...
+
+
+class FixedQuantity:
+
+    def __init__(self, quantity: Number):
+        self.fixed_quantity = quantity
+
+    def quantity(self, cash: Number, close: np.ndarray) -> np.ndarray:
+        _ = cash
+        return np.full(np.shape(close), self.fixed_quantity, dtype=np.float64)
+
+
+class CashFraction:
+
+    def __init__(self, fraction: Number):
+        self.fraction = fraction
+
+    def quantity(self, cash: Number, close: np.ndarray) -> np.ndarray:
+        return cash * self.fraction / np.asarray(close, dtype=np.float64)
+
+
+class MarketTrader:
+    """
+    Market-order trader driven by the ENTRY/EXIT columns of the signal frames.
+
+    Buys `sizing.quantity(cash, close)` shares when the entry signal is set and the
+    ticker has no open position, and closes every open position of the ticker when
+    the exit signal is set. It can be used with the reference `Engine`, and it is
+    the trading rule that `VectorizedEngine` evaluates with array operations.
+    """
+
+    # Only opens positions on bars with a signal, see `Engine`
+    signal_driven = True
+
+    def __init__(self, sizing: Sizing, entry: str = ENTRY, exit: str = EXIT):
+        self.sizing = sizing
+        self.entry = entry
+        self.exit = exit
+
+    def trade(
+        self,
+        account: Account,
+        date: Date,
+        ticker: Ticker,
+        signal: pd.DataFrame,
+        stock_row: pd.DataFrame,
+        open_positions: list[Position],
+    ) -> list[Order]:
+        orders = []
+
+        if signal.loc[self.entry] and len(open_positions) == 0:
+            cash = account.get_cash(date)
+            quantity = to_number(self.sizing.quantity(cash, stock_row.loc["Close"]))
+            order = OrderBuilder(ticker, quantity).market().buy().at_date(date).build()
+            orders.append(order)
+
+        if signal.loc[self.exit]:
+            for p in open_positions:
+                order = p.get_closing_order(date)
+                orders.append(order)
+
+        return orders
+
+
+class VectorizedEngine(Engine):
+    """
+    Fast path of `Engine` for `MarketTrader` strategies.
+
+    Signals are aligned into (n_dates, n_tickers) boolean matrices. With a
+    `FixedQuantity` sizing every fill is computed at once across dates, otherwise
+    orders are generated for all tickers of a date at once and only dates with
+    signals, fills or expiring positions are visited. The equity curve is computed
+    at the end from the held quantities and forward filled closes. The produced
+    `Report` is the one the reference `Engine` gives for the same `MarketTrader`.
+    """
+
+    def __init__(
+        self,
+        trader: MarketTrader,
+        strategy: Strategy,
+        broker_builder: BrokerBuilder,
+    ):
+        if not isinstance(trader, MarketTrader):
+            raise TypeError("VectorizedEngine only supports a MarketTrader")
+        super().__init__(trader, strategy, broker_builder)
+        self.market_trader = trader
+
+    def run(self) -> Report:
+        panel = self.panel
+        account = self.broker.account
+
+        entry = panel.align(self.signal_dfs, self.market_trader.entry, False, bool)
+        exit = panel.align(self.signal_dfs, self.market_trader.exit, False, bool)
+        close = panel.fields["Close"]
+        second_to_last = panel.second_to_last_bar()
+
+        filled = self.__fill_fixed_quantity(entry, exit, close, second_to_last)
+        if filled is None:
+            filled = self.__process_events(entry, exit, close, second_to_last)
+        cash_at, quantity_delta = filled
+        self.__fill_in_account(account, cash_at, quantity_delta, close)
+
+        report_builder = ReportBuilder(account, self.signal_dfs, self.stock_dfs)
+        return report_builder.build()
+
+    def __process_events(
+        self,
+        entry: np.ndarray,
+        exit: np.ndarray,
+        close: np.ndarray,
+        second_to_last: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Fill the orders date by date, visiting only the dates with events."""
+        panel = self.panel
+        account = self.broker.account
+        order_processor = self.broker.order_processor
+        n_dates = panel.n_dates
+        before_last_idx = n_dates - 2
+
+        # Net signed quantity booked per (date, ticker), the cash after the fills of
+        # every visited date and the number of open positions per ticker
+        quantity_delta = np.zeros((n_dates, panel.n_tickers), dtype=np.float64)
+        cash_at = np.full(n_dates, np.nan, dtype=np.float64)
+        open_count = np.zeros(panel.n_tickers, dtype=np.int64)
+
+        cash = to_number(account.get_cash(panel.dates[0]))
+        cash_at[0] = cash
+
+        events = list(np.flatnonzero((entry | exit).any(axis=1)))
+        heapq.heapify(events)
+        visited = -1
+
+        def queue(orders: list[Order], date_idx: int):
+            for fill_date_idx in set(self.broker.queue_orders(orders, date_idx)):
+                heapq.heappush(events, fill_date_idx)
+
+        while events:
+            i = int(heapq.heappop(events))
+            if i <= visited:
+                continue
+            visited = i
+            date = panel.dates[i]
+
+            for order in self.broker.pop_orders(i):
+                transaction = order_processor.process_order(order, i)
+                if cash + transaction.cost < 0:
+                    account.dropped_transaction.append(transaction)
+                    continue
+
+                cash += transaction.cost
+                number_of_trades = len(account.trades)
+                account.book_transaction(transaction)
+
+                j = panel.get_ticker_idx(order.ticker)
+                sign = 1.0 if order.is_buy else -1.0
+                quantity_delta[i, j] += sign * order.quantity
+                if len(account.trades) == number_of_trades:
+                    open_count[j] += 1
+                    if second_to_last[j] >= i:
+                        heapq.heappush(events, int(second_to_last[j]))
+                else:
+                    open_count[j] -= 1
+
+            cash_at[i] = cash
+
+            buy = entry[i] & (open_count == 0)
+            sell = exit[i] & (open_count > 0)
+            active = np.flatnonzero(buy | sell)
+
+            orders: list[Order] = []
+            if len(active) != 0:
+                buying = active[buy[active]]
+                quantities = self.market_trader.sizing.quantity(cash, close[i, buying])
+                quantity_of = dict(zip(buying.tolist(), quantities.tolist()))
+
+                for j in active.tolist():
+                    ticker = panel.tickers[j]
+                    if j in quantity_of:
+                        order = (
+                            OrderBuilder(ticker, quantity_of[j])
+                            .market()
+                            .buy()
+                            .at_date(date)
+                            .build()
+                        )
+                        orders.append(order)
+                    if sell[j]:
+                        for p in account.get_positions(ticker):
+                            orders.append(p.get_closing_order(date))
+
+            if i != before_last_idx:
+                queue(orders, i)
+
+            expiring = np.flatnonzero((second_to_last == i) & (open_count > 0))
+            if len(expiring) != 0:
+                expiring_tickers = {panel.tickers[j] for j in expiring.tolist()}
+                closing_orders = [
+                    p.get_closing_order(date)
+                    for p in account.positions
+                    if p.transaction.order.ticker in expiring_tickers
+                ]
+                queue(closing_orders, i)
+
+        return cash_at, quantity_delta
+
+    def __fill_fixed_quantity(
+        self,
+        entry: np.ndarray,
+        exit: np.ndarray,
+        close: np.ndarray,
+        second_to_last: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        Fill every order of a `FixedQuantity` trader at once, with array operations
+        across dates and tickers.
+
+        Order sizes do not depend on the cash, so whether a ticker holds a position
+        follows from its signals alone: an entry opens one and an exit closes it on
+        the next bar. Returns None, with the account untouched, when the orders need
+        the event loop: other sizings or slippages, signals off the bars of their
+        ticker, entry and exit on the same bar, or a transaction the broker would
+        drop for lack of cash.
+        """
+        sizing = self.market_trader.sizing
+        order_processor = self.broker.order_processor
+        slippage = order_processor.stock_dfs.slippage
+        if type(sizing) is not FixedQuantity or type(slippage) is not SlippageOnClose:
+            return None
+
+        panel = self.panel
+        has_bar = panel.has_bar
+        n_dates, n_tickers = has_bar.shape
+        if ((entry | exit) & ~has_bar).any() or (entry & exit).any():
+            return None
+
+        # Orders of the day before the last one are not placed
+        entry = entry.copy()
+        exit = exit.copy()
+        if n_dates >= 2:
+            entry[n_dates - 2] = False
+            exit[n_dates - 2] = False
+
+        # Date index of the next bar of each ticker after each date, n_dates if none
+        rows = np.arange(n_dates)
+        bar_rows = np.where(has_bar, rows[:, None], n_dates)
+        next_bar = np.full((n_dates, n_tickers), n_dates, dtype=np.int64)
+        next_bar[:-1] = np.minimum.accumulate(bar_rows[::-1], axis=0)[::-1][1:]
+
+        # Whether a ticker holds a position after the fills of each date. Signals
+        # set or reset it on the next bar, it holds its value in between
+        fillable = next_bar < n_dates
+        signal_rows, signal_tickers = np.nonzero((entry | exit) & fillable)
+        state = np.full((n_dates + 1, n_tickers), -1, dtype=np.int8)
+        state[0] = 0
+        fill_rows = next_bar[signal_rows, signal_tickers]
+        state[fill_rows + 1, signal_tickers] = entry[signal_rows, signal_tickers]
+        last_set = np.maximum.accumulate(
+            np.where(state >= 0, np.arange(n_dates + 1)[:, None], 0), axis=0
+        )
+        held = np.take_along_axis(state, last_set, axis=0)[1:].astype(bool)
+
+        # Positions open on the second to last bar are closed on the last one
+        tickers = np.arange(n_tickers)
+        has_second_to_last = second_to_last >= 0
+        expiring = np.zeros(n_tickers, dtype=bool)
+        expiring[has_second_to_last] = held[
+            second_to_last[has_second_to_last], tickers[has_second_to_last]
+        ]
+        expiring_tickers = np.flatnonzero(expiring)
+        expiring_rows = second_to_last[expiring_tickers]
+        # An exit on that bar closes the position as well, and the second sell
+        # opens a short position that is left open
+        last_rows = next_bar[expiring_rows, expiring_tickers]
+        held[last_rows, expiring_tickers] = exit[expiring_rows, expiring_tickers]
+
+        buy = entry & ~held
+        sell = exit & held
+        order_rows, order_tickers = np.nonzero((buy | sell) & fillable)
+        is_buy = buy[order_rows, order_tickers]
+
+        # Expiring positions are closed in opening order, after the signal orders
+        last_buy_row = np.maximum.accumulate(
+            np.where(buy & fillable, rows[:, None], -1), axis=0
+        )
+        opening_rows = last_buy_row[expiring_rows - 1, expiring_tickers]
+        opening_fill_rows = next_bar[opening_rows, expiring_tickers]
+
+        n_orders = len(order_rows)
+        n_expiring = len(expiring_tickers)
+        placed = np.concatenate([order_rows, expiring_rows])
+        ticker_idx = np.concatenate([order_tickers, expiring_tickers])
+        fill = next_bar[placed, ticker_idx]
+        is_buy = np.concatenate([is_buy, np.zeros(n_expiring, dtype=bool)])
+        phase = np.repeat([0, 1], [n_orders, n_expiring])
+        tiebreaks = [
+            np.concatenate([np.zeros(n_orders, dtype=np.int64), expiring_tickers]),
+            np.concatenate([np.zeros(n_orders, dtype=np.int64), opening_rows]),
+            np.concatenate([order_tickers, opening_fill_rows]),
+        ]
+        # Fills in the order the broker pops them: by fill date, then in the order
+        # they were queued
+        order = np.lexsort((*tiebreaks, phase, placed, fill))
+        placed = placed[order]
+        ticker_idx = ticker_idx[order]
+        fill = fill[order]
+        is_buy = is_buy[order]
+
+        quantity = to_number(sizing.fixed_quantity)
+        comission_rate = order_processor.comission_rate
+        execution_price = close[fill, ticker_idx]
+        sign = np.where(is_buy, -1.0, 1.0)
+        comission = execution_price * quantity * comission_rate
+        cost = (sign * execution_price * quantity) - comission
+
+        account = self.broker.account
+        cash = np.cumsum(np.concatenate([[account.get_cash(panel.dates[0])], cost]))
+        if (cash[1:] < 0).any():
+            return None
+
+        cash_at = np.full(n_dates, np.nan, dtype=np.float64)
+        cash_at[0] = cash[0]
+        last_of_date = np.append(fill[1:] != fill[:-1], True)[: len(fill)]
+        cash_at[fill[last_of_date]] = cash[1:][last_of_date]
+
+        quantity_delta = np.zeros((n_dates, n_tickers), dtype=np.float64)
+        np.add.at(quantity_delta, (fill, ticker_idx), -sign * quantity)
+
+        for i, j, k, buys, price, fee, paid in zip(
+            placed.tolist(),
+            ticker_idx.tolist(),
+            fill.tolist(),
+            is_buy.tolist(),
+            execution_price.tolist(),
+            comission.tolist(),
+            cost.tolist(),
+        ):
+            action = OrderAction.BUY if buys else OrderAction.SELL
+            order = Order(
+                InstrumentType.STOCK,
+                panel.tickers[j],
+                quantity,
+                OrderType.MARKET,
+                action,
+                panel.dates[i],
+            )
+            transaction = Transaction(
+                order, fee, comission_rate, price, panel.dates[k], paid
+            )
+            account.book_transaction(transaction)
+
+        # Orders placed on the last bar of their ticker never fill
+        unfillable = (buy | sell) & ~fillable
+        for i, j in zip(*np.nonzero(unfillable)):
+            ticker = panel.tickers[j]
+            date = panel.dates[i]
+            if buy[i, j]:
+                order = OrderBuilder(ticker, quantity).market().buy().at_date(date)
+                self.broker.unfillable_orders.append(order.build())
+            else:
+                for p in account.get_positions(ticker):
+                    self.broker.unfillable_orders.append(p.get_closing_order(date))
+
+        return cash_at, quantity_delta
+
+    def __fill_in_account(
+        self,
+        account: Account,
+        cash_at: np.ndarray,
+        quantity_delta: np.ndarray,
+        close: np.ndarray,
+    ):
+        n_dates = len(cash_at)
+        rows = np.arange(n_dates)
+
+        # Cash only changes on visited dates
+        last_visited = np.maximum.accumulate(np.where(np.isnan(cash_at), 0, rows))
+        cash = cash_at[last_visited]
+
+        # Positions are valued at the last known close of their ticker
+        has_close = ~np.isnan(close)
+        last_close = np.maximum.accumulate(
+            np.where(has_close, rows[:, None], 0), axis=0
+        )
+        close_ffill = np.take_along_axis(close, last_close, axis=0)
+        held = np.cumsum(quantity_delta, axis=0)
+        open_position = np.where(held != 0, held * close_ffill, 0.0).sum(axis=1)
+
+        account.set_cash_and_open_value(cash, open_position)
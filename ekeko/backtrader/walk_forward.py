@@ -0,0 +1,292 @@
+from dataclasses import dataclass, replace
+from itertools import product
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from ekeko.backtrader.engine import (
+    Engine,
+    Strategy,
+    Trader,
+    get_strategy_with_params,
+)
+from ekeko.backtrader.grid_search import (
+    GridSearchTask,
+    UniverseSlice,
+    detach_universe,
+    get_scaffolding,
+    release_scaffolding,
+)
+from ekeko.backtrader.optimizer import OBJECTIVE, _to_value, get_default_metric
+from ekeko.backtrader.panel import get_timeindex_union
+from ekeko.backtrader.report import (
+    Report,
+    ReportSummary,
+    compute_portfolio_statistics,
+    compute_relative_trade_statistics,
+    compute_trades_statistics,
+    fill_in_portfolio,
+)
+from ekeko.config import config
+from ekeko.core.frame_file import shared_temp_dir
+from ekeko.core.types import Date, Stock_dfs
+from ekeko.core.universe import publish_universe
+
+
+@dataclass
+class Fold:
+    """Train on [train_start, test_start), then trade on [test_start, test_stop)."""
+
+    train_start: Date
+    test_start: Date
+    # None when the test window runs to the end of the data
+    test_stop: Date | None
+
+
+@dataclass
+class FoldResult:
+    fold: Fold
+    best_params: Dict
+    # Every combination with its summary on the train window
+    train_results: List[Tuple[Dict, ReportSummary]]
+    # Report of the best params on the test window
+    test_report: Report
+
+
+class WalkForwardTask:
+    """
+    Optimizes the params of a strategy on the train window of a fold and trades
+    the best ones on its test window, against a universe published to a file.
+
+    Windows are date slices of the frames mapped from `universe_path`, so folds
+    share the pages of the universe instead of copying it.
+    """
+
+    def __init__(
+        self,
+        strategy: Strategy,
+        trader: Trader,
+        broker_builder,
+        universe_path: Path,
+        param_combinations: List[Dict],
+        metric_fn: Callable[[Report], float],
+    ):
+        self.grid_task = GridSearchTask(
+            strategy, trader, broker_builder, universe_path, {OBJECTIVE: metric_fn}
+        )
+        self.universe_path = universe_path
+        self.param_combinations = param_combinations
+
+    def __call__(self, fold: Fold) -> FoldResult:
+        grid_task = self.grid_task
+        train = UniverseSlice(start=fold.train_start, stop=fold.test_start)
+        train_results = [grid_task(params, train) for params in self.param_combinations]
+        values = [_to_value(s.metrics[OBJECTIVE]) for _, s in train_results]
+        best_params = train_results[int(np.argmax(values))][0]
+
+        # Signals are computed from the start of the train window, so indicators
+        # are warmed up when the test window starts, but only the test is traded
+        history = UniverseSlice(start=fold.train_start, stop=fold.test_stop)
+        test = UniverseSlice(start=fold.test_start, stop=fold.test_stop)
+        history_scaffolding = get_scaffolding(self.universe_path, history)
+        test_scaffolding = get_scaffolding(self.universe_path, test)
+
+        strategy = get_strategy_with_params(grid_task.strategy, best_params)
+        strategy_key = grid_task.strategy_key
+        signal_dfs = history_scaffolding.get_signal_dfs(strategy, strategy_key)
+        signal_dfs = {
+            ticker: signal_dfs[ticker].loc[fold.test_start :]
+            for ticker in test_scaffolding.stock_dfs
+        }
+
+        broker_builder = replace(
+            grid_task.broker_builder, stock_dfs=test_scaffolding.stock_dfs
+        )
+        engine = Engine(
+            grid_task.trader,
+            strategy,
+            broker_builder,
+            signal_dfs=signal_dfs,
+            panel=test_scaffolding.panel,
+        )
+        test_report = engine.run()
+        # The caller has the stock dfs already, don't send them back
+        test_report.stock_dfs = {}
+
+        for universe_slice in (train, history, test):
+            release_scaffolding(universe_slice)
+
+        return FoldResult(fold, best_params, train_results, test_report)
+
+
+class WalkForward:
+    """
+    Out-of-sample validation of a parameter search.
+
+    The union time index is split in consecutive test windows of `test_size`
+    dates, each preceded by a train window: the `train_size` dates before it when
+    rolling, or every date before it when `anchored`. The params that maximize
+    `metric_fn` on a train window are traded on the following test window, and
+    the test windows are stitched into one `Report`.
+
+    Folds run in parallel on `config.num_processors` workers, which map the
+    universe from a shared file as in `GridSearch`.
+    """
+
+    def __init__(
+        self,
+        strategy: Strategy,
+        trader: Trader,
+        stock_dfs: Dict[str, pd.DataFrame],
+        broker_builder,
+        param_grid: Dict[str, List],
+        train_size: int,
+        test_size: int,
+        anchored: bool = False,
+        metric_fn: Callable[[Report], float] | None = None,
+    ) -> None:
+        """
+        Args:
+            strategy: The strategy instance to optimize.
+            trader: The trading logic.
+            stock_dfs: A dictionary of stock data.
+            broker_builder: Builder for the broker class.
+            param_grid: A dictionary with parameter names as keys and a list of values to try.
+            train_size: Number of dates of the first train window, and of every
+                train window when rolling.
+            test_size: Number of dates of each test window.
+            anchored: Whether train windows all start at the first date.
+            metric_fn: Metric to maximize on the train windows, computed from a
+                Report. Defaults to portfolio percentage growth.
+        """
+        if train_size < 2 or test_size < 2:
+            raise ValueError("Train and test windows need at least two dates")
+
+        self.strategy = strategy
+        self.trader = trader
+        self.stock_dfs: Dict[str, pd.DataFrame] = stock_dfs
+        self.broker_builder = broker_builder
+        self.param_grid: Dict[str, List] = param_grid
+        self.train_size = train_size
+        self.test_size = test_size
+        self.anchored = anchored
+        self.metric_fn = metric_fn if metric_fn is not None else get_default_metric
+
+    def get_folds(self) -> List[Fold]:
+        time_index = get_timeindex_union(self.stock_dfs)
+        n_dates = len(time_index)
+
+        folds = []
+        test_start = self.train_size
+        # The last test window needs two dates to trade
+        while test_start < n_dates - 1:
+            test_stop = test_start + self.test_size
+            train_start = 0 if self.anchored else test_start - self.train_size
+            folds.append(
+                Fold(
+                    time_index[train_start],
+                    time_index[test_start],
+                    time_index[test_stop] if test_stop < n_dates else None,
+                )
+            )
+            test_start = test_stop
+        return folds
+
+    def run(self) -> "WalkForwardReport":
+        param_combinations: List[Dict] = [
+            dict(zip(self.param_grid.keys(), values))
+            for values in product(*self.param_grid.values())
+        ]
+        folds = self.get_folds()
+
+        print(
+            f"Testing {len(param_combinations)} parameter combinations "
+            f"on {len(folds)} folds..."
+        )
+
+        with shared_temp_dir() as directory:
+            universe_path = publish_universe(directory, self.broker_builder.stock_dfs)
+            task = WalkForwardTask(
+                self.strategy,
+                self.trader,
+                self.broker_builder,
+                universe_path,
+                param_combinations,
+                self.metric_fn,
+            )
+            fold_results = Parallel(n_jobs=config.num_processors)(
+                delayed(task)(fold) for fold in folds
+            )
+            detach_universe()
+
+        for fold_result in fold_results:
+            fold_result.test_report.stock_dfs = self.broker_builder.stock_dfs
+
+        report = stitch_reports(
+            [r.test_report for r in fold_results], self.broker_builder.stock_dfs
+        )
+        return WalkForwardReport(fold_results, report)
+
+
+@dataclass
+class WalkForwardReport:
+    folds: List[FoldResult]
+    # The test windows stitched together
+    report: Report
+
+    @property
+    def best_params(self) -> List[Dict]:
+        return [fold_result.best_params for fold_result in self.folds]
+
+    def print(self):
+        for fold_result in self.folds:
+            fold = fold_result.fold
+            growth = fold_result.test_report.portfolio_statistics["percentage_growth"]
+            print(
+                f"{fold.test_start} - {fold.test_stop}: {fold_result.best_params} "
+                f"({growth:.2f}%)"
+            )
+        self.report.print()
+
+
+def stitch_reports(reports: List[Report], stock_dfs: Stock_dfs) -> Report:
+    """
+    Stitch the reports of consecutive date windows into one.
+
+    The equity of each window is scaled so it starts where the previous one
+    ended, as if the whole account was carried over. Transactions and trades are
+    the ones of each window.
+    """
+    value_dfs = []
+    scale = 1.0
+    for report in reports:
+        value_df = report.portfolio[["cash", "open_position"]] * scale
+        value_dfs.append(value_df)
+        portfolio = report.portfolio
+        scale *= portfolio["value"].iloc[-1] / portfolio["cash"].iloc[0]
+
+    portfolio = fill_in_portfolio(pd.concat(value_dfs))
+    transactions = pd.concat([r.transactions for r in reports], ignore_index=True)
+    trades = pd.concat([r.trades for r in reports], ignore_index=True)
+
+    signal_dfs: Stock_dfs = {}
+    for ticker in stock_dfs:
+        window_signal_dfs = [
+            r.signal_dfs[ticker] for r in reports if ticker in r.signal_dfs
+        ]
+        if window_signal_dfs:
+            signal_dfs[ticker] = pd.concat(window_signal_dfs)
+
+    return Report(
+        transactions,
+        trades,
+        compute_trades_statistics(trades),
+        compute_relative_trade_statistics(trades),
+        portfolio,
+        compute_portfolio_statistics(portfolio),
+        stock_dfs,
+        signal_dfs,
+    )
@@ -0,0 +1,45 @@
+"""Command line entry point, installed as `ekeko`."""
+
+import argparse
+
+from ekeko.core.work_queue import run_worker
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="ekeko")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    worker = commands.add_parser("worker", help="Run the tasks of a work queue")
+    worker.add_argument("queue_dir", help="Directory of the work queue")
+    worker.add_argument(
+        "--poll-interval", type=float, default=0.1, help="Seconds between polls"
+    )
+    worker.add_argument(
+        "--heartbeat-interval",
+        type=float,
+        default=5.0,
+        help="Seconds between heartbeats",
+    )
+    worker.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=None,
+        help="Exit after this many seconds without tasks",
+    )
+    worker.add_argument(
+        "--max-tasks", type=int, default=None, help="Exit after this many tasks"
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "worker":
+        run_worker(
+            args.queue_dir,
+            poll_interval=args.poll_interval,
+            heartbeat_interval=args.heartbeat_interval,
+            idle_timeout=args.idle_timeout,
+            max_tasks=args.max_tasks,
+        )
+
+
+if __name__ == "__main__":
+    main()
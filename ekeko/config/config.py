@@ -4,6 +4,14 @@ import multiprocessing
 class EkekoConfig:
     def __init__(self):
         self._num_processors = 2
+        self._num_io_threads = 32
+        self._http_rate_limit: float | None = None
+        self._http_max_concurrency = 16
+        self._http_max_retries = 3
+        self._parallel_signals = False
+        self._signal_cache = False
+        self._signal_cache_dir = "~/.cache/ekeko/signals"
+        self._signal_cache_max_bytes = 1 << 30
 
     @property
     def num_processors(self):
@@ -13,6 +21,75 @@ class EkekoConfig:
     def num_processors(self, value: int):
         self._num_processors = value
 
+    @property
+    def num_io_threads(self):
+        """Threads of the pools running I/O bound tasks, e.g. reading files."""
+        return self._num_io_threads
+
+    @num_io_threads.setter
+    def num_io_threads(self, value: int):
+        self._num_io_threads = value
+
+    @property
+    def http_rate_limit(self):
+        """Requests per second to each host, unlimited if None."""
+        return self._http_rate_limit
+
+    @http_rate_limit.setter
+    def http_rate_limit(self, value: float | None):
+        self._http_rate_limit = value
+
+    @property
+    def http_max_concurrency(self):
+        """Requests in flight to each host, per process."""
+        return self._http_max_concurrency
+
+    @http_max_concurrency.setter
+    def http_max_concurrency(self, value: int):
+        self._http_max_concurrency = value
+
+    @property
+    def http_max_retries(self):
+        return self._http_max_retries
+
+    @http_max_retries.setter
+    def http_max_retries(self, value: int):
+        self._http_max_retries = value
+
+    @property
+    def parallel_signals(self):
+        """Evaluate strategy signals across the `num_processors` pool."""
+        return self._parallel_signals
+
+    @parallel_signals.setter
+    def parallel_signals(self, value: bool):
+        self._parallel_signals = value
+
+    @property
+    def signal_cache(self):
+        """Reuse signals stored on disk when the data and strategy did not change."""
+        return self._signal_cache
+
+    @signal_cache.setter
+    def signal_cache(self, value: bool):
+        self._signal_cache = value
+
+    @property
+    def signal_cache_dir(self):
+        return self._signal_cache_dir
+
+    @signal_cache_dir.setter
+    def signal_cache_dir(self, value: str):
+        self._signal_cache_dir = value
+
+    @property
+    def signal_cache_max_bytes(self):
+        return self._signal_cache_max_bytes
+
+    @signal_cache_max_bytes.setter
+    def signal_cache_max_bytes(self, value: int):
+        self._signal_cache_max_bytes = value
+
 
 # Create a global instance
 config = EkekoConfig()
@@ -26,3 +103,25 @@ def set_num_processors(value: int):
 
 def get_num_processors() -> int:
     return config.num_processors
+
+
+def set_parallel_signals(value: bool):
+    config.parallel_signals = value
+
+
+def get_parallel_signals() -> bool:
+    return config.parallel_signals
+
+
+def set_signal_cache(
+    value: bool, directory: str | None = None, max_bytes: int | None = None
+):
+    config.signal_cache = value
+    if directory is not None:
+        config.signal_cache_dir = directory
+    if max_bytes is not None:
+        config.signal_cache_max_bytes = max_bytes
+
+
+def get_signal_cache() -> bool:
+    return config.signal_cache
@@ -1,2 +1,9 @@
 from .types import *
 from .signal_type import *
+from .frame_file import *
+from .universe import *
+from .hashing import *
+from .telemetry import *
+from .executor import *
+from .http import *
+from .work_queue import *
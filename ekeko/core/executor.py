@@ -0,0 +1,63 @@
+"""
+Executors run a function over many items and hand back the results as they
+finish. Searches and dataset loads submit their tasks through one, so the same
+code runs on a local pool or on workers of a work queue.
+"""
+
+from contextlib import AbstractContextManager
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Protocol
+
+from joblib import Parallel, delayed
+
+from ekeko.config import config
+from ekeko.core.frame_file import shared_temp_dir
+
+
+class Executor(Protocol):
+    # Whether tasks may run on other hosts, which then check the fingerprint of
+    # the files they read
+    remote: bool
+
+    def shared_dir(self) -> AbstractContextManager[Path]:
+        """Temporary directory for files the tasks read, removed on exit."""
+        ...
+
+    def map_unordered(self, fn: Callable, items: Iterable) -> Iterator[Any]:
+        """Results of `fn(item)` for every item, in the order they finish."""
+        ...
+
+
+class JoblibExecutor:
+    """Runs tasks on a local joblib pool of `n_jobs` workers."""
+
+    remote = False
+
+    def __init__(self, n_jobs: int | None = None, backend: str | None = None):
+        """
+        Args:
+            n_jobs: Number of workers, `config.num_processors` by default.
+            backend: The joblib backend, e.g. "threading", loky processes by default.
+        """
+        self.n_jobs = n_jobs
+        self.backend = backend
+
+    def shared_dir(self) -> AbstractContextManager[Path]:
+        return shared_temp_dir()
+
+    def map_unordered(self, fn: Callable, items: Iterable) -> Iterator[Any]:
+        n_jobs = self.n_jobs if self.n_jobs is not None else config.num_processors
+        parallel = Parallel(
+            n_jobs=n_jobs, backend=self.backend, return_as="generator_unordered"
+        )
+        return parallel(delayed(fn)(item) for item in items)
+
+
+def get_io_executor() -> JoblibExecutor:
+    """
+    Executor for I/O bound tasks such as downloads: a pool of
+    `config.num_io_threads` threads, which share the HTTP sessions of the
+    process (see `ekeko.core.http`) instead of importing everything again in new
+    processes to wait on sockets.
+    """
+    return JoblibExecutor(config.num_io_threads, backend="threading")
@@ -0,0 +1,255 @@
+"""
+Single file, columnar storage for a dict of per-ticker frames.
+
+Layout: an 8 byte magic, the length of a JSON header as uint64, the header, and
+then one contiguous array per column (all tickers concatenated) plus one int64
+array with the nanosecond timestamps of every row. A ticker owns the rows
+`offsets[i]:offsets[i + 1]` of every array. Arrays start at 64 byte boundaries so
+the file can be mapped with np.memmap and frames built as zero-copy views.
+"""
+
+import json
+import os
+import shutil
+import struct
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Mapping
+
+import numpy as np
+import pandas as pd
+
+from ekeko.core.types import Stock_dfs, Ticker
+
+
+MAGIC = b"EKEKOFRM"
+VERSION = 1
+ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _frame_header(frame: pd.DataFrame) -> dict:
+    if not isinstance(frame.index, pd.DatetimeIndex):
+        raise TypeError(f"Expected a DatetimeIndex, but got {type(frame.index)}")
+
+    dtypes = []
+    for column in frame.columns:
+        if not isinstance(column, str):
+            raise TypeError(f"Column names must be strings, got {column!r}")
+        dtype = frame[column].dtype
+        if not isinstance(dtype, np.dtype) or dtype.kind not in "biufM":
+            raise TypeError(f"Column {column} has unsupported dtype {dtype}")
+        dtypes.append(dtype.str)
+
+    tz = frame.index.tz
+    freq = frame.index.freqstr
+    return {
+        "columns": list(frame.columns),
+        "dtypes": dtypes,
+        "tz": str(tz) if tz is not None else None,
+        "freq": freq,
+        "name": frame.index.name,
+        # Raises for attrs that are not JSON serializable
+        "attrs": json.loads(json.dumps(frame.attrs)),
+    }
+
+
+def check_frame(frame: pd.DataFrame):
+    """Raise a TypeError if the frame cannot be written with `write_frames`."""
+    _frame_header(frame)
+
+
+def write_frames(path: Path | str, frames: Stock_dfs, metadata: dict | None = None):
+    """
+    Write the frames to `path`, replacing any existing file atomically.
+
+    `metadata` is a JSON serializable dict kept in the header of the file.
+    """
+    path = Path(path)
+    tickers = list(frames.keys())
+    frame_headers = [_frame_header(frames[ticker]) for ticker in tickers]
+
+    lengths = [len(frames[ticker]) for ticker in tickers]
+    offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).tolist()
+    n_rows = offsets[-1]
+
+    # One array per column, with a dtype that fits the column of every ticker
+    column_dtypes: dict[str, np.dtype] = {}
+    for frame_header in frame_headers:
+        for column, dtype in zip(frame_header["columns"], frame_header["dtypes"]):
+            dtype = np.dtype(dtype)
+            if column in column_dtypes:
+                dtype = np.result_type(column_dtypes[column], dtype)
+            column_dtypes[column] = dtype
+
+    arrays = [("__index__", np.dtype("<i8"))] + list(column_dtypes.items())
+
+    # The header holds the data offsets, which depend on the header size
+    data_start = 0
+    while True:
+        array_headers = []
+        offset = data_start
+        for name, dtype in arrays:
+            offset = _align(offset)
+            array_headers.append({"name": name, "dtype": dtype.str, "offset": offset})
+            offset += n_rows * dtype.itemsize
+        header = {
+            "version": VERSION,
+            "n_rows": n_rows,
+            "tickers": tickers,
+            "offsets": offsets,
+            "arrays": array_headers,
+            "frames": frame_headers,
+            "metadata": metadata if metadata is not None else {},
+        }
+        header_bytes = json.dumps(header).encode("utf-8")
+        header_end = _align(len(MAGIC) + 8 + len(header_bytes))
+        if header_end <= data_start:
+            break
+        data_start = header_end + ALIGNMENT
+    total_size = _align(offset)
+
+    tmp_path = path.with_name(path.name + f".tmp{os.getpid()}")
+    with open(tmp_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(struct.pack("<Q", len(header_bytes)))
+        file.write(header_bytes)
+        file.truncate(total_size)
+
+    if n_rows != 0:
+        buffer = np.memmap(tmp_path, dtype=np.uint8, mode="r+")
+        for array_header in header["arrays"]:
+            name = array_header["name"]
+            dtype = np.dtype(array_header["dtype"])
+            start = array_header["offset"]
+            array = buffer[start : start + n_rows * dtype.itemsize].view(dtype)
+
+            for i, ticker in enumerate(tickers):
+                frame = frames[ticker]
+                rows = slice(offsets[i], offsets[i + 1])
+                if name == "__index__":
+                    index = frame.index.as_unit("ns")
+                    array[rows] = index.asi8
+                elif name in frame.columns:
+                    array[rows] = frame[name].to_numpy(dtype=dtype)
+                else:
+                    array[rows] = np.zeros(1, dtype=dtype)[0]
+
+        buffer.flush()
+        del buffer
+
+    os.replace(tmp_path, path)
+
+
+class MappedFrames(Mapping[Ticker, pd.DataFrame]):
+    """
+    Frames written with `write_frames`, mapped read-only from disk.
+
+    Frames are built lazily on access and their columns are views into the mapped
+    file, so every process that opens the same file shares the same pages.
+    """
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+
+        with open(self.path, "rb") as file:
+            magic = file.read(len(MAGIC))
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not an ekeko frame file")
+            (header_length,) = struct.unpack("<Q", file.read(8))
+            header = json.loads(file.read(header_length).decode("utf-8"))
+
+        if header["version"] != VERSION:
+            raise ValueError(f"Unsupported frame file version {header['version']}")
+
+        self.tickers: list[Ticker] = header["tickers"]
+        self.offsets = np.asarray(header["offsets"], dtype=np.int64)
+        self.frame_headers: list[dict] = header["frames"]
+        self.metadata: dict = header.get("metadata", {})
+        self.__ticker_loc = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+        self.arrays: dict[str, np.ndarray] = {}
+        n_rows = header["n_rows"]
+        if n_rows != 0:
+            # Plain ndarray views keep the mapping alive through their base
+            buffer = np.asarray(np.memmap(self.path, dtype=np.uint8, mode="r"))
+            for array_header in header["arrays"]:
+                dtype = np.dtype(array_header["dtype"])
+                start = array_header["offset"]
+                array = buffer[start : start + n_rows * dtype.itemsize].view(dtype)
+                self.arrays[array_header["name"]] = array
+        else:
+            for array_header in header["arrays"]:
+                dtype = np.dtype(array_header["dtype"])
+                self.arrays[array_header["name"]] = np.empty(0, dtype=dtype)
+
+    def __len__(self) -> int:
+        return len(self.tickers)
+
+    def __iter__(self) -> Iterator[Ticker]:
+        return iter(self.tickers)
+
+    def __contains__(self, ticker) -> bool:
+        return ticker in self.__ticker_loc
+
+    def get_dates(self, ticker: Ticker) -> np.ndarray:
+        """Row timestamps of the ticker as int64 nanoseconds (UTC if tz aware)."""
+        i = self.__ticker_loc[ticker]
+        return self.arrays["__index__"][self.offsets[i] : self.offsets[i + 1]]
+
+    def get_frame(self, ticker: Ticker, start: int = 0, stop: int | None = None):
+        """Frame of the ticker restricted to its rows `start:stop`, as views."""
+        i = self.__ticker_loc[ticker]
+        frame_header = self.frame_headers[i]
+        first, last = self.offsets[i], self.offsets[i + 1]
+        rows = slice(first + start, last if stop is None else first + stop)
+
+        dates = self.arrays["__index__"][rows].view("M8[ns]")
+        index = pd.DatetimeIndex(dates, name=frame_header["name"])
+        if frame_header["tz"] is not None:
+            index = index.tz_localize("UTC").tz_convert(frame_header["tz"])
+        if frame_header["freq"] is not None and len(index) != 0:
+            index = pd.DatetimeIndex(index, freq=frame_header["freq"])
+
+        data = {}
+        for column, dtype in zip(frame_header["columns"], frame_header["dtypes"]):
+            values = self.arrays[column][rows]
+            if values.dtype != np.dtype(dtype):
+                values = values.astype(dtype)
+            data[column] = values
+
+        frame = pd.DataFrame(
+            data, index=index, columns=frame_header["columns"], copy=False
+        )
+        frame.attrs.update(frame_header["attrs"])
+        return frame
+
+    def __getitem__(self, ticker: Ticker) -> pd.DataFrame:
+        if ticker not in self.__ticker_loc:
+            raise KeyError(ticker)
+        return self.get_frame(ticker)
+
+    def load(self) -> Stock_dfs:
+        """In-memory copies of every frame, independent of the mapped file."""
+        return {ticker: self.get_frame(ticker).copy() for ticker in self.tickers}
+
+
+def get_shared_dir() -> str | None:
+    """Directory for files shared between processes, in RAM when available."""
+    shm = "/dev/shm"
+    if os.path.isdir(shm) and os.access(shm, os.W_OK):
+        return shm
+    return None
+
+
+@contextmanager
+def shared_temp_dir() -> Iterator[Path]:
+    path = Path(tempfile.mkdtemp(prefix="ekeko-", dir=get_shared_dir()))
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,143 @@
+"""
+Stable content hashes of frames and parameters.
+
+Hashes only depend on the data, never on object identity, so they can be used
+as keys of on-disk caches and compared across processes and sessions.
+"""
+
+import hashlib
+import inspect
+import json
+from typing import Any, Mapping
+
+import numpy as np
+import pandas as pd
+
+from ekeko.core.types import Stock_dfs, Ticker
+
+
+DIGEST_SIZE = 20
+
+
+def _new_hash():
+    return hashlib.blake2b(digest_size=DIGEST_SIZE)
+
+
+def _update_with_array(h, values: np.ndarray):
+    if values.dtype.kind in "biufcmM":
+        h.update(values.dtype.str.encode())
+        h.update(np.ascontiguousarray(values).tobytes())
+    else:
+        # Object columns hold pointers, hash their values instead
+        hashed = pd.util.hash_array(np.asarray(values, dtype=object))
+        h.update(b"object")
+        h.update(hashed.tobytes())
+
+
+def hash_frame(frame: pd.DataFrame) -> str:
+    """Hex digest of the index, column names, dtypes and values of the frame."""
+    h = _new_hash()
+
+    index = frame.index
+    if isinstance(index, pd.DatetimeIndex):
+        h.update(str(index.tz).encode())
+        _update_with_array(h, index.as_unit("ns").asi8)
+    else:
+        _update_with_array(h, index.to_numpy())
+
+    for column in frame.columns:
+        h.update(repr(column).encode())
+        _update_with_array(h, frame[column].to_numpy())
+
+    return h.hexdigest()
+
+
+def hash_frames(frames: Stock_dfs) -> str:
+    """Hex digest of every (ticker, frame) pair, in order."""
+    return combine_frame_hashes({t: hash_frame(f) for t, f in frames.items()})
+
+
+def combine_frame_hashes(frame_hashes: Mapping[Ticker, str]) -> str:
+    """`hash_frames` of frames whose `hash_frame` digests are already known."""
+    h = _new_hash()
+    for ticker, frame_hash in frame_hashes.items():
+        h.update(repr(ticker).encode())
+        h.update(frame_hash.encode())
+    return h.hexdigest()
+
+
+def hash_params(params: Any) -> str:
+    """Hex digest of JSON-like params, independent of the order of dict keys."""
+    encoded = json.dumps(params, sort_keys=True, default=repr)
+    return hash_strings(encoded)
+
+
+def hash_strings(*parts: str) -> str:
+    """Hex digest of a sequence of strings."""
+    h = _new_hash()
+    for part in parts:
+        encoded = part.encode()
+        h.update(len(encoded).to_bytes(8, "little"))
+        h.update(encoded)
+    return h.hexdigest()
+
+
+def hash_object(obj: Any) -> str:
+    """
+    Hex digest of an object built from plain values, frames, arrays and instances.
+
+    Instances hash their class (module, name and source when available) and their
+    attributes, so two equal configurations hash the same across processes.
+    """
+    return hash_strings(_describe(obj, set()))
+
+
+def _describe(obj: Any, seen: set) -> str:
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return repr(obj)
+    if isinstance(obj, pd.DataFrame):
+        return f"DataFrame:{hash_frame(obj)}"
+    if isinstance(obj, pd.Series):
+        return f"Series:{hash_frame(obj.to_frame())}"
+    if isinstance(obj, np.ndarray):
+        h = _new_hash()
+        h.update(repr(obj.shape).encode())
+        _update_with_array(h, obj.ravel())
+        return f"ndarray:{h.hexdigest()}"
+    if isinstance(obj, np.generic):
+        return repr(obj.item())
+
+    if id(obj) in seen:
+        return "<cycle>"
+    seen = seen | {id(obj)}
+
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        items = [_describe(item, seen) for item in obj]
+        if isinstance(obj, (set, frozenset)):
+            items.sort()
+        return f"{type(obj).__name__}[{','.join(items)}]"
+    if isinstance(obj, dict):
+        items = sorted(
+            f"{_describe(key, seen)}:{_describe(value, seen)}"
+            for key, value in obj.items()
+        )
+        return f"dict{{{','.join(items)}}}"
+
+    if isinstance(obj, type) or inspect.isroutine(obj):
+        return _describe_code(obj)
+
+    description = _describe_code(type(obj))
+    attributes = getattr(obj, "__dict__", None)
+    if attributes is None:
+        return f"{description}:{obj!r}"
+    return f"{description}:{_describe(attributes, seen)}"
+
+
+def _describe_code(obj: Any) -> str:
+    """Module, name and source (when available) of a class or function."""
+    try:
+        source = inspect.getsource(obj)
+    except (OSError, TypeError):
+        source = ""
+    name = getattr(obj, "__qualname__", repr(obj))
+    return f"{getattr(obj, '__module__', '')}.{name}:{hash_strings(source)}"
@@ -0,0 +1,206 @@
+"""
+HTTP sessions for downloads run on threads.
+
+Each process has one session per kind, shared by its threads so connections
+are reused. Requests are limited per host, in number in flight and in rate, and
+retried with exponential backoff on connection errors and on 429 and 5xx
+responses. The limits are read from the config when a session is created.
+"""
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+from urllib.parse import urlsplit
+
+import requests
+
+from ekeko.config import config
+
+try:
+    from curl_cffi import requests as curl_requests
+except ImportError:  # Only recent yfinance versions need it
+    curl_requests = None
+
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Transient errors, on which requests are retried. SSL errors are connection
+# errors too, but retrying them does not help
+RETRY_ERRORS: tuple = (
+    requests.ConnectionError,
+    requests.Timeout,
+    ConnectionError,
+    TimeoutError,
+)
+NO_RETRY_ERRORS: tuple = (requests.exceptions.SSLError,)
+if curl_requests is not None and hasattr(curl_requests, "exceptions"):
+    RETRY_ERRORS += (
+        curl_requests.exceptions.ConnectionError,
+        curl_requests.exceptions.Timeout,
+    )
+    NO_RETRY_ERRORS += (curl_requests.exceptions.SSLError,)
+
+
+class HostLimiter:
+    """
+    At most `max_concurrency` requests in flight to a host, started at `rate`
+    requests per second or less, with bursts of up to `burst` requests.
+    """
+
+    def __init__(
+        self, rate: float | None = None, burst: int = 1, max_concurrency: int = 16
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.__semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.__lock = threading.Lock()
+        self.__tokens = float(burst)
+        self.__updated = time.monotonic()
+
+    def __wait_for_token(self):
+        if self.rate is None:
+            return
+        with self.__lock:
+            now = time.monotonic()
+            elapsed = now - self.__updated
+            self.__tokens = min(self.burst, self.__tokens + elapsed * self.rate)
+            self.__updated = now
+            # Take the token now, and wait until it is there
+            self.__tokens -= 1
+            wait = -self.__tokens / self.rate if self.__tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+    @contextmanager
+    def acquire(self) -> Iterator[None]:
+        with self.__semaphore:
+            self.__wait_for_token()
+            yield
+
+
+class ThrottledSessionMixin:
+    """
+    Limits and retries the requests of a session, see `HostLimiter`. Mixed into
+    `requests` and `curl_cffi` sessions, which both send every request through
+    `request`.
+    """
+
+    def init_throttling(
+        self,
+        rate: float | None = None,
+        burst: int = 1,
+        max_concurrency: int = 16,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ):
+        """
+        Args:
+            rate: Requests per second to each host, unlimited if None.
+            burst: Requests to a host that may start at once, within the rate.
+            max_concurrency: Requests in flight to each host.
+            max_retries: Times a request is retried before its last response
+                is returned, or its error raised. Only connection errors and
+                timeouts are retried, other errors are raised at once.
+            backoff: Seconds before the first retry, doubled for each one, with
+                jitter. A Retry-After header in seconds takes precedence.
+            max_backoff: Longest wait before a retry.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.__limiters: Dict[str, HostLimiter] = {}
+        self.__limiters_lock = threading.Lock()
+
+    def get_limiter(self, host: str) -> HostLimiter:
+        with self.__limiters_lock:
+            if host not in self.__limiters:
+                self.__limiters[host] = HostLimiter(
+                    self.rate, self.burst, self.max_concurrency
+                )
+            return self.__limiters[host]
+
+    def __get_backoff(self, attempt: int, response=None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after is not None and retry_after.isdigit():
+                return min(float(retry_after), self.max_backoff)
+        backoff = min(self.backoff * 2**attempt, self.max_backoff)
+        return backoff * random.uniform(0.5, 1.0)
+
+    def request(self, method, url, *args, **kwargs):
+        limiter = self.get_limiter(urlsplit(url).netloc)
+        attempt = 0
+        while True:
+            try:
+                with limiter.acquire():
+                    response = super().request(method, url, *args, **kwargs)
+            except RETRY_ERRORS as error:
+                if isinstance(error, NO_RETRY_ERRORS) or attempt >= self.max_retries:
+                    raise
+                time.sleep(self.__get_backoff(attempt))
+            else:
+                if (
+                    response.status_code not in RETRY_STATUSES
+                    or attempt >= self.max_retries
+                ):
+                    return response
+                time.sleep(self.__get_backoff(attempt, response))
+            attempt += 1
+
+
+class ThrottledSession(ThrottledSessionMixin, requests.Session):
+    """A `requests` session with the limits and retries of `init_throttling`."""
+
+    def __init__(self, **limits):
+        super().__init__()
+        self.init_throttling(**limits)
+
+
+if curl_requests is not None:
+
+    class ThrottledCurlSession(ThrottledSessionMixin, curl_requests.Session):
+        """A `curl_cffi` session with the limits and retries of `init_throttling`."""
+
+        def __init__(self, **limits):
+            # Yahoo Finance blocks clients that do not look like a browser
+            super().__init__(impersonate="chrome")
+            self.init_throttling(**limits)
+
+
+def get_config_limits() -> dict:
+    return {
+        "rate": config.http_rate_limit,
+        "max_concurrency": config.http_max_concurrency,
+        "max_retries": config.http_max_retries,
+    }
+
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session() -> ThrottledSession:
+    """The `requests` session of this process."""
+    with _sessions_lock:
+        if "requests" not in _sessions:
+            _sessions["requests"] = ThrottledSession(**get_config_limits())
+        return _sessions["requests"]  # type: ignore
+
+
+def get_yfinance_session():
+    """
+    The session of this process for yfinance, a `curl_cffi` one when installed
+    as recent yfinance versions require.
+    """
+    if curl_requests is None:
+        return get_session()
+    with _sessions_lock:
+        if "yfinance" not in _sessions:
+            _sessions["yfinance"] = ThrottledCurlSession(**get_config_limits())
+        return _sessions["yfinance"]
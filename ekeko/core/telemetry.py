@@ -0,0 +1,250 @@
+"""
+Progress and throughput of long-running jobs: completed tasks and bars per
+second, ETA, utilization of each worker and peak RSS.
+
+Workers time the tasks they run and send a `WorkerStats` back with the results.
+The `Telemetry` of the job aggregates them and hands a `TelemetrySnapshot` to
+its callbacks and to a JSON status file every `interval` seconds.
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from tqdm.autonotebook import tqdm
+
+
+def get_worker_id() -> str:
+    """Id of the calling worker: its host, process and thread, unless the main one."""
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    thread = threading.current_thread()
+    if thread is not threading.main_thread():
+        worker_id += f"-{thread.name}"
+    return worker_id
+
+
+def get_peak_rss() -> int | None:
+    """Peak resident set size of this process in bytes, None where unknown."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+@dataclass
+class WorkerStats:
+    """What a worker measured while running a task."""
+
+    worker: str
+    # Wall and CPU seconds spent in the task
+    busy_time: float
+    cpu_time: float
+    n_bars: int = 0
+    peak_rss: int | None = None
+
+
+class TaskTimer:
+    """Measures a task run by the calling thread, see `WorkerStats`."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+
+    def stop(self, n_bars: int = 0) -> WorkerStats:
+        return WorkerStats(
+            get_worker_id(),
+            time.perf_counter() - self.start,
+            time.thread_time() - self.cpu_start,
+            n_bars,
+            get_peak_rss(),
+        )
+
+
+@dataclass
+class WorkerTelemetry:
+    n_tasks: int = 0
+    busy_time: float = 0.0
+    cpu_time: float = 0.0
+    # Share of the elapsed time the worker spent in tasks. Low values mean the
+    # pool is starved, e.g. waiting on the submitter or on I/O
+    utilization: float = 0.0
+    # CPU seconds per busy second. Well below 1 for CPU-bound tasks means more
+    # workers than cores
+    cpu_ratio: float = 0.0
+    peak_rss: int | None = None
+
+
+@dataclass
+class TelemetrySnapshot:
+    desc: str
+    completed: int
+    total: int
+    n_bars: int
+    elapsed: float
+    tasks_per_sec: float
+    bars_per_sec: float
+    # Seconds left at the current rate, None before the first completion
+    eta: float | None
+    # Peak RSS of the process running the job and of the largest worker
+    peak_rss: int | None
+    workers: Dict[str, WorkerTelemetry] = field(default_factory=dict)
+    done: bool = False
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+TelemetryCallback = Callable[[TelemetrySnapshot], None]
+
+
+class Telemetry:
+    """
+    Tracks the progress of a job, and reports it on a tqdm bar, to callbacks and
+    to a JSON status file.
+
+    Callbacks and the status file get a snapshot every `interval` seconds from a
+    background thread, also while no task completes, and a last one with `done`
+    set when the job ends. A `Telemetry` can track several jobs in a row, each
+    one is started with `start`.
+    """
+
+    def __init__(
+        self,
+        callbacks: List[TelemetryCallback] | None = None,
+        status_path: Path | str | None = None,
+        interval: float = 1.0,
+        progress_bar: bool = True,
+    ):
+        """
+        Args:
+            callbacks: Functions called with each snapshot.
+            status_path: File the snapshots are written to as JSON, replaced
+                atomically so it can be read at any time.
+            interval: Seconds between snapshots.
+            progress_bar: Whether to show a tqdm bar.
+        """
+        self.callbacks = callbacks if callbacks is not None else []
+        self.status_path = Path(status_path) if status_path is not None else None
+        self.interval = interval
+        self.progress_bar = progress_bar
+
+        self.desc = ""
+        self.total = 0
+        self.completed = 0
+        self.n_bars = 0
+        self.workers: Dict[str, WorkerTelemetry] = {}
+        self.__initial = 0
+        self.__started = time.perf_counter()
+        self.__progress: tqdm | None = None
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__reporter: threading.Thread | None = None
+
+    def start(self, total: int, desc: str = "", completed: int = 0) -> "Telemetry":
+        """
+        Start tracking a job of `total` tasks, `completed` of which were done
+        before, e.g. by a run that was resumed. These do not count in the rates.
+        """
+        self.close()
+        self.desc = desc
+        self.total = total
+        self.completed = completed
+        self.n_bars = 0
+        self.workers = {}
+        self.__initial = completed
+        self.__started = time.perf_counter()
+
+        if self.progress_bar:
+            self.__progress = tqdm(total=total, desc=desc or None, initial=completed)
+        if self.callbacks or self.status_path is not None:
+            self.__stopped = threading.Event()
+            self.__reporter = threading.Thread(target=self.__report, daemon=True)
+            self.__reporter.start()
+        return self
+
+    def update(
+        self, n_tasks: int = 1, n_bars: int = 0, stats: WorkerStats | None = None
+    ):
+        """Record `n_tasks` completed tasks, run by the worker of `stats` if given."""
+        with self.__lock:
+            self.completed += n_tasks
+            self.n_bars += n_bars
+            if stats is not None:
+                worker = self.workers.setdefault(stats.worker, WorkerTelemetry())
+                worker.n_tasks += n_tasks
+                worker.busy_time += stats.busy_time
+                worker.cpu_time += stats.cpu_time
+                if stats.peak_rss is not None:
+                    worker.peak_rss = max(worker.peak_rss or 0, stats.peak_rss)
+        if self.__progress is not None:
+            self.__progress.update(n_tasks)
+
+    def snapshot(self, done: bool = False) -> TelemetrySnapshot:
+        with self.__lock:
+            elapsed = time.perf_counter() - self.__started
+            n_tasks = self.completed - self.__initial
+            tasks_per_sec = n_tasks / elapsed if elapsed > 0 else 0.0
+            bars_per_sec = self.n_bars / elapsed if elapsed > 0 else 0.0
+            eta = None
+            if tasks_per_sec > 0:
+                eta = max(self.total - self.completed, 0) / tasks_per_sec
+
+            workers = {}
+            for worker_id, worker in self.workers.items():
+                workers[worker_id] = WorkerTelemetry(
+                    worker.n_tasks,
+                    worker.busy_time,
+                    worker.cpu_time,
+                    worker.busy_time / elapsed if elapsed > 0 else 0.0,
+                    worker.cpu_time / worker.busy_time if worker.busy_time > 0 else 0.0,
+                    worker.peak_rss,
+                )
+
+            peak_rss = [get_peak_rss()] + [w.peak_rss for w in workers.values()]
+            peak_rss = [rss for rss in peak_rss if rss is not None]
+
+            return TelemetrySnapshot(
+                self.desc,
+                self.completed,
+                self.total,
+                self.n_bars,
+                elapsed,
+                tasks_per_sec,
+                bars_per_sec,
+                eta,
+                max(peak_rss) if peak_rss else None,
+                workers,
+                done,
+            )
+
+    def close(self):
+        """End the current job, with a last snapshot to the callbacks and file."""
+        if self.__reporter is not None:
+            self.__stopped.set()
+            self.__reporter.join()
+            self.__reporter = None
+            self.__emit(self.snapshot(done=True))
+        if self.__progress is not None:
+            self.__progress.close()
+            self.__progress = None
+
+    def __report(self):
+        while not self.__stopped.wait(self.interval):
+            self.__emit(self.snapshot())
+
+    def __emit(self, snapshot: TelemetrySnapshot):
+        if self.status_path is not None:
+            tmp_path = self.status_path.with_name(f".{self.status_path.name}.tmp")
+            tmp_path.write_text(json.dumps(snapshot.to_dict(), indent=2))
+            os.replace(tmp_path, self.status_path)
+        for callback in self.callbacks:
+            callback(snapshot)
@@ -0,0 +1,108 @@
+"""
+A universe is a set of stock dfs saved to one frame file (see `frame_file`) and
+opened memory-mapped. Its frames are zero-copy views built on first access, so
+opening one takes milliseconds and every process of a host that opens the same
+file shares its pages: the universe costs RAM once, however many workers read
+it.
+"""
+
+from pathlib import Path
+from typing import Iterator, MutableMapping
+
+import pandas as pd
+
+from ekeko.core.frame_file import MappedFrames, write_frames
+from ekeko.core.types import Stock_dfs, Ticker
+
+
+class Universe(MutableMapping[Ticker, pd.DataFrame]):
+    """
+    Stock dfs mapped from a universe file, usable wherever stock dfs are.
+
+    Frames are read-only views into the file, built on first access and kept.
+    Setting or deleting a ticker only changes this mapping, which is then
+    `is_modified` and no longer stands for the file. An unmodified universe is
+    pickled as its path, so sending it to a worker of the same host (or of a host
+    sharing the file) copies nothing.
+    """
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self.mapped_frames = MappedFrames(self.path)
+        # Frames by ticker in file order, None until first accessed
+        self.__frames: dict[Ticker, pd.DataFrame | None] = dict.fromkeys(
+            self.mapped_frames.tickers
+        )
+        self.is_modified = False
+
+    def __getitem__(self, ticker: Ticker) -> pd.DataFrame:
+        frame = self.__frames[ticker]
+        if frame is None:
+            frame = self.mapped_frames[ticker]
+            self.__frames[ticker] = frame
+        return frame
+
+    def __setitem__(self, ticker: Ticker, frame: pd.DataFrame):
+        self.__frames[ticker] = frame
+        self.is_modified = True
+
+    def __delitem__(self, ticker: Ticker):
+        del self.__frames[ticker]
+        self.is_modified = True
+
+    def __iter__(self) -> Iterator[Ticker]:
+        return iter(self.__frames)
+
+    def __len__(self) -> int:
+        return len(self.__frames)
+
+    def __contains__(self, ticker) -> bool:
+        return ticker in self.__frames
+
+    def __repr__(self) -> str:
+        return f"Universe({str(self.path)!r}, {len(self)} tickers)"
+
+    def __reduce__(self):
+        if self.is_modified:
+            return dict, (list(self.items()),)
+        return Universe, (self.path,)
+
+    @property
+    def metadata(self) -> dict:
+        """Metadata the universe file was saved with."""
+        return self.mapped_frames.metadata
+
+    def load(self) -> Stock_dfs:
+        """In-memory copies of every frame, independent of the file."""
+        return {ticker: frame.copy() for ticker, frame in self.items()}
+
+
+def save_universe(path: Path | str, stock_dfs: Stock_dfs, metadata: dict | None = None):
+    """
+    Save the stock dfs as a universe file, replacing `path` atomically, with a
+    JSON serializable `metadata` dict.
+    """
+    write_frames(path, stock_dfs, metadata)
+
+
+def open_universe(path: Path | str) -> Universe:
+    return Universe(path)
+
+
+def get_universe_path(stock_dfs: Stock_dfs) -> Path | None:
+    """The file the stock dfs are mapped from, None if they are not all in one."""
+    if isinstance(stock_dfs, Universe) and not stock_dfs.is_modified:
+        return stock_dfs.path
+    return None
+
+
+def publish_universe(directory: Path, stock_dfs: Stock_dfs) -> Path:
+    """
+    A universe file with the stock dfs for workers to map: the one they are
+    mapped from already, or a new one written to `directory`.
+    """
+    path = get_universe_path(stock_dfs)
+    if path is None:
+        path = directory / "stock_dfs.ekf"
+        write_frames(path, stock_dfs)
+    return path
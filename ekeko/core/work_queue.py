@@ -0,0 +1,314 @@
+"""
+A work queue on a shared filesystem, and the workers that drain it.
+
+Layout of a queue directory:
+
+    jobs/<job>/function.pkl            the function every task of the job runs
+    jobs/<job>/tasks/<i>.<attempt>     pending tasks, the pickled items
+    jobs/<job>/claimed/<i>.<attempt>.<worker>
+                                       tasks being run by a worker
+    jobs/<job>/results/<i>.<attempt>   (ok, result or traceback) of finished tasks
+    workers/<worker>.json              heartbeat of each worker
+    data/                              files the tasks read, e.g. a universe
+
+Workers claim a task by renaming it into `claimed/`, which only one of them can
+do. The process that submitted the job collects the results, and requeues tasks
+that raised or whose worker stopped sending heartbeats, up to `max_retries`
+times. The directory can live on a filesystem shared by several hosts, with
+workers started on each of them by `ekeko worker <queue_dir>`.
+"""
+
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+try:
+    import cloudpickle
+except ImportError:  # Older joblib versions vendor it
+    from joblib.externals import cloudpickle  # type: ignore
+
+from ekeko.core.telemetry import get_peak_rss, get_worker_id
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp_path = path.with_name(f".{path.name}.tmp{os.getpid()}")
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+class WorkQueueExecutor:
+    """
+    Executor that submits tasks to a filesystem work queue at `queue_dir`.
+
+    Results are only collected while `map_unordered` is iterated. Functions and
+    items are pickled with cloudpickle, so the modules they refer to must be
+    importable on the workers.
+    """
+
+    remote = True
+
+    def __init__(
+        self,
+        queue_dir: Path | str,
+        max_retries: int = 2,
+        heartbeat_timeout: float = 30.0,
+        poll_interval: float = 0.1,
+    ):
+        """
+        Args:
+            queue_dir: Directory of the queue, shared with the workers.
+            max_retries: Times a task is requeued after it failed before giving up.
+            heartbeat_timeout: Seconds without heartbeat after which the tasks of a
+                worker are requeued.
+            poll_interval: Seconds between checks for results.
+        """
+        self.queue_dir = Path(queue_dir)
+        self.max_retries = max_retries
+        self.heartbeat_timeout = heartbeat_timeout
+        self.poll_interval = poll_interval
+        for name in ("jobs", "workers", "data"):
+            (self.queue_dir / name).mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def shared_dir(self) -> Iterator[Path]:
+        path = self.queue_dir / "data" / uuid.uuid4().hex
+        path.mkdir()
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def get_workers(self) -> Dict[str, dict]:
+        """Heartbeats of the workers, by worker id."""
+        workers = {}
+        for path in (self.queue_dir / "workers").glob("*.json"):
+            try:
+                workers[path.stem] = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+        return workers
+
+    def map_unordered(self, fn: Callable, items: Iterable) -> Iterator[Any]:
+        job_dir = self.queue_dir / "jobs" / uuid.uuid4().hex
+        for name in ("tasks", "claimed", "results"):
+            (job_dir / name).mkdir(parents=True)
+
+        try:
+            payloads: List[bytes] = []
+            for i, item in enumerate(items):
+                payloads.append(cloudpickle.dumps(item))
+                _write_atomic(job_dir / "tasks" / f"{i}.0", payloads[i])
+            # Workers only pick up tasks once the function is there
+            _write_atomic(job_dir / "function.pkl", cloudpickle.dumps(fn))
+
+            yield from self.__collect(job_dir, payloads)
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    def __collect(self, job_dir: Path, payloads: List[bytes]) -> Iterator[Any]:
+        attempts = [0] * len(payloads)
+        pending = set(range(len(payloads)))
+
+        def requeue(i: int, reason: str):
+            attempts[i] += 1
+            if attempts[i] > self.max_retries:
+                raise RuntimeError(f"Task {i} failed {attempts[i]} times: {reason}")
+            _write_atomic(job_dir / "tasks" / f"{i}.{attempts[i]}", payloads[i])
+
+        while pending:
+            results = [
+                path
+                for path in sorted((job_dir / "results").iterdir())
+                if not path.name.startswith(".")
+            ]
+            for path in results:
+                i, attempt = (int(part) for part in path.name.split("."))
+                ok, value = cloudpickle.loads(path.read_bytes())
+                path.unlink()
+                # Results of attempts that were given up on come too late
+                if i not in pending or attempt != attempts[i]:
+                    continue
+                if ok:
+                    pending.discard(i)
+                    yield value
+                else:
+                    requeue(i, value)
+
+            self.__requeue_lost_tasks(job_dir, requeue)
+            if len(results) == 0:
+                time.sleep(self.poll_interval)
+
+    def __requeue_lost_tasks(self, job_dir: Path, requeue: Callable[[int, str], None]):
+        workers = self.get_workers()
+        now = time.time()
+        for path in (job_dir / "claimed").iterdir():
+            i, attempt, worker_id = path.name.split(".", 2)
+            heartbeat = workers.get(worker_id)
+            last_beat = heartbeat["time"] if heartbeat is not None else 0.0
+            if now - last_beat < self.heartbeat_timeout:
+                continue
+            # The claim may have just been released along with a result
+            if (job_dir / "results" / f"{i}.{attempt}").exists():
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            requeue(int(i), f"worker {worker_id} stopped sending heartbeats")
+
+
+class Worker:
+    """
+    Runs the tasks of a work queue until it is idle for `idle_timeout` seconds
+    (forever by default) or ran `max_tasks` tasks.
+    """
+
+    def __init__(
+        self,
+        queue_dir: Path | str,
+        poll_interval: float = 0.1,
+        heartbeat_interval: float = 5.0,
+        idle_timeout: float | None = None,
+        max_tasks: int | None = None,
+    ):
+        self.queue_dir = Path(queue_dir)
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.max_tasks = max_tasks
+
+        self.worker_id = get_worker_id()
+        self.heartbeat_path = self.queue_dir / "workers" / f"{self.worker_id}.json"
+        self.started = time.time()
+        self.n_tasks = 0
+        self.busy_time = 0.0
+        self.__functions: Dict[str, Callable] = {}
+        self.__stopped = threading.Event()
+
+    def run(self):
+        (self.queue_dir / "workers").mkdir(parents=True, exist_ok=True)
+        self.__beat()
+        heartbeat = threading.Thread(target=self.__send_heartbeats, daemon=True)
+        heartbeat.start()
+
+        try:
+            last_task = time.time()
+            while self.max_tasks is None or self.n_tasks < self.max_tasks:
+                if self.__run_next_task():
+                    last_task = time.time()
+                    continue
+                if (
+                    self.idle_timeout is not None
+                    and time.time() - last_task > self.idle_timeout
+                ):
+                    break
+                time.sleep(self.poll_interval)
+        finally:
+            self.__stopped.set()
+            heartbeat.join()
+            self.heartbeat_path.unlink(missing_ok=True)
+
+    def __beat(self):
+        heartbeat = {
+            "time": time.time(),
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "started": self.started,
+            "n_tasks": self.n_tasks,
+            "busy_time": self.busy_time,
+            "peak_rss": get_peak_rss(),
+        }
+        _write_atomic(self.heartbeat_path, json.dumps(heartbeat).encode())
+
+    def __send_heartbeats(self):
+        while not self.__stopped.wait(self.heartbeat_interval):
+            self.__beat()
+
+    def __claim(self) -> Path | None:
+        for job_dir in sorted((self.queue_dir / "jobs").iterdir()):
+            if not (job_dir / "function.pkl").exists():
+                continue
+            try:
+                tasks = sorted((job_dir / "tasks").iterdir())
+            except FileNotFoundError:
+                continue
+            for path in tasks:
+                if path.name.startswith("."):
+                    continue
+                claimed = job_dir / "claimed" / f"{path.name}.{self.worker_id}"
+                try:
+                    os.rename(path, claimed)
+                except FileNotFoundError:
+                    # Another worker was faster, or the job is gone
+                    continue
+                return claimed
+        return None
+
+    def __get_function(self, job_dir: Path) -> Callable:
+        job = job_dir.name
+        if job not in self.__functions:
+            # Only the function of the current job is kept
+            self.__functions.clear()
+            self.__functions[job] = cloudpickle.loads(
+                (job_dir / "function.pkl").read_bytes()
+            )
+        return self.__functions[job]
+
+    def __run_next_task(self) -> bool:
+        claimed = self.__claim()
+        if claimed is None:
+            return False
+
+        job_dir = claimed.parent.parent
+        task_name = claimed.name[: -len(self.worker_id) - 1]
+
+        start = time.perf_counter()
+        try:
+            fn = self.__get_function(job_dir)
+            item = cloudpickle.loads(claimed.read_bytes())
+        except FileNotFoundError:
+            # The job was cancelled or the task requeued in the meantime
+            return True
+        except Exception:
+            result = (False, traceback.format_exc())
+        else:
+            try:
+                result = (True, fn(item))
+            except Exception:
+                result = (False, traceback.format_exc())
+        self.busy_time += time.perf_counter() - start
+        self.n_tasks += 1
+
+        try:
+            _write_atomic(job_dir / "results" / task_name, cloudpickle.dumps(result))
+            claimed.unlink(missing_ok=True)
+        except FileNotFoundError:
+            pass
+        return True
+
+
+def run_worker(queue_dir: Path | str, **kwargs):
+    """Run a `Worker` on the queue at `queue_dir`, see `Worker` for the options."""
+    Worker(queue_dir, **kwargs).run()
+
+
+def spawn_local_workers(
+    queue_dir: Path | str, n_workers: int, *args: str
+) -> List[subprocess.Popen]:
+    """
+    Start `n_workers` worker processes on this host, with extra `ekeko worker`
+    command line arguments `args`. The caller terminates them.
+    """
+    command = [sys.executable, "-m", "ekeko.cli", "worker", str(queue_dir), *args]
+    return [subprocess.Popen(command) for _ in range(n_workers)]
@@ -1,9 +1,20 @@
-from typing import Protocol
+import re
+import time
+from pathlib import Path
+from typing import Callable, Protocol
 
-from ekeko.core.types import Ticker
+from ekeko.core.frame_file import MappedFrames, write_frames
+from ekeko.core.http import get_yfinance_session
+from ekeko.core.types import Date, Ticker
+import numpy as np
 import pandas as pd
 import yfinance as yf
 
+try:
+    from pyarrow import csv as pa_csv
+except ImportError:  # Optional, pandas parses CSV files without it
+    pa_csv = None
+
 from datetime import timedelta
 
 
@@ -14,35 +25,247 @@ class DataLoader(Protocol):
     def process(self, stock_df: pd.DataFrame) -> pd.DataFrame: ...
 
 
+# Bars of a ticker from `start` on (inclusive), or all of them if `start` is None
+FetchFn = Callable[[Ticker, Date | None], pd.DataFrame]
+
+
+def fetch_yfinance_history(ticker: Ticker, start: Date | None = None) -> pd.DataFrame:
+    stock = yf.Ticker(ticker, session=get_yfinance_session())
+    if start is None:
+        return stock.history(period="max")
+    return stock.history(start=start)
+
+
+def select_period(
+    ticker: Ticker, stock_df: pd.DataFrame, period: str | None
+) -> pd.DataFrame | None:
+    """
+    The last `period` (e.g. "2y", the whole df if None) of the stock df, or None
+    if it is empty or has nan values.
+    """
+    if stock_df.empty:
+        return None
+
+    has_nan = stock_df.isna().any().any()  # type: ignore
+    if has_nan:
+        print(f"{ticker} has df, but with nan values.")
+        return None
+
+    if period is None:
+        return stock_df
+
+    # Calculate the cutoff date based on the period
+    recent_date = stock_df.index[-1]
+    cutoff_date = recent_date - timedelta(days=int(period[:-1]) * 365)
+
+    # Filter the DataFrame to keep rows from the cutoff date onward
+    filtered_df = stock_df[stock_df.index >= cutoff_date]
+
+    if isinstance(filtered_df, pd.DataFrame):
+        return filtered_df
+
+    return None
+
+
 class YfinanceDataLoader:
 
     def __init__(self, period: str):
         self.period = period
 
     def load(self, ticker: Ticker) -> pd.DataFrame | None:
-        stock = yf.Ticker(ticker)
+        stock = yf.Ticker(ticker, session=get_yfinance_session())
 
         stock_df = stock.history(period="max")
 
-        if stock_df.empty:
-            return None
+        return select_period(ticker, stock_df, self.period)
+
+    def process(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        return stock_df
+
+
+class CachedYfinanceDataLoader:
+    """
+    Yahoo Finance loader that keeps the history of each ticker in a frame file
+    under `cache_dir`, and only downloads the bars after the last cached one.
+
+    The download starts at the second to last cached bar: the last one may have
+    been a partial day and is replaced. If the prices of the one before changed,
+    the history was adjusted for a split or a dividend since it was cached, and
+    the whole history is downloaded again.
+    """
+
+    def __init__(
+        self,
+        period: str,
+        cache_dir: Path | str,
+        max_age: timedelta = timedelta(hours=12),
+        fetch_fn: FetchFn = fetch_yfinance_history,
+    ):
+        """
+        Args:
+            period: Period served from the history, e.g. "2y".
+            cache_dir: Directory of the cached histories, created if needed.
+            max_age: Histories refreshed more recently than this are served from
+                disk without downloading anything.
+            fetch_fn: Downloads the bars of a ticker, from a start date or all of
+                them. Yahoo Finance by default.
+        """
+        self.period = period
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age
+        self.fetch_fn = fetch_fn
 
-        has_nan = stock_df.isna().any().any()  # type: ignore
-        if has_nan:
-            print(f"{ticker} has df, but with nan values.")
+    def get_path(self, ticker: Ticker) -> Path:
+        return self.cache_dir / f"{ticker.replace('/', '_')}.ekf"
+
+    def read_cached(self, ticker: Ticker) -> pd.DataFrame | None:
+        """The cached history of the ticker, None if there is none."""
+        path = self.get_path(ticker)
+        if not path.exists():
             return None
+        return MappedFrames(path)[ticker].copy()
+
+    def load_history(self, ticker: Ticker) -> pd.DataFrame:
+        """The whole history of the ticker, refreshed unless it is recent enough."""
+        path = self.get_path(ticker)
+        cached = self.read_cached(ticker)
+        if cached is not None and len(cached) != 0:
+            age = time.time() - path.stat().st_mtime
+            if age < self.max_age.total_seconds():
+                return cached
+
+            # The last complete bar is downloaded again, to check it is unchanged
+            anchor_date = cached.index[max(len(cached) - 2, 0)]
+            new_rows = self.fetch_fn(ticker, anchor_date)
+            anchor = new_rows.loc[new_rows.index == anchor_date]
+            if len(anchor) != 0 and self.__is_unchanged(cached, anchor):
+                old_rows = cached[cached.index < anchor_date]
+                new_rows = new_rows[new_rows.index >= anchor_date]
+                stock_df = pd.concat([old_rows, new_rows])
+                write_frames(path, {ticker: stock_df})
+                return stock_df
+
+        stock_df = self.fetch_fn(ticker, None)
+        if len(stock_df) != 0:
+            write_frames(path, {ticker: stock_df})
+        return stock_df
+
+    @staticmethod
+    def __is_unchanged(cached: pd.DataFrame, anchor: pd.DataFrame) -> bool:
+        if not anchor.columns.equals(cached.columns):
+            return False
+        cached_row = cached.loc[anchor.index[0]].to_numpy(dtype=float)
+        return bool(np.allclose(anchor.iloc[0].to_numpy(dtype=float), cached_row))
+
+    def load(self, ticker: Ticker) -> pd.DataFrame | None:
+        return select_period(ticker, self.load_history(ticker), self.period)
+
+    def process(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        return stock_df
+
+
+OHLCV = ["Open", "High", "Low", "Close", "Volume"]
+_UTC_OFFSET = re.compile(r"(Z|[+-]\d\d:?\d\d)$")
 
-        # Calculate the cutoff date based on the period
-        recent_date = stock_df.index[-1]
-        cutoff_date = recent_date - timedelta(days=int(self.period[:-1]) * 365)
 
-        # Filter the DataFrame to keep rows from the cutoff date onward
-        filtered_df = stock_df[stock_df.index >= cutoff_date]
+class LocalFileDataLoader:
+    """
+    Loads stock dfs from a directory of per-ticker files, `<ticker>.parquet` or
+    `<ticker>.csv`, with a date column and one column per field.
 
-        if isinstance(filtered_df, pd.DataFrame):
-            return filtered_df
+    Only `columns` are read, and dates are parsed once into the index, in UTC if
+    they have UTC offsets. CSV files are read with pyarrow's multithreaded reader
+    when it is installed, and Parquet files need pyarrow (or fastparquet). Reads
+    release the GIL, so a thread pool loads many tickers at once, see
+    `LocalDataset`.
+    """
 
+    extensions = (".parquet", ".csv")
+
+    def __init__(
+        self,
+        directory: Path | str,
+        period: str | None = None,
+        columns: list[str] | None = None,
+        date_column: str = "Date",
+    ):
+        """
+        Args:
+            directory: Directory of the files.
+            period: Period kept from the end of each file, e.g. "2y", everything
+                by default.
+            columns: Columns to read, the OHLCV ones by default.
+            date_column: Column with the dates, if the file has no date index.
+        """
+        self.directory = Path(directory)
+        self.period = period
+        self.columns = columns if columns is not None else OHLCV
+        self.date_column = date_column
+
+    def get_path(self, ticker: Ticker) -> Path | None:
+        for extension in self.extensions:
+            path = self.directory / f"{ticker.replace('/', '_')}{extension}"
+            if path.exists():
+                return path
         return None
 
+    def get_tickers(self) -> list[Ticker]:
+        """Tickers with a file in the directory, sorted."""
+        return sorted(
+            {
+                path.stem
+                for path in self.directory.iterdir()
+                if path.suffix in self.extensions
+            }
+        )
+
+    def __read_csv(self, path: Path) -> pd.DataFrame:
+        columns = [self.date_column, *self.columns]
+        if pa_csv is not None:
+            # Dates are read as strings, to be parsed once below
+            convert_options = pa_csv.ConvertOptions(
+                include_columns=columns,
+                column_types={self.date_column: "string"},
+            )
+            table = pa_csv.read_csv(path, convert_options=convert_options)
+            return table.to_pandas()
+        return pd.read_csv(path, usecols=columns, dtype={self.date_column: str})
+
+    def __read_parquet(self, path: Path) -> pd.DataFrame:
+        try:
+            return pd.read_parquet(path, columns=[self.date_column, *self.columns])
+        except (KeyError, ValueError):
+            # The dates are the index of the frame that was written
+            return pd.read_parquet(path, columns=self.columns)
+
+    def __set_index(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        if self.date_column in stock_df.columns:
+            dates = stock_df.pop(self.date_column)
+            if pd.api.types.is_datetime64_any_dtype(dates):
+                # Parquet files keep the dates typed
+                index = pd.DatetimeIndex(dates)
+            else:
+                # Dates with UTC offsets, which change with daylight saving time,
+                # are parsed to UTC
+                has_offset = len(dates) != 0 and _UTC_OFFSET.search(dates.iloc[0])
+                index = pd.to_datetime(dates, format="ISO8601", utc=bool(has_offset))
+            stock_df.index = pd.DatetimeIndex(index, name=self.date_column)
+        if not stock_df.index.is_monotonic_increasing:
+            stock_df = stock_df.sort_index()
+        return stock_df[self.columns]
+
+    def load(self, ticker: Ticker) -> pd.DataFrame | None:
+        path = self.get_path(ticker)
+        if path is None:
+            return None
+
+        if path.suffix == ".parquet":
+            stock_df = self.__read_parquet(path)
+        else:
+            stock_df = self.__read_csv(path)
+
+        return select_period(ticker, self.__set_index(stock_df), self.period)
+
     def process(self, stock_df: pd.DataFrame) -> pd.DataFrame:
         return stock_df
@@ -1,15 +1,25 @@
 from pathlib import Path
 from tqdm.autonotebook import tqdm
-from joblib import Parallel, delayed
-from ekeko.config import config
 
-from ekeko.backtrader.screener import TickerScreener
+from ekeko.backtrader.screener import TickerScreener, TrivialScreener
+from ekeko.core.executor import Executor, JoblibExecutor, get_io_executor
+from ekeko.core.hashing import hash_object, hash_params, hash_strings
 from ekeko.core.types import Stock_dfs, Ticker
-from ekeko.data_loader.data_loader import DataLoader, YfinanceDataLoader
+from ekeko.core.universe import open_universe, save_universe
+from ekeko.data_loader.data_loader import (
+    CachedYfinanceDataLoader,
+    DataLoader,
+    LocalFileDataLoader,
+    YfinanceDataLoader,
+)
 from ekeko.data_loader.logger import Logger
 from ekeko.data_loader.ticker_processor import TickerProcessor
 
 
+# Metadata key of the fingerprint of the dataset that saved a universe file
+DATASET_FINGERPRINT = "dataset_fingerprint"
+
+
 class Dataset:
     def __init__(
         self,
@@ -17,6 +27,8 @@ class Dataset:
         ticker_sceener: TickerScreener,
         data_loader: DataLoader,
     ):
+        self.tickers = tickers
+        self.ticker_screener = ticker_sceener
         self.data_loader = data_loader
         self.ticker_processor = TickerProcessor(tickers, ticker_sceener)
         self.logger = Logger(len(tickers))
@@ -24,6 +36,14 @@ class Dataset:
     def set_cached_tickers(self, path: Path):
         self.ticker_processor.set_cached(path)
 
+    def get_fingerprint(self) -> str:
+        """Hash of the tickers, the screen and the data loader settings."""
+        return hash_strings(
+            hash_params(self.tickers),
+            self.ticker_screener.info(),
+            hash_object(self.data_loader),
+        )
+
     def _process_ticker(self, ticker):
         stock_df = self.data_loader.load(ticker)
         if stock_df is not None:
@@ -32,19 +52,40 @@ class Dataset:
         else:
             return ticker, None
 
-    def load(self) -> Stock_dfs:
-        tickers = self.ticker_processor.load()
-        self.logger.update_tickers_that_passed_screen(len(tickers))
+    def load(
+        self, executor: Executor | None = None, universe_path: Path | str | None = None
+    ) -> Stock_dfs:
+        """
+        Load the stock dfs of the tickers that pass the screen.
 
-        stock_dfs = dict()
+        Args:
+            executor: Runs the screen and the loads, a joblib pool of
+                `config.num_processors` processes by default.
+            universe_path: If given, the stock dfs are saved there as a universe
+                file, and returned as a `Universe` mapped from it. If the file
+                exists already and was saved by a dataset with the same
+                fingerprint, it is opened without loading anything.
+        """
+        fingerprint = self.get_fingerprint()
+        if universe_path is not None and Path(universe_path).exists():
+            universe = open_universe(universe_path)
+            if universe.metadata.get(DATASET_FINGERPRINT) == fingerprint:
+                print("Loading stock dfs from universe file")
+                return universe
+            print("Universe file was saved by another dataset, loading stock dfs")
 
-        # Parallel processing with joblib
-        results = Parallel(n_jobs=config.num_processors)(
-            delayed(self._process_ticker)(ticker)
-            for ticker in tqdm(tickers, desc="Loading dfs")
-        )
+        tickers = self.ticker_processor.load(executor)
+        self.logger.update_tickers_that_passed_screen(len(tickers))
+
+        if executor is None:
+            executor = JoblibExecutor()
+        results = executor.map_unordered(self._process_ticker, tickers)
+        loaded = dict(tqdm(results, total=len(tickers), desc="Loading dfs"))
 
-        for ticker, df in results:
+        # Keep the order of the tickers
+        stock_dfs = dict()
+        for ticker in tickers:
+            df = loaded[ticker]
             if df is not None:
                 stock_dfs[ticker] = df
             else:
@@ -52,6 +93,11 @@ class Dataset:
 
         self.logger.print()
 
+        if universe_path is not None:
+            metadata = {DATASET_FINGERPRINT: fingerprint}
+            save_universe(universe_path, stock_dfs, metadata)
+            return open_universe(universe_path)
+
         return stock_dfs
 
 
@@ -61,14 +107,80 @@ class YfDataset:
         tickers: list[Ticker],
         ticker_screener: TickerScreener,
         period: str | list[str],
+        cache_dir: Path | str | None = None,
     ):
+        """
+        Args:
+            tickers: Tickers to screen and load.
+            ticker_screener: Screen the tickers must pass.
+            period: Period of the stock dfs, e.g. "2y".
+            cache_dir: If given, the histories are kept there and only new bars
+                are downloaded, see `CachedYfinanceDataLoader`.
+        """
         self.tickers = tickers
         self.ticker_screener = ticker_screener
-        self.data_loader = YfinanceDataLoader(period)
+        self.data_loader: DataLoader
+        if cache_dir is not None:
+            self.data_loader = CachedYfinanceDataLoader(period, cache_dir)
+        else:
+            self.data_loader = YfinanceDataLoader(period)
+        self.dataset = Dataset(self.tickers, self.ticker_screener, self.data_loader)
+
+    def set_cached_tickers(self, path: Path):
+        self.dataset.set_cached_tickers(path)
+
+    def load(
+        self, executor: Executor | None = None, universe_path: Path | str | None = None
+    ) -> Stock_dfs:
+        """
+        Screen and load the tickers, see `Dataset.load`. Downloads run on the
+        threads of `get_io_executor` by default.
+        """
+        if executor is None:
+            executor = get_io_executor()
+        return self.dataset.load(executor, universe_path)
+
+
+class LocalDataset:
+    """
+    Dataset of per-ticker CSV or Parquet files in a directory, loaded by a pool
+    of `config.num_io_threads` threads. See `LocalFileDataLoader`.
+    """
+
+    def __init__(
+        self,
+        directory: Path | str,
+        tickers: list[Ticker] | None = None,
+        ticker_screener: TickerScreener | None = None,
+        period: str | None = None,
+        columns: list[str] | None = None,
+        date_column: str = "Date",
+    ):
+        """
+        Args:
+            directory: Directory of the files.
+            tickers: Tickers to load, every file of the directory by default.
+            ticker_screener: Screen the tickers must pass, none by default.
+            period: Period kept from the end of each file, e.g. "2y", everything
+                by default.
+            columns: Columns to read, the OHLCV ones by default.
+            date_column: Column with the dates, if the files have no date index.
+        """
+        self.data_loader = LocalFileDataLoader(directory, period, columns, date_column)
+        if tickers is None:
+            tickers = self.data_loader.get_tickers()
+        self.tickers = tickers
+        self.ticker_screener = (
+            ticker_screener if ticker_screener is not None else TrivialScreener()
+        )
         self.dataset = Dataset(self.tickers, self.ticker_screener, self.data_loader)
 
     def set_cached_tickers(self, path: Path):
         self.dataset.set_cached_tickers(path)
 
-    def load(self) -> Stock_dfs:
-        return self.dataset.load()
+    def load(
+        self, executor: Executor | None = None, universe_path: Path | str | None = None
+    ) -> Stock_dfs:
+        if executor is None:
+            executor = get_io_executor()
+        return self.dataset.load(executor, universe_path)
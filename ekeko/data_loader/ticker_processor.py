@@ -1,10 +1,9 @@
 from pathlib import Path
 from tqdm.autonotebook import tqdm
-from joblib import Parallel, delayed
 import os
 
-from ekeko.backtrader.screener import TickerScreener
-from ekeko.config import config
+from ekeko.backtrader.screener import TickerScreener, TrivialScreener
+from ekeko.core.executor import Executor, JoblibExecutor
 from ekeko.core.types import Ticker
 
 
@@ -16,18 +15,20 @@ class TickerProcessor:
 
     def _screen_ticker(self, ticker: Ticker):
         """Checks if a ticker passes the screening criteria."""
-        return ticker if self.ticker_screener.passes_screen(ticker) else None
+        return ticker, self.ticker_screener.passes_screen(ticker)
 
-    def __load(self) -> list[Ticker]:
-        """Screen tickers using joblib for parallel processing."""
-        # Use joblib's Parallel for processing tickers in parallel
-        results = Parallel(n_jobs=config.num_processors)(
-            delayed(self._screen_ticker)(ticker)
-            for ticker in tqdm(self.tickers, desc="Applying screener")
-        )
+    def __load(self, executor: Executor | None) -> list[Ticker]:
+        """Screen tickers in parallel on the executor, a joblib pool by default."""
+        if isinstance(self.ticker_screener, TrivialScreener):
+            return list(self.tickers)
 
-        # Filter out None values
-        screened_tickers = [ticker for ticker in results if ticker is not None]
+        if executor is None:
+            executor = JoblibExecutor()
+        results = executor.map_unordered(self._screen_ticker, self.tickers)
+        passed = dict(tqdm(results, total=len(self.tickers), desc="Applying screener"))
+
+        # Keep the order of the tickers
+        screened_tickers = [ticker for ticker in self.tickers if passed[ticker]]
 
         return screened_tickers
 
@@ -37,14 +38,14 @@ class TickerProcessor:
             for ticker in tickers:
                 file.write(ticker + "\n")
 
-    def __load_from_cache(self, path: Path) -> list[Ticker]:
+    def __load_from_cache(self, path: Path, executor: Executor | None) -> list[Ticker]:
         """Load tickers from cache or screen and cache them if not available."""
         if os.path.exists(path):
             print("Loading ticker data from cache")
             with open(path, "r") as file:
                 screened_tickers = [line.strip() for line in file]
         else:
-            screened_tickers = self.__load()
+            screened_tickers = self.__load(executor)
             self.__write(screened_tickers, path)
 
         return screened_tickers
@@ -54,11 +55,11 @@ class TickerProcessor:
         tickers_info = f"num_tickers_{len(self.tickers)}_"
         self.path = path / Path(tickers_info + self.ticker_screener.info() + ".txt")
 
-    def load(self) -> list[Ticker]:
+    def load(self, executor: Executor | None = None) -> list[Ticker]:
         """Load tickers, using cache if available."""
         if self.path:
-            tickers = self.__load_from_cache(self.path)
+            tickers = self.__load_from_cache(self.path, executor)
         else:
-            tickers = self.__load()
+            tickers = self.__load(executor)
 
         return tickers
@@ -144,9 +144,17 @@ if __name__ == "__main__":
     marketCapMax = int(20*1e9)
     volumeMin = int(5*1e5)
     minTimeSinceFirstTrade = 12
-    screener = YfinanceTickerSceener(marketCapMin, marketCapMax, volumeMin, minTimeSinceFirstTrade)
-
-    dataset = YfDataset(tickers, screener, period="2y")
+    screener = YfinanceTickerSceener(
+        marketCapMin,
+        marketCapMax,
+        volumeMin,
+        minTimeSinceFirstTrade,
+        cache=Path("./examples/cached/fundamentals.sqlite"),
+    )
+
+    dataset = YfDataset(
+        tickers, screener, period="2y", cache_dir=Path("./examples/cached/ohlcv/")
+    )
     dataset.set_cached_tickers(Path("./examples/cached/"))
     stock_dfs = dataset.load()
 
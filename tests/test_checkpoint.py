@@ -0,0 +1,123 @@
+from ekeko.backtrader import engine as engine_module
+from ekeko.backtrader.broker import BrokerBuilder
+from ekeko.backtrader.engine import Engine
+from ekeko.backtrader.vectorized import FixedQuantity, MarketTrader
+from ekeko.core.hashing import hash_frame
+from ekeko.core.signal_type import ENTRY, EXIT
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+class Strategy:
+
+    def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        signal = pd.DataFrame(index=stock_df.index)
+
+        signal["SMA"] = stock_df["Close"].rolling(3).mean()
+        signal[ENTRY] = stock_df["Close"] > signal["SMA"]
+        signal[EXIT] = stock_df["Close"] < signal["SMA"]
+
+        return signal
+
+
+class Interrupted(Exception):
+    pass
+
+
+class InterruptedTrader(MarketTrader):
+
+    def __init__(self, interrupt_at: pd.Timestamp):
+        super().__init__(FixedQuantity(1))
+        self.interrupt_at = interrupt_at
+
+    def trade(self, account, date, ticker, signal, stock_row, open_positions):
+        if date >= self.interrupt_at:
+            raise Interrupted()
+        return super().trade(account, date, ticker, signal, stock_row, open_positions)
+
+
+def get_stock_dfs() -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(11)
+    index = pd.date_range(start="2023-01-01", periods=60, freq="D")
+
+    stock_dfs = {}
+    for ticker in ["Aurora", "Baltigo", "Cyclops"]:
+        close = 20 + np.cumsum(rng.normal(0, 1, len(index)))
+        stock_dfs[ticker] = pd.DataFrame({"Close": close}, index=index)
+
+    # Ends earlier, so its positions get closed ahead of its last record
+    stock_dfs["Cyclops"] = stock_dfs["Cyclops"].iloc[:45]
+
+    return stock_dfs
+
+
+def test_resume_gives_the_report_of_an_uninterrupted_run(tmp_path):
+    stock_dfs = get_stock_dfs()
+    broker_builder = BrokerBuilder(100, 0.01, stock_dfs)
+    path = tmp_path / "engine.ckpt"
+
+    report = Engine(MarketTrader(FixedQuantity(1)), Strategy(), broker_builder).run()
+
+    interrupt_at = stock_dfs["Aurora"].index[40]
+    engine = Engine(InterruptedTrader(interrupt_at), Strategy(), broker_builder)
+    with pytest.raises(Interrupted):
+        engine.run(checkpoint_path=path, checkpoint_every=7)
+
+    trader = MarketTrader(FixedQuantity(1))
+    engine = Engine.resume(path, trader, Strategy(), broker_builder)
+    assert 0 < engine.date_idx <= 40
+    assert engine.broker.account.has_positions()
+    resumed_report = engine.run()
+
+    assert len(report.trades) > 0
+    pd.testing.assert_frame_equal(resumed_report.transactions, report.transactions)
+    pd.testing.assert_frame_equal(resumed_report.trades, report.trades)
+    pd.testing.assert_frame_equal(resumed_report.portfolio, report.portfolio)
+
+
+def test_resume_rejects_other_stock_dfs(tmp_path):
+    stock_dfs = get_stock_dfs()
+    path = tmp_path / "engine.ckpt"
+
+    trader = MarketTrader(FixedQuantity(1))
+
+    engine = Engine(trader, Strategy(), BrokerBuilder(100, 0.01, stock_dfs))
+    engine.checkpoint(path)
+
+    stock_dfs["Aurora"] = stock_dfs["Aurora"] * 2
+    with pytest.raises(ValueError):
+        Engine.resume(path, trader, Strategy(), BrokerBuilder(100, 0.01, stock_dfs))
+
+
+def test_checkpoint_after_appended_bars(tmp_path, monkeypatch):
+    stock_dfs = get_stock_dfs()
+    history = {ticker: stock_df.iloc[:30] for ticker, stock_df in stock_dfs.items()}
+    new_bars = {ticker: stock_df.iloc[30:] for ticker, stock_df in stock_dfs.items()}
+    path = tmp_path / "engine.ckpt"
+
+    trader = MarketTrader(FixedQuantity(1))
+    engine = Engine(trader, Strategy(), BrokerBuilder(100, 0.01, history))
+    engine.checkpoint(path)
+
+    # Only the frames that changed are hashed again
+    hashed = []
+    monkeypatch.setattr(
+        engine_module, "hash_frame", lambda df: hashed.append(df) or hash_frame(df)
+    )
+    engine.append_bars({"Aurora": new_bars["Aurora"]})
+    engine.checkpoint(path)
+    assert len(hashed) == 1
+    monkeypatch.undo()
+
+    # The stock dfs of the builder were extended in place
+    appended = dict(history)
+    resumed = Engine.resume(
+        path, trader, Strategy(), BrokerBuilder(100, 0.01, appended)
+    )
+    assert resumed.date_idx == engine.date_idx
+
+    stale = {ticker: stock_df.iloc[:30] for ticker, stock_df in stock_dfs.items()}
+    with pytest.raises(ValueError):
+        Engine.resume(path, trader, Strategy(), BrokerBuilder(100, 0.01, stale))
@@ -0,0 +1,143 @@
+from ekeko.data_loader.data_loader import CachedYfinanceDataLoader
+from ekeko.data_loader.data_set import LocalDataset
+
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+class FakeHistory:
+    """Stand-in for the download, serving the first `n_days` bars of a history."""
+
+    def __init__(self):
+        index = pd.date_range(
+            "2020-01-01", periods=1000, freq="D", tz="America/New_York"
+        )
+        close = 10 + np.arange(len(index)) * 0.01
+        self.history = pd.DataFrame(
+            {"Close": close, "Volume": np.arange(len(index)) * 100}, index=index
+        )
+        self.n_days = 900
+        self.calls: list[pd.Timestamp | None] = []
+
+    def __call__(self, ticker, start=None):
+        self.calls.append(start)
+        history = self.history.iloc[: self.n_days]
+        if start is not None:
+            history = history[history.index >= start]
+        return history
+
+
+def test_cached_loader_only_fetches_new_bars(tmp_path):
+    fetch = FakeHistory()
+    loader = CachedYfinanceDataLoader("1y", tmp_path, timedelta(0), fetch)
+
+    stock_df = loader.load("Aurora")
+    assert fetch.calls == [None]
+    assert stock_df is not None
+    pd.testing.assert_frame_equal(stock_df, fetch.history.iloc[534:900])
+
+    # The last cached day was partial, it is replaced along with the new bars
+    fetch.history.iloc[899, 0] += 1
+    fetch.n_days = 950
+    stock_df = loader.load("Aurora")
+    assert fetch.calls[1:] == [fetch.history.index[898]]
+    pd.testing.assert_frame_equal(stock_df, fetch.history.iloc[584:950])
+    pd.testing.assert_frame_equal(
+        loader.read_cached("Aurora"), fetch.history.iloc[:950], check_freq=False
+    )
+
+    # A recent cache is served from disk
+    fetch.calls = []
+    loader.max_age = timedelta(hours=1)
+    pd.testing.assert_frame_equal(loader.load("Aurora"), stock_df, check_freq=False)
+    assert fetch.calls == []
+
+
+def test_cached_loader_refetches_adjusted_histories(tmp_path):
+    fetch = FakeHistory()
+    loader = CachedYfinanceDataLoader("1y", tmp_path, timedelta(0), fetch)
+    loader.load("Aurora")
+
+    # A split adjusts every price before it
+    fetch.history["Close"] /= 2
+    fetch.n_days = 910
+    stock_df = loader.load("Aurora")
+
+    assert fetch.calls == [None, fetch.history.index[898], None]
+    pd.testing.assert_frame_equal(stock_df, fetch.history.iloc[544:910])
+
+
+def test_cached_loader_skips_missing_tickers(tmp_path):
+    def fetch(ticker, start=None):
+        return pd.DataFrame()
+
+    loader = CachedYfinanceDataLoader("1y", tmp_path, timedelta(0), fetch)
+    assert loader.load("Missing") is None
+    assert not loader.get_path("Missing").exists()
+
+
+def get_vendor_df(n_days: int) -> pd.DataFrame:
+    index = pd.date_range(
+        "2021-01-01", periods=n_days, freq="D", tz="America/New_York", name="Date"
+    )
+    close = 10 + np.arange(n_days) * 0.1
+    return pd.DataFrame(
+        {
+            "Open": close - 0.05,
+            "High": close + 0.1,
+            "Low": close - 0.1,
+            "Close": close,
+            "Volume": np.arange(n_days) * 10,
+            "Vendor code": "X",
+        },
+        index=index,
+    )
+
+
+def test_local_dataset_reads_csv_files(tmp_path):
+    # Offsets change with daylight saving time
+    get_vendor_df(800).to_csv(tmp_path / "Aurora.csv")
+    get_vendor_df(100).iloc[::-1].to_csv(tmp_path / "Baltigo.csv")
+    with_nan = get_vendor_df(100)
+    with_nan.loc[with_nan.index[3], "Close"] = np.nan
+    with_nan.to_csv(tmp_path / "Cyclops.csv")
+
+    dataset = LocalDataset(tmp_path, period="1y", columns=["Close", "Volume"])
+    assert dataset.tickers == ["Aurora", "Baltigo", "Cyclops"]
+    stock_dfs = dataset.load()
+
+    assert list(stock_dfs) == ["Aurora", "Baltigo"]
+    aurora = stock_dfs["Aurora"]
+    assert list(aurora.columns) == ["Close", "Volume"]
+    assert isinstance(aurora.index, pd.DatetimeIndex)
+    expected = get_vendor_df(800)[["Close", "Volume"]].iloc[-366:]
+    assert aurora.index.tz_convert("America/New_York").equals(expected.index)
+    np.testing.assert_allclose(aurora["Close"], expected["Close"])
+    assert stock_dfs["Baltigo"].index.is_monotonic_increasing
+
+
+def test_local_dataset_reads_parquet_files(tmp_path):
+    pytest.importorskip("pyarrow")
+    get_vendor_df(50).to_parquet(tmp_path / "Aurora.parquet")
+    get_vendor_df(50).reset_index().to_parquet(tmp_path / "Baltigo.parquet")
+
+    stock_dfs = LocalDataset(tmp_path, columns=["Close"]).load()
+    for stock_df in stock_dfs.values():
+        pd.testing.assert_frame_equal(
+            stock_df, get_vendor_df(50)[["Close"]], check_freq=False
+        )
+
+
+def test_local_dataset_keeps_typed_dates(tmp_path, monkeypatch):
+    # Parquet files written from a reset index hold the dates as datetimes
+    vendor_df = get_vendor_df(50).reset_index()
+    monkeypatch.setattr(pd, "read_parquet", lambda path, columns: vendor_df[columns])
+    (tmp_path / "Aurora.parquet").touch()
+
+    stock_dfs = LocalDataset(tmp_path, columns=["Close"]).load()
+    pd.testing.assert_frame_equal(
+        stock_dfs["Aurora"], get_vendor_df(50)[["Close"]], check_freq=False
+    )
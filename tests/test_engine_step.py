@@ -0,0 +1,94 @@
+from ekeko.backtrader.broker import BrokerBuilder
+from ekeko.backtrader.engine import BaseStrategy, Engine
+from ekeko.backtrader.panel import AlignedPanel
+from ekeko.backtrader.vectorized import FixedQuantity, MarketTrader
+from ekeko.core.signal_type import ENTRY, EXIT
+
+import numpy as np
+import pandas as pd
+
+
+class Strategy(BaseStrategy):
+    params = {"window": 3}
+    lookback = 2
+
+    def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        signal = pd.DataFrame(index=stock_df.index)
+
+        signal["SMA"] = stock_df["Close"].rolling(self.params["window"]).mean()
+        signal[ENTRY] = stock_df["Close"] > signal["SMA"]
+        signal[EXIT] = stock_df["Close"] < signal["SMA"]
+
+        return signal
+
+
+def get_stock_dfs() -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(7)
+    index = pd.date_range(start="2023-01-01", periods=40, freq="D")
+
+    stock_dfs = {}
+    for ticker in ["Aurora", "Baltigo", "Cyclops"]:
+        walk = 20 + np.cumsum(rng.normal(0, 1, 30))
+        # Falling then flat prices close every position before the end of the data
+        fall = walk[-1] - np.arange(1, 6)
+        flat = np.full(5, fall[-1])
+        close = np.concatenate([walk, fall, flat])
+        stock_dfs[ticker] = pd.DataFrame({"Close": close}, index=index)
+
+    return stock_dfs
+
+
+def test_step_matches_run_on_the_whole_data():
+    trader = MarketTrader(FixedQuantity(1))
+
+    full_stock_dfs = get_stock_dfs()
+    full_engine = Engine(trader, Strategy(), BrokerBuilder(100, 0.01, full_stock_dfs))
+    full_report = full_engine.run()
+
+    stock_dfs = {ticker: df.iloc[:25] for ticker, df in get_stock_dfs().items()}
+    engine = Engine(trader, Strategy(), BrokerBuilder(100, 0.01, stock_dfs))
+    engine.append_bars({})
+
+    for date in full_stock_dfs["Aurora"].index[25:]:
+        new_bars = {t: df.loc[date] for t, df in full_stock_dfs.items()}
+        report = engine.step(new_bars, date)
+
+    assert len(full_report.trades) > 0
+    pd.testing.assert_frame_equal(report.transactions, full_report.transactions)
+    pd.testing.assert_frame_equal(report.trades, full_report.trades)
+    pd.testing.assert_frame_equal(
+        report.portfolio, full_report.portfolio, check_freq=False
+    )
+
+    for ticker, signal_df in engine.signal_dfs.items():
+        pd.testing.assert_frame_equal(
+            signal_df, full_engine.signal_dfs[ticker], check_freq=False
+        )
+
+
+def test_append_bars_leaves_a_shared_panel_alone():
+    trader = MarketTrader(FixedQuantity(1))
+    full_stock_dfs = get_stock_dfs()
+
+    stock_dfs = {ticker: df.iloc[:25] for ticker, df in full_stock_dfs.items()}
+    panel = AlignedPanel(stock_dfs)
+    has_bar = panel.has_bar.copy()
+    close = panel.fields["Close"].copy()
+
+    # Engines on the same data share its panel
+    broker_builder = BrokerBuilder(100, 0.01, dict(stock_dfs))
+    engine = Engine(trader, Strategy(), broker_builder, panel=panel)
+    other_engine = Engine(
+        trader, Strategy(), BrokerBuilder(100, 0.01, stock_dfs), panel=panel
+    )
+
+    new_rows = {ticker: df.iloc[25:30] for ticker, df in full_stock_dfs.items()}
+    engine.append_bars(new_rows)
+
+    assert engine.panel is not panel and engine.panel.n_dates == 30
+    assert panel.n_dates == 25 and len(panel.date_loc) == 25
+    np.testing.assert_array_equal(panel.has_bar, has_bar)
+    np.testing.assert_array_equal(panel.fields["Close"], close)
+
+    report = other_engine.run()
+    assert report.portfolio.index.equals(stock_dfs["Aurora"].index)
@@ -0,0 +1,324 @@
+from ekeko.backtrader.broker import BrokerBuilder
+from ekeko.backtrader.engine import BaseStrategy, Engine
+from ekeko.backtrader.grid_search import GridSearch, GridSearchReport
+from ekeko.backtrader.report import Report, ReportSummary
+from ekeko.backtrader.result_store import ResultStore
+from ekeko.backtrader.signals import evaluate_signals_recording_params
+from ekeko.backtrader.vectorized import FixedQuantity, MarketTrader
+from ekeko.config import config
+from ekeko.core.signal_type import ENTRY, EXIT
+
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+class Strategy(BaseStrategy):
+    params = {"window": 3}
+
+    def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        signal = pd.DataFrame(index=stock_df.index)
+
+        signal["SMA"] = stock_df["Close"].rolling(self.params["window"]).mean()
+        signal[ENTRY] = stock_df["Close"] > signal["SMA"]
+        signal[EXIT] = stock_df["Close"] < signal["SMA"]
+
+        return signal
+
+
+class CountingStrategy(Strategy):
+    params = {"window": 3}
+    windows: list[int] = []
+
+    def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        CountingStrategy.windows.append(self.params["window"])
+        return super().evaluate(stock_df)
+
+
+def get_stock_dfs() -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(13)
+    index = pd.date_range(start="2023-01-01", periods=50, freq="D")
+
+    stock_dfs = {}
+    for ticker in ["Aurora", "Baltigo", "Cyclops"]:
+        close = 20 + np.cumsum(rng.normal(0, 1, len(index)))
+        stock_dfs[ticker] = pd.DataFrame({"Close": close}, index=index)
+
+    return stock_dfs
+
+
+def test_grid_search_matches_engine_runs():
+    stock_dfs = get_stock_dfs()
+    broker_builder = BrokerBuilder(100, 0.01, stock_dfs)
+    trader = MarketTrader(FixedQuantity(1))
+    param_grid = {"window": [2, 3, 5]}
+
+    num_processors = config.num_processors
+    config.num_processors = 2
+    try:
+        grid_search = GridSearch(
+            Strategy(), trader, stock_dfs, broker_builder, param_grid
+        )
+        grid_search_report = grid_search.optimize()
+    finally:
+        config.num_processors = num_processors
+        Strategy.params["window"] = 3
+
+    assert [params for params, _ in grid_search_report.grid_results] == [
+        {"window": 2},
+        {"window": 3},
+        {"window": 5},
+    ]
+
+    for params, report in grid_search_report.grid_results:
+        strategy = Strategy()
+        strategy.set_params(**params)
+        expected = Engine(trader, strategy, broker_builder).run()
+
+        assert report.stock_dfs is stock_dfs
+        pd.testing.assert_frame_equal(report.portfolio, expected.portfolio)
+        pd.testing.assert_frame_equal(report.trades, expected.trades)
+
+    Strategy.params["window"] = 3
+
+
+def test_grid_search_keeps_full_reports_of_the_top_k():
+    stock_dfs = get_stock_dfs()
+    broker_builder = BrokerBuilder(100, 0.01, stock_dfs)
+    trader = MarketTrader(FixedQuantity(1))
+    param_grid = {"window": [2, 3, 4, 5, 6]}
+    metric_fns = {
+        "growth": lambda report: report.portfolio_statistics["percentage_growth"],
+        "trades": lambda report: len(report.trades),
+    }
+
+    try:
+        grid_search = GridSearch(
+            Strategy(),
+            trader,
+            stock_dfs,
+            broker_builder,
+            param_grid,
+            metric_fns=metric_fns,
+            top_k=2,
+        )
+        grid_search_report = grid_search.optimize()
+    finally:
+        Strategy.params["window"] = 3
+
+    assert all(
+        isinstance(summary, ReportSummary)
+        for _, summary in grid_search_report.grid_results
+    )
+
+    growth = grid_search_report.get_metric_matrix("growth")
+    assert list(growth.columns) == ["window", "metric_value"]
+    default = grid_search_report.get_metric_matrix()
+    assert growth["metric_value"].tolist() == default["metric_value"].tolist()
+
+    top_reports = grid_search_report.top_reports
+    assert len(top_reports) == 2
+    best_windows = growth.sort_values("metric_value", ascending=False)["window"]
+    assert [params["window"] for params, _ in top_reports] == best_windows[:2].tolist()
+
+    params, report = grid_search_report.get_max_metric_report()
+    assert isinstance(report, Report)
+    assert params == top_reports[0][0]
+    assert report.stock_dfs is stock_dfs
+
+    # A rank metric that is not computed fails before running the grid
+    with pytest.raises(ValueError, match="rank_metric"):
+        GridSearch(
+            Strategy(),
+            trader,
+            stock_dfs,
+            broker_builder,
+            param_grid,
+            metric_fns=metric_fns,
+            rank_metric="grwoth",
+        )
+
+
+def test_grid_search_skips_stored_combinations(tmp_path):
+    stock_dfs = get_stock_dfs()
+    broker_builder = BrokerBuilder(100, 0.01, stock_dfs)
+    trader = MarketTrader(FixedQuantity(1))
+    metric_fns = {
+        "growth": lambda report: report.portfolio_statistics["percentage_growth"]
+    }
+    store_path = tmp_path / "results.sqlite"
+
+    def optimize(param_grid):
+        try:
+            grid_search = GridSearch(
+                CountingStrategy(),
+                trader,
+                stock_dfs,
+                broker_builder,
+                param_grid,
+                metric_fns=metric_fns,
+                store=store_path,
+            )
+            return grid_search.optimize()
+        finally:
+            CountingStrategy.params["window"] = 3
+
+    first = optimize({"window": [2, 3]})
+    assert len(ResultStore(store_path)) == 2
+
+    # Only the new combination runs, in this process
+    num_processors = config.num_processors
+    config.num_processors = 1
+    CountingStrategy.windows = []
+    try:
+        second = optimize({"window": [2, 3, 5]})
+    finally:
+        config.num_processors = num_processors
+    assert set(CountingStrategy.windows) == {5}
+
+    growth = second.get_metric_matrix("growth")
+    assert growth["window"].tolist() == [2, 3, 5]
+    first_growth = first.get_metric_matrix("growth")["metric_value"].tolist()
+    assert growth["metric_value"].tolist()[:2] == first_growth
+
+    loaded = GridSearchReport.from_store(store_path)
+    assert loaded.param_grid == {"window": [2, 3, 5]}
+    assert loaded.get_metric_matrix("growth").equals(growth)
+
+    # Other data is another search
+    stock_dfs["Aurora"] = stock_dfs["Aurora"] * 2
+    optimize({"window": [2]})
+    assert len(ResultStore(store_path).get_search_keys()) == 2
+
+    # Stored combinations only have metrics, full Reports cannot be handed back
+    with pytest.raises(ValueError):
+        GridSearch(
+            CountingStrategy(),
+            trader,
+            stock_dfs,
+            broker_builder,
+            {"window": [2]},
+            store=store_path,
+        )
+
+
+def test_grid_search_reuses_signals_when_read_params_do_not_change():
+    stock_dfs = get_stock_dfs()
+    broker_builder = BrokerBuilder(100, 0.01, stock_dfs)
+    trader = MarketTrader(FixedQuantity(1))
+    param_grid = {"window": [2, 3], "unused": [0, 1, 2]}
+
+    num_processors = config.num_processors
+    config.num_processors = 1
+    CountingStrategy.windows = []
+    try:
+        grid_search = GridSearch(
+            CountingStrategy(), trader, stock_dfs, broker_builder, param_grid
+        )
+        grid_search_report = grid_search.optimize()
+    finally:
+        config.num_processors = num_processors
+
+    # Combinations run on copies, the class defaults are left untouched
+    assert CountingStrategy.params == {"window": 3}
+
+    # One evaluation per ticker and window
+    assert sorted(CountingStrategy.windows) == [2, 2, 2, 3, 3, 3]
+
+    for params, report in grid_search_report.grid_results:
+        strategy = Strategy()
+        strategy.set_params(window=params["window"])
+        expected = Engine(trader, strategy, broker_builder).run()
+        pd.testing.assert_frame_equal(report.portfolio, expected.portfolio)
+
+    Strategy.params["window"] = 3
+
+
+class KwargsStrategy(Strategy):
+    params = {"window": 3, "unused": 0}
+
+    def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        return self.get_signal(stock_df, **self.params)
+
+    def get_signal(self, stock_df: pd.DataFrame, window: int, unused: int):
+        signal = pd.DataFrame(index=stock_df.index)
+        signal[ENTRY] = stock_df["Close"] > stock_df["Close"].rolling(window).mean()
+        signal[EXIT] = ~signal[ENTRY]
+        return signal
+
+
+class AttributeStrategy(Strategy):
+    def __init__(self, window: int = 3):
+        self.params = {"window": window}
+        self.window = window
+
+    def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        signal = pd.DataFrame(index=stock_df.index)
+        signal[ENTRY] = (
+            stock_df["Close"] > stock_df["Close"].rolling(self.window).mean()
+        )
+        signal[EXIT] = ~signal[ENTRY]
+        return signal
+
+
+def test_params_read_at_once_or_elsewhere_are_unknown():
+    stock_dfs = get_stock_dfs()
+
+    _, read = evaluate_signals_recording_params(stock_dfs, Strategy())
+    assert read == {"window"}
+
+    # Read through **params, copy() or dict(params)
+    _, read = evaluate_signals_recording_params(stock_dfs, KwargsStrategy())
+    assert read is None
+
+    # Read from attributes, which the recording params do not see
+    _, read = evaluate_signals_recording_params(stock_dfs, AttributeStrategy())
+    assert read is None
+
+
+def test_strategy_with_params_is_an_isolated_copy():
+    strategy = Strategy()
+    copy = strategy.with_params(window=5)
+
+    assert copy.params == {"window": 5}
+    assert strategy.params == {"window": 3} and Strategy.params == {"window": 3}
+    with pytest.raises(TypeError):
+        copy.params["window"] = 2
+    assert pickle.loads(pickle.dumps(copy)).params == {"window": 5}
+
+    strategy.set_params(window=7)
+    assert strategy.params == {"window": 7} and Strategy.params == {"window": 3}
+
+
+def test_grid_search_thread_backend_matches_process_backend():
+    stock_dfs = get_stock_dfs()
+    broker_builder = BrokerBuilder(100, 0.01, stock_dfs)
+    trader = MarketTrader(FixedQuantity(1))
+    param_grid = {"window": [2, 3, 5, 8]}
+    metric_fns = {"growth": lambda r: r.portfolio_statistics["percentage_growth"]}
+
+    num_processors = config.num_processors
+    config.num_processors = 2
+    try:
+        reports = [
+            GridSearch(
+                Strategy(),
+                trader,
+                stock_dfs,
+                broker_builder,
+                param_grid,
+                metric_fns=metric_fns,
+                backend=backend,
+            ).optimize()
+            for backend in ["processes", "threads"]
+        ]
+    finally:
+        config.num_processors = num_processors
+
+    process_report, thread_report = reports
+    assert [s.metrics for _, s in thread_report.grid_results] == [
+        s.metrics for _, s in process_report.grid_results
+    ]
+    assert thread_report.full_reports.keys() == process_report.full_reports.keys()
@@ -0,0 +1,173 @@
+from ekeko.config import config
+from ekeko.core.executor import get_io_executor
+from ekeko.core.http import ThrottledSession, get_session
+from ekeko.data_loader.data_set import Dataset
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+
+class Server(ThreadingHTTPServer):
+    """Local stand-in for a data provider, serving one CSV file per ticker."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.lock = threading.Lock()
+        self.failures: dict[str, int] = {}
+        self.delay = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.n_requests = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class Handler(BaseHTTPRequestHandler):
+    server: Server
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.n_requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            failures = server.failures.get(self.path, 0)
+            server.failures[self.path] = max(failures - 1, 0)
+        try:
+            time.sleep(server.delay)
+            if failures > 0:
+                self.send_response(503)
+                self.send_header("Retry-After", "0")
+                self.end_headers()
+                return
+
+            ticker = self.path.strip("/")
+            if ticker == "Missing":
+                self.send_response(404)
+                self.end_headers()
+                return
+            index = pd.date_range("2023-01-01", periods=5, freq="D", name="Date")
+            close = np.arange(5) + len(ticker)
+            body = pd.DataFrame({"Close": close}, index=index).to_csv().encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+@pytest.fixture
+def server():
+    server = Server()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class Screener:
+    def __init__(self, url: str):
+        self.url = url
+
+    def passes_screen(self, ticker) -> bool:
+        return get_session().get(f"{self.url}/{ticker}").status_code == 200
+
+    def info(self) -> str:
+        return "served"
+
+
+class DataLoader:
+    def __init__(self, url: str):
+        self.url = url
+
+    def load(self, ticker):
+        response = get_session().get(f"{self.url}/{ticker}")
+        response.raise_for_status()
+        return pd.read_csv(StringIO(response.text), index_col="Date", parse_dates=True)
+
+    def process(self, stock_df):
+        return stock_df
+
+
+def test_throttled_session_retries_with_backoff(server):
+    server.failures = {"/Aurora": 2, "/Baltigo": 5}
+    session = ThrottledSession(max_retries=3, backoff=0.01)
+
+    assert session.get(f"{server.url}/Aurora").status_code == 200
+    # The last response is returned once the retries are spent
+    assert session.get(f"{server.url}/Baltigo").status_code == 503
+    assert server.n_requests == 3 + 4
+
+
+def test_throttled_session_only_retries_transient_errors(monkeypatch):
+    errors = []
+
+    def request(self, method, url, *args, **kwargs):
+        errors.append(error)
+        raise error
+
+    monkeypatch.setattr(requests.Session, "request", request)
+    session = ThrottledSession(max_retries=2, backoff=0.01)
+
+    error = requests.ConnectionError("connection reset")
+    with pytest.raises(requests.ConnectionError):
+        session.get("http://127.0.0.1/Aurora")
+    assert len(errors) == 3
+
+    # A missing certificate file will not show up on a retry
+    errors.clear()
+    error = FileNotFoundError("cert.pem")
+    with pytest.raises(FileNotFoundError):
+        session.get("http://127.0.0.1/Aurora")
+    assert len(errors) == 1
+
+
+def test_throttled_session_limits_each_host(server):
+    server.delay = 0.05
+    session = ThrottledSession(max_concurrency=3)
+    with ThreadPoolExecutor(12) as pool:
+        responses = list(pool.map(lambda _: session.get(server.url + "/A"), range(24)))
+    assert all(response.status_code == 200 for response in responses)
+    assert server.max_in_flight == 3
+
+    server.delay = 0.0
+    session = ThrottledSession(rate=50.0, burst=2)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: session.get(server.url + "/A"), range(12)))
+    # Two requests start at once, the other ten at 50 per second
+    assert time.perf_counter() - start >= 10 / 50 * 0.9
+
+
+def test_dataset_screens_and_loads_on_threads(server):
+    server.failures = {"/Cyclops": 1}
+    tickers = ["Aurora", "Missing", "Baltigo", "Cyclops"]
+
+    num_io_threads = config.num_io_threads
+    config.num_io_threads = 4
+    try:
+        dataset = Dataset(tickers, Screener(server.url), DataLoader(server.url))
+        stock_dfs = dataset.load(get_io_executor())
+    finally:
+        config.num_io_threads = num_io_threads
+
+    assert list(stock_dfs) == ["Aurora", "Baltigo", "Cyclops"]
+    assert stock_dfs["Cyclops"]["Close"].tolist() == [7, 8, 9, 10, 11]
@@ -0,0 +1,108 @@
+from ekeko.backtrader.broker import BrokerBuilder
+from ekeko.backtrader.engine import BaseStrategy
+from ekeko.backtrader.grid_search import GridSearch
+from ekeko.backtrader.optimizer import Optimizer
+from ekeko.backtrader.report import Report
+from ekeko.backtrader.vectorized import FixedQuantity, MarketTrader
+from ekeko.core.signal_type import ENTRY, EXIT
+
+import numpy as np
+import pandas as pd
+
+
+class Strategy(BaseStrategy):
+    params = {"short_window": 2, "long_window": 5}
+
+    def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        signal = pd.DataFrame(index=stock_df.index)
+
+        short = stock_df["Close"].rolling(self.params["short_window"]).mean()
+        long = stock_df["Close"].rolling(self.params["long_window"]).mean()
+        signal[ENTRY] = short > long
+        signal[EXIT] = short < long
+
+        return signal
+
+
+def get_stock_dfs() -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(17)
+    index = pd.date_range(start="2023-01-01", periods=90, freq="D")
+
+    stock_dfs = {}
+    for ticker in ["Aurora", "Baltigo", "Cyclops", "Dorado"]:
+        close = 50 + np.cumsum(rng.normal(0.1, 1, len(index)))
+        stock_dfs[ticker] = pd.DataFrame({"Close": close}, index=index)
+
+    return stock_dfs
+
+
+PARAM_GRID = {"short_window": [1, 2, 3, 4, 5, 6], "long_window": [8, 10, 12, 14, 16]}
+
+
+def optimize(**kwargs):
+    stock_dfs = get_stock_dfs()
+    broker_builder = BrokerBuilder(1000, 0.01, stock_dfs)
+    trader = MarketTrader(FixedQuantity(1))
+    try:
+        optimizer = Optimizer(
+            Strategy(), trader, stock_dfs, broker_builder, PARAM_GRID, **kwargs
+        )
+        return optimizer, optimizer.optimize()
+    finally:
+        Strategy.params.update(short_window=2, long_window=5)
+
+
+def test_random_search_over_the_whole_grid_matches_grid_search():
+    stock_dfs = get_stock_dfs()
+    broker_builder = BrokerBuilder(1000, 0.01, stock_dfs)
+    trader = MarketTrader(FixedQuantity(1))
+    try:
+        grid_search = GridSearch(
+            Strategy(), trader, stock_dfs, broker_builder, PARAM_GRID
+        )
+        grid_params, _ = grid_search.optimize().get_max_metric_report()
+    finally:
+        Strategy.params.update(short_window=2, long_window=5)
+
+    _, report = optimize(method="random", n_trials=30, seed=0)
+    params, best_report = report.get_max_metric_report()
+
+    assert len(report.grid_results) == 30
+    assert params == grid_params
+    assert isinstance(best_report, Report)
+
+
+def test_successive_halving_runs_few_full_backtests():
+    optimizer, report = optimize(method="halving", n_trials=27, eta=3, seed=0)
+
+    fractions = [fraction for _, fraction, _ in optimizer.history]
+    assert fractions.count(1 / 9) == 27
+    assert fractions.count(1 / 3) == 9
+    assert fractions.count(1.0) == 3
+    assert len(report.grid_results) == 3
+
+    matrix = report.get_metric_matrix()
+    assert list(matrix.columns) == ["short_window", "long_window", "metric_value"]
+
+
+def test_successive_halving_on_a_ticker_subsample():
+    optimizer, report = optimize(
+        method="halving", n_trials=8, eta=2, min_budget=0.25, budget="tickers", seed=1
+    )
+
+    assert [fraction for _, fraction, _ in optimizer.history].count(1.0) == 2
+    assert len(report.grid_results) == 2
+
+
+def test_model_based_search_tries_distinct_combinations():
+    optimizer, report = optimize(method="model", n_trials=12, n_initial=4, seed=2)
+
+    tried = [tuple(params.values()) for params, _, _ in optimizer.history]
+    assert len(tried) == 12
+    assert len(set(tried)) == 12
+    assert len(report.grid_results) == 12
+
+
+def test_early_stopping():
+    optimizer, _ = optimize(method="random", n_trials=30, patience=1, seed=3)
+    assert len(optimizer.history) < 30
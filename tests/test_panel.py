@@ -0,0 +1,53 @@
+from ekeko.backtrader.panel import AlignedPanel
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+def test_panel_aligns_tickers_on_union_index():
+
+    index_a = pd.date_range(start="2023-01-01", periods=4, freq="D")
+    stock_df_a = pd.DataFrame({"Close": [1.0, 2.0, 3.0, 4.0]}, index=index_a)
+
+    index_b = pd.to_datetime(["2023-01-02", "2023-01-04", "2023-01-05"])
+    stock_df_b = pd.DataFrame(
+        {"Close": [5.0, 6.0, 7.0], "Volume": [10, 20, 30]}, index=index_b
+    )
+
+    panel = AlignedPanel({"Aurora": stock_df_a, "Baltigo": stock_df_b})
+
+    assert panel.n_dates == 5
+    assert panel.tickers == ["Aurora", "Baltigo"]
+
+    expected_has_bar = np.array(
+        [
+            [True, False],
+            [True, True],
+            [True, False],
+            [True, True],
+            [False, True],
+        ]
+    )
+    np.testing.assert_array_equal(panel.has_bar, expected_has_bar)
+
+    date_idx = panel.get_date_idx(pd.Timestamp("2023-01-04"))
+    assert panel.get_close(date_idx, panel.get_ticker_idx("Baltigo")) == 6.0
+    assert panel.get_close(date_idx, panel.get_ticker_idx("Aurora")) == 4.0
+    assert np.isnan(panel.fields["Volume"][date_idx, 0])
+    assert panel.fields["Close"].flags["C_CONTIGUOUS"]
+
+
+def test_panel_aligns_columns_with_missing_values():
+    index = pd.date_range(start="2023-01-01", periods=3, freq="D")
+    stock_df = pd.DataFrame({"Close": [1.0, 2.0, 3.0]}, index=index)
+    panel = AlignedPanel({"Aurora": stock_df})
+
+    # Booleans holding NaN are object columns
+    signal_df = pd.DataFrame({"Entry": [True, None, False]}, index=index)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        entry = panel.align({"Aurora": signal_df}, "Entry", False, bool)
+
+    np.testing.assert_array_equal(entry[:, 0], [True, False, False])
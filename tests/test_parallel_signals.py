@@ -0,0 +1,117 @@
+from ekeko.backtrader.broker import BrokerBuilder
+from ekeko.backtrader.engine import Engine
+from ekeko.backtrader.vectorized import FixedQuantity, MarketTrader
+from ekeko.config import config
+from ekeko.core.signal_type import ENTRY, EXIT, PLOT_COLUMNS
+
+import numpy as np
+import pandas as pd
+
+
+class Strategy:
+
+    def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        if stock_df["Close"].iloc[0] < 0:
+            raise ValueError("negative prices")
+
+        signal = pd.DataFrame(index=stock_df.index)
+
+        signal["EMA"] = stock_df["Close"].ewm(span=3, adjust=False).mean()
+        signal[ENTRY] = stock_df["Close"] > signal["EMA"]
+        signal[EXIT] = stock_df["Close"] < signal["EMA"]
+
+        signal.attrs[PLOT_COLUMNS] = ["EMA"]
+
+        return signal
+
+
+def get_stock_dfs() -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(3)
+    index = pd.date_range(start="2023-01-01", periods=40, freq="D")
+
+    stock_dfs = {}
+    for ticker in ["Aurora", "Baltigo", "Cyclops", "Dorado", "Espada"]:
+        close = 10 + np.cumsum(rng.normal(0, 1, len(index)))
+        volume = rng.integers(100, 1000, len(index))
+        data = {"Close": close, "Volume": volume}
+        stock_dfs[ticker] = pd.DataFrame(data, index=index)
+
+    stock_dfs["Cyclops"]["Close"] *= -1
+
+    return stock_dfs
+
+
+def test_parallel_signals_match_serial_signals():
+    stock_dfs = get_stock_dfs()
+    del stock_dfs["Cyclops"]
+    broker_builder = BrokerBuilder(1000, 0.01, stock_dfs)
+
+    serial_engine = Engine(MarketTrader(FixedQuantity(1)), Strategy(), broker_builder)
+
+    num_processors = config.num_processors
+    config.parallel_signals = True
+    config.num_processors = 2
+    try:
+        parallel_engine = Engine(
+            MarketTrader(FixedQuantity(1)),
+            Strategy(),
+            BrokerBuilder(1000, 0.01, get_stock_dfs()),
+        )
+    finally:
+        config.parallel_signals = False
+        config.num_processors = num_processors
+
+    assert list(parallel_engine.signal_errors) == ["Cyclops"]
+    assert "negative prices" in parallel_engine.signal_errors["Cyclops"]
+    assert list(parallel_engine.signal_dfs) == ["Aurora", "Baltigo", "Dorado", "Espada"]
+
+    for ticker, signal_df in parallel_engine.signal_dfs.items():
+        pd.testing.assert_frame_equal(signal_df, serial_engine.signal_dfs[ticker])
+        assert signal_df.attrs[PLOT_COLUMNS] == ["EMA"]
+
+    # The failing ticker is not traded
+    report = parallel_engine.run()
+    assert "Cyclops" not in set(report.transactions["ticker"])
+
+
+class ObjectStrategy:
+
+    def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        signal = pd.DataFrame(index=stock_df.index)
+
+        # Booleans holding NaN are object columns, which frame files cannot store
+        rising = stock_df["Close"].diff() > 0
+        signal[ENTRY] = rising.where(stock_df["Close"].diff().notna())
+        signal[EXIT] = ~rising
+
+        return signal
+
+
+def test_parallel_signals_keep_object_columns():
+    stock_dfs = get_stock_dfs()
+    del stock_dfs["Cyclops"]
+
+    serial_engine = Engine(
+        MarketTrader(FixedQuantity(1)),
+        ObjectStrategy(),
+        BrokerBuilder(1000, 0.01, stock_dfs),
+    )
+
+    num_processors = config.num_processors
+    config.parallel_signals = True
+    config.num_processors = 2
+    try:
+        parallel_engine = Engine(
+            MarketTrader(FixedQuantity(1)),
+            ObjectStrategy(),
+            BrokerBuilder(1000, 0.01, stock_dfs),
+        )
+    finally:
+        config.parallel_signals = False
+        config.num_processors = num_processors
+
+    assert parallel_engine.signal_errors == {}
+    assert list(parallel_engine.signal_dfs) == list(stock_dfs)
+    for ticker, signal_df in parallel_engine.signal_dfs.items():
+        assert signal_df[ENTRY].dtype == object
+        pd.testing.assert_frame_equal(signal_df, serial_engine.signal_dfs[ticker])
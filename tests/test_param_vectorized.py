@@ -0,0 +1,79 @@
+from ekeko.backtrader.broker import BrokerBuilder
+from ekeko.backtrader.engine import BaseStrategy, Engine
+from ekeko.backtrader.param_vectorized import ParamVectorizedEngine
+from ekeko.backtrader.report import Report
+from ekeko.backtrader.vectorized import CashFraction, FixedQuantity, MarketTrader
+from ekeko.core.signal_type import ENTRY, EXIT
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+class Strategy(BaseStrategy):
+    params = {"fast": 3, "slow": 8}
+
+    def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        signal = pd.DataFrame(index=stock_df.index)
+
+        fast = stock_df["Close"].ewm(span=self.params["fast"], adjust=False).mean()
+        slow = stock_df["Close"].ewm(span=self.params["slow"], adjust=False).mean()
+
+        signal[ENTRY] = (fast > slow) & (fast.shift(1) <= slow.shift(1))
+        signal[EXIT] = (fast < slow) & (fast.shift(1) >= slow.shift(1))
+
+        return signal
+
+
+def get_stock_dfs() -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(7)
+    dates = pd.date_range(start="2023-01-01", periods=120, freq="D")
+
+    stock_dfs = {}
+    for i, ticker in enumerate(["Aurora", "Baltigo", "Cyclops", "Dorado"]):
+        # Every ticker starts and ends at a different date and has gaps
+        index = dates[5 * i : len(dates) - 7 * i]
+        index = index[rng.random(len(index)) > 0.1]
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.05, len(index))))
+        stock_dfs[ticker] = pd.DataFrame({"Close": close}, index=index)
+
+    return stock_dfs
+
+
+@pytest.mark.parametrize("sizing", [FixedQuantity(2), CashFraction(1.0)])
+def test_param_vectorized_engine_matches_engine(sizing):
+    stock_dfs = get_stock_dfs()
+    broker_builder = BrokerBuilder(100, 0.01, stock_dfs)
+    param_grid = {"fast": [2, 3, 5], "slow": [6, 8, 13]}
+
+    engine = ParamVectorizedEngine(
+        MarketTrader(sizing), Strategy(), broker_builder, param_grid, block_size=4
+    )
+    grid_report = engine.run()
+
+    assert len(grid_report.grid_results) == 9
+    for params, summary in grid_report.grid_results:
+        strategy = Strategy()
+        strategy.params = dict(params)
+        report = Engine(
+            MarketTrader(sizing), strategy, BrokerBuilder(100, 0.01, stock_dfs)
+        ).run()
+
+        assert summary.trades_statistics == pytest.approx(
+            report.trades_statistics, nan_ok=True
+        )
+        assert summary.relative_trades_statistics == pytest.approx(
+            report.relative_trades_statistics, nan_ok=True
+        )
+        statistics = dict(report.portfolio_statistics)
+        summary_statistics = dict(summary.portfolio_statistics)
+        assert summary_statistics.pop("max_drawdown_duration") == statistics.pop(
+            "max_drawdown_duration"
+        )
+        assert summary_statistics == pytest.approx(statistics, nan_ok=True)
+
+    # The best combination comes with its full report
+    params, report = grid_report.get_max_metric_report()
+    assert isinstance(report, Report)
+    assert list(grid_report.full_reports.values()) == [report]
+    assert Strategy.params == {"fast": 3, "slow": 8}
@@ -65,3 +65,134 @@ def test_broker_buy():  # Test cases
         broker.add_orders(orders)
 
     # print(broker.account.value_df)
+
+
+def test_account_closes_the_last_matching_position():
+    index = pd.to_datetime(["2023-08-03", "2023-08-04", "2023-08-05", "2023-08-07"])
+    stock_df_a = pd.DataFrame({"Close": [1, 2, 4, 3]}, index=index)
+    stock_df_b = pd.DataFrame({"Close": [5, 5, 5, 5]}, index=index)
+    stock_dfs = {"Aurora": stock_df_a, "Beyblade": stock_df_b}
+
+    account = Account(1000, index)
+    broker = Broker(account, 0.0, stock_dfs)
+
+    broker.update(index[0])
+    broker.add_orders(
+        [
+            OrderBuilder("Aurora", 10).market().buy().at_date(index[0]).build(),
+            OrderBuilder("Beyblade", 10).market().buy().at_date(index[0]).build(),
+        ]
+    )
+    broker.update(index[1])
+    broker.add_orders(
+        [OrderBuilder("Aurora", 10).market().buy().at_date(index[1]).build()]
+    )
+    broker.update(index[2])
+
+    assert len(account.positions) == 3
+    assert account.get_position_tickers() == ["Aurora", "Beyblade"]
+
+    first_lot, second_lot = account.get_positions("Aurora")
+    assert first_lot.transaction.execution_price == 2
+    assert second_lot.transaction.execution_price == 4
+
+    broker.add_orders([first_lot.get_closing_order(index[2])])
+    broker.update(index[3])
+
+    # The most recent matching lot is the one closed
+    assert len(account.trades) == 1
+    assert account.trades[0].opening_transaction.execution_price == 4
+    assert account.trades[0].pnl == (3 - 4) * 10
+    assert account.get_positions("Aurora") == [first_lot]
+    assert [p.transaction.order.ticker for p in account.positions] == [
+        "Aurora",
+        "Beyblade",
+    ]
+
+
+def test_account_trades_match_the_baseline_lot_order():
+    index = pd.date_range("2023-08-01", periods=9, freq="D")
+    close = [10, 11, 13, 12, 15, 14, 17, 16, 18]
+    stock_dfs = {"Aurora": pd.DataFrame({"Close": close}, index=index)}
+
+    account = Account(1000, index)
+    broker = Broker(account, 0.0, stock_dfs)
+
+    orders = [(1, "buy"), (2, "buy"), (1, "buy"), (1, "sell")]
+    orders += [(2, "buy"), (2, "sell"), (2, "sell"), (1, "sell")]
+    for date, (quantity, action) in zip(index, orders):
+        broker.update(date)
+        order = OrderBuilder("Aurora", quantity).market()
+        order = order.buy() if action == "buy" else order.sell()
+        broker.add_orders([order.at_date(date).build()])
+    broker.update(index[-1])
+
+    # (opening price, closing price, quantity) of the trades the engine made when
+    # positions were a list, where the last matching position was closed. FIFO
+    # lots would close the one opened at 11 first
+    trades = [
+        (
+            t.opening_transaction.execution_price,
+            t.closing_transaction.execution_price,
+            t.opening_transaction.order.quantity,
+        )
+        for t in account.trades
+    ]
+    assert trades == [(12, 15, 1), (14, 17, 2), (13, 16, 2), (11, 18, 1)]
+    assert account.positions == []
+
+
+def test_broker_fills_orders_on_next_available_record():
+    index = pd.to_datetime(
+        ["2023-08-03", "2023-08-04", "2023-08-05", "2023-08-07", "2023-08-08"]
+    )
+    stock_df_a = pd.DataFrame({"Close": [1, 2, 3, 4, 5]}, index=index)
+    # Beyblade has a gap and stops trading before the last date
+    stock_df_b = pd.DataFrame({"Close": [10, 20, 30]}, index=index[[0, 2, 3]])
+    stock_dfs = {"Aurora": stock_df_a, "Beyblade": stock_df_b}
+
+    account = Account(100, index)
+    broker = Broker(account, 0.0, stock_dfs)
+
+    broker.update(index[0])
+    broker.add_orders(
+        [
+            OrderBuilder("Beyblade", 1).market().buy().at_date(index[0]).build(),
+            OrderBuilder("Aurora", 1).market().buy().at_date(index[0]).build(),
+        ]
+    )
+    broker.update(index[1])
+
+    # Beyblade has no record on the 4th, its order waits for the 5th
+    assert [t.order.ticker for t in account.transactions] == ["Aurora"]
+    assert len(broker.order_queue) == 1
+
+    broker.update(index[2])
+    assert [t.order.ticker for t in account.transactions] == ["Aurora", "Beyblade"]
+    assert account.transactions[1].execution_price == 20
+
+    broker.add_orders(
+        [OrderBuilder("Beyblade", 10).market().buy().at_date(index[2]).build()]
+    )
+    broker.update(index[3])
+
+    # 10 shares at 30 are more than the cash left
+    assert len(account.dropped_transaction) == 1
+    assert account.get_cash(index[3]) == 100 - 2 - 20
+
+    broker.add_orders(
+        [OrderBuilder("Beyblade", 1).market().sell().at_date(index[3]).build()]
+    )
+    broker.update(index[4])
+
+    # There is no record left for Beyblade to fill the order
+    assert len(broker.order_queue) == 1
+    assert broker.has_queued_orders()
+
+    # Assigning the queue queues its orders again
+    order = OrderBuilder("Aurora", 1).market().buy().at_date(index[4]).build()
+    broker.order_queue += [order]
+    assert broker.order_queue[-1] is order
+    assert broker.order_buckets == {}
+    broker.order_queue = []
+    assert not broker.has_queued_orders()
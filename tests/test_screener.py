@@ -0,0 +1,79 @@
+from ekeko.backtrader.fundamentals_store import FundamentalsStore
+from ekeko.backtrader.screener import YfinanceTickerSceener
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import pickle
+import time
+
+
+INFOS = {
+    "Aurora": {"marketCap": 5e9, "volume": 1e6, "firstTradeDateEpochUtc": 0},
+    "Baltigo": {"marketCap": 5e8, "volume": 2e6, "firstTradeDateEpochUtc": 0},
+    # Listed a month ago
+    "Cyclops": {
+        "marketCap": 5e9,
+        "volume": 3e5,
+        "firstTradeDateEpochUtc": time.time() - 30 * 24 * 3600,
+    },
+    "Dorado": {"volume": 1e6},
+}
+
+
+class Fetch:
+    def __init__(self):
+        self.fetched: list[str] = []
+
+    def __call__(self, ticker):
+        self.fetched.append(ticker)
+        if ticker not in INFOS:
+            raise ValueError("Unknown ticker")
+        return {**INFOS[ticker], "longName": ticker}
+
+
+def screen(screener, tickers) -> list[str]:
+    with ThreadPoolExecutor(4) as pool:
+        passed = list(pool.map(screener.passes_screen, tickers))
+    return [ticker for ticker, ok in zip(tickers, passed) if ok]
+
+
+def test_screener_reuses_cached_fundamentals(tmp_path):
+    tickers = ["Aurora", "Baltigo", "Cyclops", "Dorado", "Missing"]
+    path = tmp_path / "fundamentals.sqlite"
+    fetch = Fetch()
+
+    screener = YfinanceTickerSceener(marketCapMin=int(1e9), cache=path, fetch_fn=fetch)
+    assert screen(screener, tickers) == ["Aurora", "Cyclops"]
+    assert sorted(fetch.fetched) == sorted(tickers)
+
+    # Failed fetches are not cached, and only the fields of the screen are
+    store = FundamentalsStore(path)
+    assert len(store) == 4
+    assert store.get("Aurora") == INFOS["Aurora"]
+
+    # Other thresholds are screened from the cache
+    fetch.fetched = []
+    screener = YfinanceTickerSceener(
+        volumeMin=int(5e5), minTimeSinceFirstTrade=12, cache=path, fetch_fn=fetch
+    )
+    assert screen(screener, tickers) == ["Aurora", "Baltigo"]
+    assert fetch.fetched == ["Missing"]
+
+    # Also from other processes
+    screener = pickle.loads(pickle.dumps(screener))
+    fetch = screener.fetch_fn
+    assert screen(screener, tickers) == ["Aurora", "Baltigo"]
+    assert fetch.fetched == ["Missing", "Missing"]
+
+
+def test_screener_fetches_expired_fundamentals(tmp_path):
+    fetch = Fetch()
+    store = FundamentalsStore(tmp_path / "fundamentals.sqlite")
+    store.put("Aurora", {"marketCap": 1.0, "volume": 1.0, "firstTradeDateEpochUtc": 0})
+
+    screener = YfinanceTickerSceener(
+        marketCapMin=int(1e9), cache=store, cache_ttl=timedelta(0), fetch_fn=fetch
+    )
+    assert screener.passes_screen("Aurora")
+    assert fetch.fetched == ["Aurora"]
+    assert store.get("Aurora") == INFOS["Aurora"]
@@ -0,0 +1,120 @@
+from ekeko.backtrader.broker import BrokerBuilder
+from ekeko.backtrader.engine import BaseStrategy, Engine
+from ekeko.backtrader.signal_cache import SignalCache, hash_strategy, open_signal_cache
+from ekeko.backtrader.vectorized import FixedQuantity, MarketTrader
+from ekeko.config import config
+from ekeko.core.signal_type import ENTRY, EXIT, PLOT_COLUMNS
+
+import numpy as np
+import pandas as pd
+
+
+class Strategy(BaseStrategy):
+    params = {"span": 3}
+    # On the class, attributes of the instance are part of the cache key
+    evaluations = 0
+
+    def __init__(self, adjust: bool = True):
+        self.adjust = adjust
+
+    def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        Strategy.evaluations += 1
+        signal = pd.DataFrame(index=stock_df.index)
+
+        ewm = stock_df["Close"].ewm(span=self.params["span"], adjust=self.adjust)
+        signal["EMA"] = ewm.mean()
+        signal[ENTRY] = stock_df["Close"] > signal["EMA"]
+        signal[EXIT] = stock_df["Close"] < signal["EMA"]
+
+        signal.attrs[PLOT_COLUMNS] = ["EMA"]
+
+        return signal
+
+
+def get_stock_dfs() -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(5)
+    index = pd.date_range(start="2023-01-01", periods=30, freq="D")
+
+    stock_dfs = {}
+    for ticker in ["Aurora", "Baltigo", "Cyclops"]:
+        close = 10 + np.cumsum(rng.normal(0, 1, len(index)))
+        stock_dfs[ticker] = pd.DataFrame({"Close": close}, index=index)
+
+    return stock_dfs
+
+
+def test_engine_reuses_cached_signals(tmp_path):
+    stock_dfs = get_stock_dfs()
+    broker_builder = BrokerBuilder(1000, 0.01, stock_dfs)
+    trader = MarketTrader(FixedQuantity(1))
+
+    config.signal_cache = True
+    config.signal_cache_dir = str(tmp_path)
+    try:
+        cache = open_signal_cache()
+        assert cache is not None
+
+        Strategy.evaluations = 0
+        strategy = Strategy()
+        first_report = Engine(trader, strategy, broker_builder).run()
+        assert strategy.evaluations == 3
+        assert cache.stats()["misses"] == 3
+
+        engine = Engine(trader, strategy, broker_builder)
+        second_report = engine.run()
+        assert strategy.evaluations == 3
+        assert cache.stats()["hits"] == 3
+        assert engine.signal_dfs["Aurora"].attrs[PLOT_COLUMNS] == ["EMA"]
+        pd.testing.assert_frame_equal(first_report.portfolio, second_report.portfolio)
+
+        # New params or new data are new entries
+        strategy.set_params(span=5)
+        Engine(trader, strategy, broker_builder)
+        assert strategy.evaluations == 6
+
+        stock_dfs["Aurora"].iloc[-1, 0] += 1
+        Engine(trader, strategy, broker_builder)
+        assert strategy.evaluations == 7
+
+        # So are instances that only differ in an attribute
+        assert hash_strategy(Strategy(adjust=False)) != hash_strategy(strategy)
+        Engine(trader, Strategy(adjust=False), broker_builder)
+        assert Strategy.evaluations == 10
+    finally:
+        config.signal_cache = False
+        Strategy.params["span"] = 3
+
+
+def test_signal_cache_evicts_least_recently_used(tmp_path):
+    stock_dfs = get_stock_dfs()
+    strategy = Strategy()
+    strategy_hash = hash_strategy(strategy)
+
+    cache = SignalCache(tmp_path, max_bytes=1 << 30)
+    keys = [cache.get_key(df, strategy_hash) for df in stock_dfs.values()]
+    for key, stock_df in zip(keys, stock_dfs.values()):
+        cache.put(key, strategy.evaluate(stock_df))
+
+    entry_size = cache.size // 3
+    cache.max_bytes = 2 * entry_size
+
+    assert cache.get(keys[0]) is not None
+    cache.evict()
+
+    assert cache.evictions == 1
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+
+
+def test_signal_cache_overwrites_entries_in_place(tmp_path):
+    stock_df = get_stock_dfs()["Aurora"]
+    strategy = Strategy()
+    cache = SignalCache(tmp_path, max_bytes=1 << 30)
+    key = cache.get_key(stock_df, hash_strategy(strategy))
+
+    cache.put(key, strategy.evaluate(stock_df))
+    entry_size = cache.size
+    cache.put(key, strategy.evaluate(stock_df))
+
+    assert cache.size == entry_size
@@ -0,0 +1,145 @@
+from ekeko.backtrader.broker import (
+    Account,
+    BrokerBuilder,
+    Order,
+    OrderBuilder,
+    Position,
+)
+from ekeko.backtrader.engine import Engine
+from ekeko.backtrader.vectorized import FixedQuantity, MarketTrader
+from ekeko.core.signal_type import ENTRY, EXIT
+
+from ekeko.core import Ticker, Date
+
+import pandas as pd
+
+
+class Strategy:
+
+    def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        signal = pd.DataFrame(index=stock_df.index)
+
+        signal[ENTRY] = stock_df["Close"] == 2
+
+        signal[EXIT] = stock_df["Close"] == 3
+
+        return signal
+
+
+class Trader:
+
+    def trade(
+        self,
+        account: Account,
+        date: Date,
+        ticker: Ticker,
+        signal: pd.DataFrame,
+        stock_row: pd.DataFrame,
+        open_positions: list[Position],
+    ) -> list[Order]:
+        orders = []
+
+        if signal.loc[ENTRY] and len(open_positions) == 0:
+            quantity = account.get_cash(date) * 0.5 / stock_row.loc["Close"]
+            order = OrderBuilder(ticker, quantity).market().buy().at_date(date).build()
+            orders.append(order)
+
+        if signal.loc[EXIT]:
+            for p in open_positions:
+                order = p.get_closing_order(date)
+                orders.append(order)
+
+        return orders
+
+
+def test_sparse_engine_matches_dense_engine():
+
+    # Long idle stretches between the signals of both stocks
+    data_a = {
+        "Close": [1, 2, 1, 1, 1, 3, 1, 1, 1, 1, 1, 1, 1, 2, 1, 5, 3, 1, 1, 1],
+    }
+    index_a = pd.date_range(start="2023-01-01", periods=len(data_a["Close"]), freq="D")
+    stock_df_a = pd.DataFrame(data_a, index=index_a)
+    ticker_a = "Aurora"
+
+    # Stock B trades every other day and stops before the end with an open position
+    data_b = {
+        "Close": [1, 1, 1, 2, 2, 2, 2, 4],
+    }
+    index_b = pd.date_range(start="2023-01-02", periods=len(data_b["Close"]), freq="2D")
+    stock_df_b = pd.DataFrame(data_b, index=index_b)
+    ticker_b = "Baltigo"
+
+    stock_dfs = {ticker_a: stock_df_a, ticker_b: stock_df_b}
+
+    comission = 0.01
+    initial_cash = 100
+
+    sparse_engine = Engine(
+        Trader(),
+        Strategy(),
+        BrokerBuilder(initial_cash, comission, stock_dfs),
+        sparse=True,
+    )
+    dense_engine = Engine(
+        Trader(),
+        Strategy(),
+        BrokerBuilder(initial_cash, comission, stock_dfs),
+        sparse=False,
+    )
+    assert sparse_engine.events is not None
+    assert dense_engine.events is None
+
+    sparse_report = sparse_engine.run()
+    dense_report = dense_engine.run()
+
+    assert len(dense_report.trades) == 3
+    pd.testing.assert_frame_equal(sparse_report.transactions, dense_report.transactions)
+    pd.testing.assert_frame_equal(sparse_report.trades, dense_report.trades)
+    pd.testing.assert_frame_equal(
+        sparse_report.portfolio.astype("float64"),
+        dense_report.portfolio.astype("float64"),
+    )
+
+
+class WeeklyTrader:
+    """Buys on Mondays and sells two bars later, whatever the signals say."""
+
+    def trade(
+        self,
+        account: Account,
+        date: Date,
+        ticker: Ticker,
+        signal: pd.DataFrame,
+        stock_row: pd.DataFrame,
+        open_positions: list[Position],
+    ) -> list[Order]:
+        if date.dayofweek == 0 and len(open_positions) == 0:
+            return [OrderBuilder(ticker, 1).market().buy().at_date(date).build()]
+
+        orders = []
+        for p in open_positions:
+            if date - p.transaction.execution_date >= pd.Timedelta(days=2):
+                orders.append(p.get_closing_order(date))
+        return orders
+
+
+def test_engine_calls_traders_on_bars_without_signals_by_default():
+    index = pd.date_range(start="2023-01-01", periods=30, freq="D")
+    stock_dfs = {"Aurora": pd.DataFrame({"Close": [1.0] * len(index)}, index=index)}
+    broker_builder = BrokerBuilder(100, 0.01, stock_dfs)
+
+    # No ENTRY or EXIT signal is ever set
+    engine = Engine(WeeklyTrader(), Strategy(), broker_builder)
+    assert engine.events is None
+    report = engine.run()
+
+    assert len(report.trades) == 4
+
+    # The sparse engine only calls it for held tickers, so it never buys
+    engine = Engine(WeeklyTrader(), Strategy(), broker_builder, sparse=True)
+    assert len(engine.run().trades) == 0
+
+    # Traders that only act on signals are sparse by default
+    engine = Engine(MarketTrader(FixedQuantity(1)), Strategy(), broker_builder)
+    assert engine.events is not None
@@ -0,0 +1,107 @@
+from ekeko.backtrader.broker import BrokerBuilder
+from ekeko.backtrader.engine import BaseStrategy, Engine
+from ekeko.backtrader.grid_search import GridSearch
+from ekeko.backtrader.vectorized import FixedQuantity, MarketTrader
+from ekeko.config import config
+from ekeko.core.signal_type import ENTRY, EXIT
+from ekeko.core.telemetry import Telemetry, TelemetrySnapshot
+
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+
+class Strategy(BaseStrategy):
+    params = {"window": 3}
+
+    def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        signal = pd.DataFrame(index=stock_df.index)
+
+        signal["SMA"] = stock_df["Close"].rolling(self.params["window"]).mean()
+        signal[ENTRY] = stock_df["Close"] > signal["SMA"]
+        signal[EXIT] = stock_df["Close"] < signal["SMA"]
+
+        return signal
+
+
+def get_stock_dfs() -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(23)
+    dates = pd.date_range(start="2023-01-01", periods=40, freq="D")
+
+    stock_dfs = {}
+    for i, ticker in enumerate(["Aurora", "Baltigo", "Cyclops"]):
+        index = dates[3 * i :]
+        close = 20 + np.cumsum(rng.normal(0, 1, len(index)))
+        stock_dfs[ticker] = pd.DataFrame({"Close": close}, index=index)
+
+    return stock_dfs
+
+
+def test_grid_search_telemetry(tmp_path):
+    stock_dfs = get_stock_dfs()
+    n_bars = sum(len(df) for df in stock_dfs.values())
+    snapshots: list[TelemetrySnapshot] = []
+    status_path = tmp_path / "status.json"
+    telemetry = Telemetry(
+        [snapshots.append], status_path, interval=0.01, progress_bar=False
+    )
+
+    num_processors = config.num_processors
+    config.num_processors = 2
+    try:
+        GridSearch(
+            Strategy(),
+            MarketTrader(FixedQuantity(1)),
+            stock_dfs,
+            BrokerBuilder(100, 0.01, stock_dfs),
+            {"window": [2, 3, 4, 5, 6, 7, 8, 9]},
+            metric_fns={"trades": lambda report: len(report.trades)},
+            telemetry=telemetry,
+        ).optimize()
+    finally:
+        config.num_processors = num_processors
+
+    last = snapshots[-1]
+    assert last.done and not any(s.done for s in snapshots[:-1])
+    assert last.completed == last.total == 8
+    assert last.n_bars == 8 * n_bars
+    assert last.eta == 0 and last.tasks_per_sec > 0 and last.bars_per_sec > 0
+    assert last.peak_rss > 0
+
+    workers = last.workers.values()
+    assert sum(w.n_tasks for w in workers) == 8
+    assert all(0 < w.utilization <= 1 and w.peak_rss > 0 for w in workers)
+
+    assert json.loads(status_path.read_text()) == last.to_dict()
+
+
+def test_telemetry_reports_while_tasks_run():
+    snapshots: list[TelemetrySnapshot] = []
+    telemetry = Telemetry([snapshots.append], interval=0.01, progress_bar=False)
+
+    telemetry.start(4, "Slow")
+    telemetry.update(1, 10)
+    time.sleep(0.1)
+    assert snapshots and snapshots[-1].completed == 1
+    assert snapshots[-1].eta > 0
+    telemetry.close()
+    assert snapshots[-1].done
+
+
+def test_engine_telemetry_counts_dates_and_bars():
+    stock_dfs = get_stock_dfs()
+    snapshots: list[TelemetrySnapshot] = []
+
+    engine = Engine(
+        MarketTrader(FixedQuantity(1)),
+        Strategy(),
+        BrokerBuilder(100, 0.01, stock_dfs),
+    )
+    engine.run(telemetry=Telemetry([snapshots.append], progress_bar=False))
+
+    last = snapshots[-1]
+    assert last.done and last.desc == "Fishing ><> ~ ><>"
+    assert last.completed == last.total == 40
+    assert last.n_bars == sum(len(df) for df in stock_dfs.values())
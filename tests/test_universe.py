@@ -0,0 +1,152 @@
+from ekeko.backtrader.broker import BrokerBuilder
+from ekeko.backtrader.engine import BaseStrategy
+from ekeko.backtrader.grid_search import GridSearch
+from ekeko.backtrader.screener import TrivialScreener
+from ekeko.backtrader.vectorized import FixedQuantity, MarketTrader
+from ekeko.config import config
+from ekeko.core.executor import JoblibExecutor
+from ekeko.core.signal_type import ENTRY, EXIT
+from ekeko.core.universe import (
+    Universe,
+    get_universe_path,
+    open_universe,
+    publish_universe,
+    save_universe,
+)
+from ekeko.data_loader.data_set import Dataset
+
+import pickle
+
+import numpy as np
+import pandas as pd
+
+
+class Strategy(BaseStrategy):
+    params = {"window": 3}
+
+    def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        signal = pd.DataFrame(index=stock_df.index)
+
+        signal["SMA"] = stock_df["Close"].rolling(self.params["window"]).mean()
+        signal[ENTRY] = stock_df["Close"] > signal["SMA"]
+        signal[EXIT] = stock_df["Close"] < signal["SMA"]
+
+        return signal
+
+
+def get_stock_dfs() -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(29)
+    dates = pd.date_range(start="2023-01-01", periods=40, freq="D")
+
+    stock_dfs = {}
+    for i, ticker in enumerate(["Aurora", "Baltigo", "Cyclops"]):
+        index = dates[2 * i :]
+        close = 20 + np.cumsum(rng.normal(0, 1, len(index)))
+        volume = rng.integers(100, 1000, len(index))
+        stock_dfs[ticker] = pd.DataFrame(
+            {"Close": close, "Volume": volume}, index=index
+        )
+
+    return stock_dfs
+
+
+class DataLoader:
+    def __init__(self, stock_dfs):
+        self.stock_dfs = stock_dfs
+        self.loaded: list[str] = []
+
+    def load(self, ticker):
+        self.loaded.append(ticker)
+        return self.stock_dfs.get(ticker)
+
+    def process(self, stock_df):
+        return stock_df
+
+
+def test_universe_maps_frames_lazily(tmp_path):
+    stock_dfs = get_stock_dfs()
+    path = tmp_path / "universe.ekf"
+    save_universe(path, stock_dfs)
+
+    universe = open_universe(path)
+    assert list(universe) == ["Aurora", "Baltigo", "Cyclops"]
+    for ticker, stock_df in stock_dfs.items():
+        pd.testing.assert_frame_equal(universe[ticker], stock_df, check_freq=False)
+
+    # Frames are views into the file, built once
+    close = universe["Baltigo"]["Close"].to_numpy()
+    assert np.shares_memory(close, universe.mapped_frames.arrays["Close"])
+    assert universe["Baltigo"] is universe["Baltigo"]
+
+    # Pickled as its path until modified
+    assert len(pickle.dumps(universe)) < 200
+    assert isinstance(pickle.loads(pickle.dumps(universe)), Universe)
+    assert get_universe_path(universe) == path
+    assert publish_universe(tmp_path, universe) == path
+
+    universe["Aurora"] = stock_dfs["Aurora"].iloc[:10]
+    assert get_universe_path(universe) is None
+    assert len(pickle.loads(pickle.dumps(universe))["Aurora"]) == 10
+    assert publish_universe(tmp_path, universe) == tmp_path / "stock_dfs.ekf"
+
+
+def test_grid_search_on_a_universe_matches_stock_dfs(tmp_path):
+    stock_dfs = get_stock_dfs()
+    path = tmp_path / "universe.ekf"
+    save_universe(path, stock_dfs)
+    universe = open_universe(path)
+
+    num_processors = config.num_processors
+    config.num_processors = 2
+    try:
+        reports = [
+            GridSearch(
+                Strategy(),
+                MarketTrader(FixedQuantity(1)),
+                dfs,
+                BrokerBuilder(100, 0.01, dfs),
+                {"window": [2, 3, 5]},
+                metric_fns={
+                    "growth": lambda r: r.portfolio_statistics["percentage_growth"]
+                },
+            ).optimize()
+            for dfs in (stock_dfs, universe)
+        ]
+    finally:
+        config.num_processors = num_processors
+
+    assert [s.metrics for _, s in reports[0].grid_results] == [
+        s.metrics for _, s in reports[1].grid_results
+    ]
+
+
+def test_dataset_saves_and_reopens_its_universe(tmp_path):
+    stock_dfs = get_stock_dfs()
+    path = tmp_path / "universe.ekf"
+    executor = JoblibExecutor(backend="threading")
+
+    num_processors = config.num_processors
+    config.num_processors = 1
+    tickers = ["Cyclops", "Missing", "Aurora"]
+    try:
+        data_loader = DataLoader(stock_dfs)
+        dataset = Dataset(tickers, TrivialScreener(), data_loader)
+        universe = dataset.load(executor, path)
+        assert isinstance(universe, Universe)
+        assert list(universe) == ["Cyclops", "Aurora"]
+        pd.testing.assert_frame_equal(
+            universe["Aurora"], stock_dfs["Aurora"], check_freq=False
+        )
+
+        data_loader = DataLoader(stock_dfs)
+        dataset = Dataset(tickers, TrivialScreener(), data_loader)
+        assert list(dataset.load(executor, path)) == ["Cyclops", "Aurora"]
+        assert data_loader.loaded == []
+
+        # Another dataset at the same path loads its own stock dfs
+        dataset = Dataset(["Baltigo"], TrivialScreener(), data_loader)
+        assert list(dataset.load(executor, path)) == ["Baltigo"]
+        assert data_loader.loaded == ["Baltigo"]
+        assert list(open_universe(path)) == ["Baltigo"]
+    finally:
+        config.num_processors = num_processors
@@ -0,0 +1,101 @@
+from ekeko.backtrader.broker import BrokerBuilder
+from ekeko.backtrader.engine import Engine
+from ekeko.backtrader.vectorized import (
+    CashFraction,
+    FixedQuantity,
+    MarketTrader,
+    VectorizedEngine,
+)
+from ekeko.core.signal_type import ENTRY, EXIT
+
+import numpy as np
+import pandas as pd
+
+
+class Strategy:
+
+    def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        signal = pd.DataFrame(index=stock_df.index)
+
+        fast = stock_df["Close"].ewm(span=3, adjust=False).mean()
+        slow = stock_df["Close"].ewm(span=8, adjust=False).mean()
+
+        signal[ENTRY] = (fast > slow) & (fast.shift(1) <= slow.shift(1))
+        signal[EXIT] = (fast < slow) & (fast.shift(1) >= slow.shift(1))
+
+        return signal
+
+
+def get_stock_dfs() -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(7)
+    dates = pd.date_range(start="2023-01-01", periods=120, freq="D")
+
+    stock_dfs = {}
+    for i, ticker in enumerate(["Aurora", "Baltigo", "Cyclops", "Dorado"]):
+        # Every ticker starts and ends at a different date and has gaps
+        index = dates[5 * i : len(dates) - 7 * i]
+        index = index[rng.random(len(index)) > 0.1]
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.05, len(index))))
+        stock_dfs[ticker] = pd.DataFrame({"Close": close}, index=index)
+
+    return stock_dfs
+
+
+def assert_same_report(sizing, strategy=Strategy(), initial_cash=100):
+    stock_dfs = get_stock_dfs()
+    comission = 0.01
+
+    engine = Engine(
+        MarketTrader(sizing),
+        strategy,
+        BrokerBuilder(initial_cash, comission, stock_dfs),
+    )
+    vectorized_engine = VectorizedEngine(
+        MarketTrader(sizing),
+        strategy,
+        BrokerBuilder(initial_cash, comission, stock_dfs),
+    )
+
+    report = engine.run()
+    vectorized_report = vectorized_engine.run()
+
+    assert len(report.transactions) > 0
+    pd.testing.assert_frame_equal(report.transactions, vectorized_report.transactions)
+    pd.testing.assert_frame_equal(report.trades, vectorized_report.trades)
+    pd.testing.assert_frame_equal(
+        report.portfolio.astype("float64"), vectorized_report.portfolio
+    )
+    assert len(engine.broker.account.dropped_transaction) == len(
+        vectorized_engine.broker.account.dropped_transaction
+    )
+    assert engine.broker.unfillable_orders == vectorized_engine.broker.unfillable_orders
+
+
+def test_vectorized_engine_with_fixed_quantity():
+    assert_same_report(FixedQuantity(2))
+
+
+def test_vectorized_engine_with_cash_fraction():
+    # Investing all the cash makes the broker drop transactions for lack of cash
+    assert_same_report(CashFraction(1.0))
+
+
+class LastBarsStrategy:
+    """Enters on the first bar, exits on the second to last one and enters again."""
+
+    def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        signal = pd.DataFrame(False, index=stock_df.index, columns=[ENTRY, EXIT])
+        signal.iloc[0, 0] = True
+        signal.iloc[-2, 1] = True
+        signal.iloc[-1, 0] = True
+        return signal
+
+
+def test_vectorized_engine_with_fixed_quantity_on_last_bars():
+    # The exit and the expiring position both sell on the last bar
+    assert_same_report(FixedQuantity(2), LastBarsStrategy())
+
+
+def test_vectorized_engine_with_fixed_quantity_and_little_cash():
+    # Orders the broker drops for lack of cash are filled date by date
+    assert_same_report(FixedQuantity(2), initial_cash=25)
@@ -0,0 +1,109 @@
+from ekeko.backtrader.broker import BrokerBuilder
+from ekeko.backtrader.engine import BaseStrategy, Engine
+from ekeko.backtrader.vectorized import FixedQuantity, MarketTrader
+from ekeko.backtrader.walk_forward import WalkForward
+from ekeko.config import config
+from ekeko.core.signal_type import ENTRY, EXIT
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+class Strategy(BaseStrategy):
+    params = {"window": 3}
+
+    def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        signal = pd.DataFrame(index=stock_df.index)
+
+        signal["SMA"] = stock_df["Close"].rolling(self.params["window"]).mean()
+        signal[ENTRY] = stock_df["Close"] > signal["SMA"]
+        signal[EXIT] = stock_df["Close"] < signal["SMA"]
+
+        return signal
+
+
+def get_stock_dfs() -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(17)
+    index = pd.date_range(start="2023-01-01", periods=60, freq="D")
+
+    stock_dfs = {}
+    for ticker in ["Aurora", "Baltigo", "Cyclops"]:
+        close = 20 + np.cumsum(rng.normal(0, 1, len(index)))
+        stock_dfs[ticker] = pd.DataFrame({"Close": close}, index=index)
+
+    return stock_dfs
+
+
+def get_walk_forward(stock_dfs, anchored: bool) -> WalkForward:
+    return WalkForward(
+        Strategy(),
+        MarketTrader(FixedQuantity(1)),
+        stock_dfs,
+        BrokerBuilder(100, 0.01, stock_dfs),
+        {"window": [2, 3, 5]},
+        train_size=20,
+        test_size=15,
+        anchored=anchored,
+    )
+
+
+def test_walk_forward_folds():
+    stock_dfs = get_stock_dfs()
+    dates = stock_dfs["Aurora"].index
+
+    folds = get_walk_forward(stock_dfs, anchored=False).get_folds()
+    assert [(f.train_start, f.test_start, f.test_stop) for f in folds] == [
+        (dates[0], dates[20], dates[35]),
+        (dates[15], dates[35], dates[50]),
+        (dates[30], dates[50], None),
+    ]
+
+    folds = get_walk_forward(stock_dfs, anchored=True).get_folds()
+    assert [f.train_start for f in folds] == [dates[0]] * 3
+
+
+def test_walk_forward_trades_the_best_train_params_on_each_test_window():
+    stock_dfs = get_stock_dfs()
+
+    num_processors = config.num_processors
+    config.num_processors = 2
+    try:
+        walk_forward_report = get_walk_forward(stock_dfs, anchored=False).run()
+    finally:
+        config.num_processors = num_processors
+
+    growths = []
+    for fold_result in walk_forward_report.folds:
+        fold = fold_result.fold
+        train_dfs = {
+            ticker: df.loc[fold.train_start : fold.test_start].iloc[:-1]
+            for ticker, df in stock_dfs.items()
+        }
+
+        train_growths = []
+        for window in [2, 3, 5]:
+            strategy = Strategy()
+            strategy.params = {"window": window}
+            report = Engine(
+                MarketTrader(FixedQuantity(1)),
+                strategy,
+                BrokerBuilder(100, 0.01, train_dfs),
+            ).run()
+            train_growths.append(report.portfolio_statistics["percentage_growth"])
+
+        best_window = [2, 3, 5][np.argmax(train_growths)]
+        assert fold_result.best_params == {"window": best_window}
+        test_report = fold_result.test_report
+        assert test_report.portfolio.index[0] == fold.test_start
+        growths.append(test_report.portfolio_statistics["percentage_growth"])
+
+    # The test windows are compounded into one equity curve
+    report = walk_forward_report.report
+    assert len(report.portfolio) == 40
+    assert report.portfolio["normalized_value"].iloc[-1] == pytest.approx(
+        np.prod([1 + growth / 100 for growth in growths])
+    )
+    assert len(report.trades) == sum(
+        len(fold_result.test_report.trades) for fold_result in walk_forward_report.folds
+    )
@@ -0,0 +1,163 @@
+from ekeko.backtrader.broker import BrokerBuilder
+from ekeko.backtrader.engine import BaseStrategy
+from ekeko.backtrader.grid_search import GridSearch, attach_universe, detach_universe
+from ekeko.backtrader.vectorized import FixedQuantity, MarketTrader
+from ekeko.config import config
+from ekeko.core.frame_file import write_frames
+from ekeko.core.hashing import hash_frames
+from ekeko.core.signal_type import ENTRY, EXIT
+from ekeko.core.work_queue import Worker, WorkQueueExecutor, spawn_local_workers
+
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+class Strategy(BaseStrategy):
+    params = {"window": 3}
+
+    def evaluate(self, stock_df: pd.DataFrame) -> pd.DataFrame:
+        signal = pd.DataFrame(index=stock_df.index)
+
+        signal["SMA"] = stock_df["Close"].rolling(self.params["window"]).mean()
+        signal[ENTRY] = stock_df["Close"] > signal["SMA"]
+        signal[EXIT] = stock_df["Close"] < signal["SMA"]
+
+        return signal
+
+
+def get_stock_dfs() -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(19)
+    index = pd.date_range(start="2023-01-01", periods=50, freq="D")
+
+    stock_dfs = {}
+    for ticker in ["Aurora", "Baltigo", "Cyclops"]:
+        close = 20 + np.cumsum(rng.normal(0, 1, len(index)))
+        stock_dfs[ticker] = pd.DataFrame({"Close": close}, index=index)
+
+    return stock_dfs
+
+
+def start_worker(queue_dir, **kwargs) -> threading.Thread:
+    worker = Worker(queue_dir, poll_interval=0.01, idle_timeout=2.0, **kwargs)
+    thread = threading.Thread(target=worker.run, daemon=True)
+    thread.start()
+    return thread
+
+
+def fail_on_first_attempt(path):
+    # The marker outlives the attempt, so the retry succeeds
+    if not path.exists():
+        path.touch()
+        raise RuntimeError("first attempt")
+    return path.name
+
+
+def test_grid_search_on_work_queue_matches_local_pool(tmp_path):
+    stock_dfs = get_stock_dfs()
+    broker_builder = BrokerBuilder(100, 0.01, stock_dfs)
+    trader = MarketTrader(FixedQuantity(1))
+    param_grid = {"window": [2, 3, 5, 8]}
+    metric_fns = {"growth": lambda r: r.portfolio_statistics["percentage_growth"]}
+
+    def optimize(executor):
+        return GridSearch(
+            Strategy(),
+            trader,
+            stock_dfs,
+            broker_builder,
+            param_grid,
+            metric_fns=metric_fns,
+            executor=executor,
+        ).optimize()
+
+    queue_dir = tmp_path / "queue"
+    executor = WorkQueueExecutor(queue_dir, poll_interval=0.01)
+    workers = spawn_local_workers(
+        queue_dir, 2, "--idle-timeout", "60", "--heartbeat-interval", "0.5"
+    )
+    num_processors = config.num_processors
+    config.num_processors = 2
+    try:
+        queue_report = optimize(executor)
+        assert len(executor.get_workers()) == 2
+        local_report = optimize(None)
+    finally:
+        config.num_processors = num_processors
+        for worker in workers:
+            worker.terminate()
+            worker.wait()
+
+    assert [s.metrics for _, s in queue_report.grid_results] == [
+        s.metrics for _, s in local_report.grid_results
+    ]
+    assert queue_report.full_reports.keys() == local_report.full_reports.keys()
+    assert list((queue_dir / "jobs").iterdir()) == []
+    assert list((queue_dir / "data").iterdir()) == []
+
+
+def test_work_queue_retries_failed_tasks(tmp_path):
+    queue_dir = tmp_path / "queue"
+    executor = WorkQueueExecutor(queue_dir, max_retries=1, poll_interval=0.01)
+    worker = start_worker(queue_dir)
+
+    paths = [tmp_path / f"marker{i}" for i in range(3)]
+    results = executor.map_unordered(fail_on_first_attempt, paths)
+    assert sorted(results) == ["marker0", "marker1", "marker2"]
+
+    # A task that keeps failing is given up on
+    with pytest.raises(RuntimeError, match="failed 2 times"):
+        list(executor.map_unordered(lambda _: 1 / 0, [0]))
+    worker.join()
+
+
+def test_work_queue_returns_file_not_found_errors_of_tasks(tmp_path):
+    queue_dir = tmp_path / "queue"
+    executor = WorkQueueExecutor(queue_dir, max_retries=0, poll_interval=0.01)
+    worker = start_worker(queue_dir)
+
+    missing = tmp_path / "missing.csv"
+    with pytest.raises(RuntimeError, match="FileNotFoundError"):
+        list(executor.map_unordered(lambda path: path.read_text(), [missing]))
+    worker.join()
+
+
+def test_work_queue_requeues_tasks_of_lost_workers(tmp_path):
+    queue_dir = tmp_path / "queue"
+    executor = WorkQueueExecutor(queue_dir, heartbeat_timeout=1.0, poll_interval=0.01)
+    results = executor.map_unordered(lambda x: x * 2, [1, 2])
+
+    # Claim a task on behalf of a worker that never sends a heartbeat
+    def claim_then_start_worker():
+        tasks_dirs = []
+        while not tasks_dirs:
+            tasks_dirs = list((queue_dir / "jobs").glob("*/tasks"))
+        tasks_dir = tasks_dirs[0]
+        while not (tasks_dir.parent / "function.pkl").exists():
+            pass
+        task = tasks_dir / "0.0"
+        task.rename(tasks_dir.parent / "claimed" / "0.0.lost-worker")
+        start_worker(queue_dir)
+
+    thread = threading.Thread(target=claim_then_start_worker)
+    thread.start()
+    assert sorted(results) == [2, 4]
+    thread.join()
+
+
+def test_attach_universe_checks_the_fingerprint(tmp_path):
+    stock_dfs = get_stock_dfs()
+    path = tmp_path / "stock_dfs.ekf"
+    write_frames(path, stock_dfs)
+
+    try:
+        attached = attach_universe(path, hash_frames(stock_dfs))
+        assert attached.keys() == stock_dfs.keys()
+        detach_universe()
+
+        with pytest.raises(ValueError):
+            attach_universe(path, hash_frames({"Aurora": stock_dfs["Aurora"]}))
+    finally:
+        detach_universe()